@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+工作区增量构建：「修改正文 / 修改封面」循环里只重做输入有变化的产物。
+
+产物（按依赖顺序）与各自的输入:
+  content  预检并压缩后的正文 HTML   ← 正文文件
+  cover    封面 JPEG                 ← 封面参数、字体与渲染代码（或 --cover 指定的图片）
+  thumb    封面素材 media_id         ← 封面图内容
+  body     图片已改写为微信地址的正文 ← content、正文引用的本地图片
+  draft    草稿 media_id             ← 标题/作者/摘要/评论开关、body、thumb
+每个产物记录其输入的哈希，输入不变就直接复用；只改正文时复用已有封面和封面素材。
+草稿已存在时用 draft/update 原地更新，不再新建草稿。
+
+用法:
+  # 预览：只生成本地产物（content、cover），不访问网络
+  python3 article_build.py --workspace . --title "标题" --digest "摘要" --content-file article.html
+  # 确认后发布：只上传/更新有变化的部分
+  python3 article_build.py --workspace . --title "标题" --digest "摘要" --content-file article.html --publish
+
+appid/appsecret/author、评论开关与封面风格默认取工作区的 wechat-article.config.json，
+命令行参数优先。构建状态保存在 <workspace>/.wechat-build/；--force 忽略状态全部重做。
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import html_preflight
+import md_to_wechat
+import publish_draft as pd
+
+BUILD_DIR = ".wechat-build"
+CONFIG_NAME = "wechat-article.config.json"
+# bump when an artifact's output changes in ways its inputs cannot see
+BUILD_VERSION = 1
+
+
+def inputs_digest(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BuildState:
+    """Workspace record of every artifact: the digest of its inputs and what it produced."""
+
+    def __init__(self, workspace):
+        self.dir = os.path.join(workspace, BUILD_DIR)
+        self.path = os.path.join(self.dir, "state.json")
+        self.nodes = (pd.read_json_file(self.path) or {}).get("nodes") or {}
+
+    def get(self, name):
+        return self.nodes.get(name) or {}
+
+    def put(self, name, key, value):
+        self.nodes[name] = {"key": key, "value": value, "updated_at": int(time.time())}
+        pd.write_json_file(self.path, {"version": BUILD_VERSION, "nodes": self.nodes})
+
+    def file(self, name):
+        return os.path.join(self.dir, name)
+
+
+class Builder:
+    """Recomputes an artifact only when the digest of its inputs changed."""
+
+    def __init__(self, state, force=False, log=print):
+        self.state = state
+        self.force = force
+        self.log = log
+        self.report = {}
+
+    def node(self, name, inputs, build, valid=None):
+        """Return the artifact value, reusing the recorded one if inputs are unchanged.
+
+        build(previous value or None) computes a fresh value; valid(value)
+        can reject a recorded value whose output went missing.
+        """
+        key = inputs_digest(dict(inputs, _version=BUILD_VERSION))
+        entry = self.state.get(name)
+        if not self.force and entry.get("key") == key and (valid is None or valid(entry["value"])):
+            self.report[name] = "reused"
+            return entry["value"]
+        self.log(f"building {name}...")
+        value = build(entry.get("value"))
+        self.state.put(name, key, value)
+        self.report[name] = "built"
+        return value
+
+
+def write_text(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def file_matches(path, sha256):
+    return bool(path) and os.path.isfile(path) and pd.file_sha256(path) == sha256
+
+
+def load_config(workspace, path=None):
+    path = path or os.path.join(workspace, CONFIG_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise pd.InputError(f"cannot read config {path}: {e}")
+
+
+def resolve_settings(args, config):
+    """Merge CLI args over the workspace config over script defaults."""
+    publish = config.get("publish") or {}
+    cover = config.get("cover") or {}
+
+    def pick(value, fallback):
+        return fallback if value is None else value
+
+    seed = args.seed
+    if seed is None:
+        seed = args.title if cover.get("seed", "title") == "title" else cover.get("seed")
+    return {
+        "appid": args.appid or config.get("appid") or os.environ.get("WX_APPID"),
+        "appsecret": args.appsecret or config.get("appsecret") or os.environ.get("WX_APPSECRET"),
+        "author": pick(args.author, config.get("author") or os.environ.get("WX_AUTHOR", "")),
+        "need_open_comment": int(pick(args.need_open_comment, publish.get("need_open_comment", 1))),
+        "only_fans_can_comment": int(pick(args.only_fans_can_comment, publish.get("only_fans_can_comment", 0))),
+        "cover_options": {
+            "title": args.cover_title or args.title,
+            "subtitle": args.subtitle,
+            "style": args.style or cover.get("default_style") or "minimal-grid",
+            "palette": args.palette or cover.get("palette") or "auto",
+            "rotate": args.rotate or cover.get("rotate") or "sequential",
+            "seed": seed or args.title,
+            "font": args.font,
+        },
+    }
+
+
+def build_content(builder, article, inline_images, compact):
+    path = builder.state.file("content.html")
+
+    def build(_):
+        pd.preflight_content(article, "article", inline_images=inline_images, compact=compact)
+        write_text(path, article["content"])
+        return {"path": path, "sha256": text_sha256(article["content"])}
+
+    inputs = {"file": pd.file_sha256(article["content_file"]), "inline_images": inline_images, "compact": compact}
+    if md_to_wechat.is_markdown(article["content_file"]):
+        inputs["markdown"] = md_to_wechat.COMPILER_VERSION
+    return builder.node("content", inputs, build, lambda v: file_matches(v["path"], v["sha256"]))
+
+
+def build_cover(builder, workspace, cover_path, options, output):
+    if cover_path:
+        sha = pd.file_sha256(cover_path)
+        return builder.node("cover", {"file": sha}, lambda _: {"path": os.path.abspath(cover_path), "sha256": sha})
+
+    cc = pd.import_create_cover()
+    if options["style"] not in cc.STYLES:
+        raise pd.InputError(f"Unknown style: {options['style']}")
+    font = options.get("font") or cc.default_font_path()
+    if not os.path.exists(font):
+        raise pd.InputError(f"Font not found: {font}")
+    output = os.path.join(workspace, output)
+
+    def build(_):
+        with cc.RENDER_LOCK:
+            palette = cc.create_cover(
+                title=options["title"],
+                subtitle=options["subtitle"],
+                output=output,
+                style=options["style"],
+                palette_name=options["palette"],
+                rotate=options["rotate"],
+                seed=options["seed"],
+                bg_override=None,
+                text_override=None,
+                sub_override=None,
+                font_path=font,
+                cache_dir=cc.default_cache_dir(),
+            )
+        return {"path": output, "sha256": pd.file_sha256(output), "palette": palette}
+
+    inputs = {
+        "options": options,
+        "font": cc.font_digest(font),
+        "renderer": [cc.RENDERER_VERSION, text_sha256(cc._style_source(options["style"]) + cc.layout_source())],
+        "output": output,
+    }
+    return builder.node("cover", inputs, build, lambda v: file_matches(v["path"], v["sha256"]))
+
+
+def inline_image_inputs(content, base_dir):
+    """Digest of every image the body references, so replacing an image file rebuilds the body."""
+    found = {}
+    for _, _, src in pd.find_inline_images(content):
+        if not src or html_preflight.is_wechat_image(src) or src in found:
+            continue
+        path = src if os.path.isabs(src) else os.path.join(base_dir, src)
+        found[src] = pd.file_sha256(path) if os.path.isfile(path) else None
+    return found
+
+
+def build_remote(builder, account, article, content, cover, args):
+    """thumb, body and draft; network calls happen only for artifacts that must be rebuilt."""
+    inline_images = not args.no_inline_images
+    base_dir = os.path.dirname(os.path.abspath(article["content_file"]))
+
+    def build_thumb(_):
+        return {"media_id": account.upload_cover(cover["path"])}
+
+    thumb_inputs = {"appid": account.appid, "cover": cover["sha256"], "preprocess": not args.no_cover_preprocess}
+    thumb = builder.node("thumb", thumb_inputs, build_thumb)
+
+    body_path = builder.state.file("body.html")
+
+    def build_body(_):
+        with open(content["path"], "r", encoding="utf-8") as f:
+            html = f.read()
+        body = pd.rewrite_inline_images(account, html, base_dir, args.workers) if inline_images else html
+        write_text(body_path, body)
+        return {"path": body_path, "sha256": text_sha256(body)}
+
+    with open(content["path"], "r", encoding="utf-8") as f:
+        images = inline_image_inputs(f.read(), base_dir) if inline_images else {}
+    body_inputs = {"appid": account.appid, "content": content["sha256"], "images": images}
+    body = builder.node("body", body_inputs, build_body, lambda v: file_matches(v["path"], v["sha256"]))
+
+    def build_draft(previous, thumb_media_id, key):
+        with open(body["path"], "r", encoding="utf-8") as f:
+            payload = pd.article_payload(article, f.read(), thumb_media_id)
+        media_id = (previous or {}).get("media_id")
+        if media_id:
+            try:
+                account.update_draft(media_id, payload)
+                return {"media_id": media_id, "updated": True}
+            except pd.WeChatAPIError as e:
+                if e.errcode != pd.INVALID_MEDIA_ERRCODE or account.draft_exists(media_id):
+                    raise
+                # the draft was deleted in the backend: create it again
+                if account.index:
+                    account.index.forget(media_id)
+        # same journal and lookup as publish_draft.py: a draft/add that timed out after the
+        # server accepted it is found again instead of being created twice
+        journal = pd.PublishJournal(account.appid)
+        media_id = pd.resume_draft(account, journal.get(key), [payload])
+        if media_id:
+            journal.update(key, state="done", media_id=media_id)
+        else:
+            media_id = pd.submit_draft(account, [payload], journal, key)
+        return {"media_id": media_id, "updated": False}
+
+    def draft(thumb_media_id):
+        inputs = {
+            "appid": account.appid,
+            "fields": {k: article.get(k) for k in ("title", "author", "digest", "need_open_comment", "only_fans_can_comment")},
+            "body": body["sha256"],
+            "thumb": thumb_media_id,
+        }
+        key = "build-" + inputs_digest(inputs)
+        return builder.node("draft", inputs, lambda previous: build_draft(previous, thumb_media_id, key))
+
+    try:
+        return draft(thumb["media_id"])
+    except pd.WeChatAPIError as e:
+        if e.errcode != pd.INVALID_MEDIA_ERRCODE:
+            raise
+        # the cover material was deleted in the backend: upload it again
+        account.forget_cover(thumb["media_id"])
+        thumb = builder.node("thumb", thumb_inputs, build_thumb, valid=lambda v: False)
+        return draft(thumb["media_id"])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="公众号文章工作区增量构建（只重做有变化的产物）")
+    parser.add_argument("--workspace", default=".", help="工作区目录（构建状态存放在其中的 .wechat-build/）")
+    parser.add_argument("--config", default=None, help=f"配置文件（默认 <workspace>/{CONFIG_NAME}）")
+    parser.add_argument("--title", required=True, help="文章标题")
+    parser.add_argument("--author", default=None, help="作者（默认取配置 author）")
+    parser.add_argument("--digest", default="", help="文章摘要，建议 120 字以内")
+    parser.add_argument("--content-file", default="article.html", help="正文 HTML 或 Markdown（相对工作区）")
+    parser.add_argument("--cover", default=None, help="使用已有封面图（相对工作区），不生成")
+    parser.add_argument("--cover-output", default="cover.jpg", help="生成封面的输出文件（相对工作区）")
+    parser.add_argument("--cover-title", default=None, help="封面主标题（默认同文章标题）")
+    parser.add_argument("--subtitle", default="", help="封面副标题")
+    parser.add_argument("--style", default=None, help="封面风格（默认取配置 cover.default_style）")
+    parser.add_argument("--palette", default=None, help="封面配色（默认取配置 cover.palette）")
+    parser.add_argument("--rotate", default=None, choices=["sequential", "random"], help="palette=auto 时的选色策略")
+    parser.add_argument("--seed", default=None, help="配色轮换 seed（默认按配置，通常为标题）")
+    parser.add_argument("--font", default=None, help="封面字体文件（默认 assets/NotoSansCJKsc-Bold.otf）")
+    parser.add_argument("--need-open-comment", type=int, default=None, help="是否开启评论：1 开启，0 关闭")
+    parser.add_argument("--only-fans-can-comment", type=int, default=None, help="是否仅粉丝可评论：1 是，0 否")
+    parser.add_argument("--appid", default=None, help="AppID（默认取配置或 WX_APPID）")
+    parser.add_argument("--appsecret", default=None, help="AppSecret（默认取配置或 WX_APPSECRET）")
+    parser.add_argument("--publish", action="store_true", help="上传封面并创建/更新草稿（否则只生成本地产物用于预览）")
+    parser.add_argument("--force", action="store_true", help="忽略构建状态，全部重做")
+    parser.add_argument("--workers", type=int, default=4, help="正文图片上传并发数")
+    parser.add_argument("--no-inline-images", action="store_true", help="不上传/改写正文中的 <img>")
+    parser.add_argument("--no-compact", action="store_true", help="只做预检，正文按原样提交")
+    parser.add_argument("--no-cover-preprocess", action="store_true", help="不对封面做旋转/裁剪/缩放，原样上传")
+    parser.add_argument("--timeout", type=float, default=pd.DEFAULT_TIMEOUT, help="API 请求超时秒数")
+    return parser
+
+
+def run(args, client=None, log=print):
+    """Bring the workspace's artifacts up to date; returns the result document."""
+    workspace = os.path.abspath(args.workspace)
+    config = load_config(workspace, args.config)
+    settings = resolve_settings(args, config)
+
+    def in_workspace(path):
+        return path if not path or os.path.isabs(path) else os.path.join(workspace, path)
+
+    article = {
+        "title": args.title,
+        "author": settings["author"],
+        "digest": args.digest,
+        "content_file": in_workspace(args.content_file),
+        "cover": in_workspace(args.cover),
+        "cover_options": settings["cover_options"],
+        "need_open_comment": settings["need_open_comment"],
+        "only_fans_can_comment": settings["only_fans_can_comment"],
+    }
+    pd.validate_article(article)
+    if args.publish and (not settings["appid"] or not settings["appsecret"]):
+        raise pd.InputError(f"AppID/AppSecret required (--appid/--appsecret, {CONFIG_NAME} or WX_APPID/WX_APPSECRET)")
+
+    state = BuildState(workspace)
+    with pd.file_lock(state.path + ".lock"):
+        builder = Builder(state, force=args.force, log=log)
+        content = build_content(builder, article, not args.no_inline_images, not args.no_compact)
+        cover = build_cover(builder, workspace, article["cover"], settings["cover_options"], args.cover_output)
+        result = {"ok": True, "content": content["path"], "cover": cover["path"]}
+        if cover.get("palette"):
+            result["palette"] = cover["palette"]
+
+        if args.publish:
+            own_client = client is None
+            client = client or pd.WeChatClient(timeout=args.timeout)
+            account = pd.Account(
+                settings["appid"],
+                settings["appsecret"],
+                client,
+                preprocess_cover=not args.no_cover_preprocess,
+                index=pd.open_index(settings["appid"]),
+            )
+            try:
+                draft = build_remote(builder, account, article, content, cover, args)
+            finally:
+                if account.index:
+                    account.index.close()
+                if own_client:
+                    client.close()
+            result.update(media_id=draft["media_id"], need_open_comment=article["need_open_comment"], only_fans_can_comment=article["only_fans_can_comment"])
+        result["artifacts"] = builder.report
+    return result
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        result = run(args, log=lambda line: print(line, file=sys.stderr))
+    except pd.PUBLISH_ERRORS + (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
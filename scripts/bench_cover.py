@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+封面渲染微基准：对 STYLES × PALETTES × 画布尺寸 × 标题长度逐一渲染，分阶段计时
+（字体加载、背景、标题排版、JPEG 编码）并记录内存峰值，结果可存为 JSON 并与基线对比。
+
+用法:
+  python3 bench_cover.py
+  python3 bench_cover.py --sizes 900x383,1800x766 --titles 6,14,28 --repeat 7
+  python3 bench_cover.py --font assets/NotoSansCJKsc-Bold.otf --font /path/other.ttf
+  python3 bench_cover.py --json cover-bench.json
+  python3 bench_cover.py --baseline cover-bench.json   # 任一风格×尺寸变慢超过 --tolerance 时退出码为 1
+
+阶段均取 --repeat 次中的中位数；背景不走缓存，字体阶段测未缓存的加载，标题排版用已加载的字体。
+内存：py_peak_kb 为 tracemalloc 记录的 Python/NumPy 分配峰值；rss_peak_kb 为整次渲染期间
+常驻内存峰值的增量（仅 Linux，其余平台为 null），Pillow 图像缓冲只体现在后者。
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import create_cover as cc
+
+STAGES = ("font_ms", "background_ms", "title_ms", "encode_ms")
+TITLE_CHARS = "公众号封面渲染性能基准测试标题文字长度对比样本内容足够长"
+
+
+def parse_sizes(text):
+    sizes = []
+    for part in text.split(","):
+        w, sep, h = part.strip().lower().partition("x")
+        if not sep or not w.isdigit() or not h.isdigit() or int(w) < 1 or int(h) < 1:
+            raise ValueError(f"invalid size: {part!r} (expected WxH)")
+        sizes.append((int(w), int(h)))
+    return sizes
+
+
+def sample_title(length):
+    return (TITLE_CHARS * (length // len(TITLE_CHARS) + 1))[:length]
+
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux); returns the current RSS in KB or None."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return None
+    return _status_kb("VmRSS")
+
+
+def render_stages(title, subtitle, style, palette, size, font_path):
+    """One render split into stages; returns (seconds per stage, jpeg bytes).
+
+    The font stage times an uncached load; the title stage fits and draws
+    the title with the process-wide load_font() faces and glyph advance
+    tables, as create_cover does.
+    """
+    from PIL import ImageDraw, ImageFont
+
+    w, h = size
+    t0 = time.perf_counter()
+    ImageFont.truetype(font_path, 52)
+    ImageFont.truetype(font_path, 28)
+    t1 = time.perf_counter()
+    img = cc.render_background(style, palette, w, h)
+    t2 = time.perf_counter()
+    cc.draw_title_block(ImageDraw.Draw(img), w, h, title, subtitle, style, palette, font_path, h / cc.COVER_SIZE[1])
+    t3 = time.perf_counter()
+    data = cc.encode_jpeg(img)
+    t4 = time.perf_counter()
+    return (t1 - t0, t2 - t1, t3 - t2, t4 - t3), len(data)
+
+
+def measure_memory(title, subtitle, style, palette, size, font_path):
+    base_rss = reset_peak_rss()
+    tracemalloc.start()
+    try:
+        render_stages(title, subtitle, style, palette, size, font_path)
+        _, py_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    peak = _status_kb("VmHWM") if base_rss is not None else None
+    return round(py_peak / 1024, 1), (peak - base_rss if peak is not None else None)
+
+
+def bench_case(style, palette_name, size, title_len, font_path, repeat):
+    palette = cc.PALETTES[palette_name]
+    title = sample_title(title_len)
+    subtitle = "副标题 · 基准测试"
+    samples = [render_stages(title, subtitle, style, palette, size, font_path) for _ in range(repeat)]
+    row = {
+        "style": style,
+        "palette": palette_name,
+        "size": f"{size[0]}x{size[1]}",
+        "title_len": title_len,
+        "font": os.path.basename(font_path),
+    }
+    for i, stage in enumerate(STAGES):
+        row[stage] = round(statistics.median(s[0][i] for s in samples) * 1000, 3)
+    row["total_ms"] = round(sum(row[s] for s in STAGES), 3)
+    row["jpeg_bytes"] = samples[-1][1]
+    row["py_peak_kb"], row["rss_peak_kb"] = measure_memory(title, subtitle, style, palette, size, font_path)
+    return row
+
+
+def summarize(rows, keys):
+    """Mean of each stage over rows grouped by keys, e.g. ("style",) or ("style", "size")."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[k] for k in keys), []).append(row)
+    summary = []
+    for group, items in groups.items():
+        entry = dict(zip(keys, group))
+        for field in STAGES + ("total_ms", "jpeg_bytes", "py_peak_kb"):
+            entry[field] = round(statistics.mean(r[field] for r in items), 3)
+        rss = [r["rss_peak_kb"] for r in items if r["rss_peak_kb"] is not None]
+        entry["rss_peak_kb"] = max(rss) if rss else None
+        summary.append(entry)
+    return summary
+
+
+def print_summary(summary, keys):
+    label = " × ".join(keys)
+    width = max([len(label)] + [len(" ".join(str(e[k]) for k in keys)) for e in summary])
+    header = f"{label:<{width}} {'font':>8} {'bg':>8} {'title':>8} {'encode':>8} {'total':>8} {'jpeg KB':>8} {'py KB':>8} {'rss KB':>8}"
+    print(header)
+    print("-" * len(header))
+    for e in summary:
+        name = " ".join(str(e[k]) for k in keys)
+        rss = f"{e['rss_peak_kb']:>8}" if e["rss_peak_kb"] is not None else f"{'-':>8}"
+        print(
+            f"{name:<{width}} {e['font_ms']:>8.2f} {e['background_ms']:>8.2f} {e['title_ms']:>8.2f} {e['encode_ms']:>8.2f} "
+            f"{e['total_ms']:>8.2f} {e['jpeg_bytes'] / 1024:>8.1f} {e['py_peak_kb']:>8.0f} {rss}"
+        )
+
+
+def compare(summary, baseline, tolerance):
+    """Regressions of total/stage time per style × size against a baseline report."""
+    base = {(e["style"], e["size"]): e for e in baseline.get("by_style_size") or []}
+    regressions = []
+    for e in summary:
+        old = base.get((e["style"], e["size"]))
+        if not old:
+            continue
+        for field in ("total_ms",) + STAGES:
+            # sub-millisecond stages are too noisy to compare by ratio alone
+            if e[field] > old[field] * (1 + tolerance) and e[field] - old[field] > 0.5:
+                regressions.append(f"{e['style']} {e['size']}: {field} {old[field]:.2f} -> {e[field]:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="封面渲染微基准（风格 × 配色 × 尺寸 × 标题长度）")
+    parser.add_argument("--styles", default=",".join(cc.STYLES), help="逗号分隔的风格（默认全部）")
+    parser.add_argument("--palettes", default=",".join(cc.PALETTES), help="逗号分隔的配色（默认全部）")
+    parser.add_argument("--sizes", default="900x383,1800x766", help="逗号分隔的画布尺寸 WxH")
+    parser.add_argument("--titles", default="6,14,28", help="逗号分隔的标题字数")
+    parser.add_argument("--font", action="append", default=None, help="字体文件，可重复（默认 assets/NotoSansCJKsc-Bold.otf）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个组合的重复次数（取中位数）")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件（可作为之后的基线）")
+    parser.add_argument("--baseline", default=None, help="与之前 --json 写出的基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="对比基线时允许的变慢比例")
+    args = parser.parse_args()
+
+    try:
+        styles = [s for s in args.styles.split(",") if s]
+        palettes = [p for p in args.palettes.split(",") if p]
+        sizes = parse_sizes(args.sizes)
+        titles = [int(t) for t in args.titles.split(",") if t]
+        for s in styles:
+            if s not in cc.STYLES:
+                raise ValueError(f"Unknown style: {s}")
+        for p in palettes:
+            if p not in cc.PALETTES:
+                raise ValueError(f"Unknown palette: {p}")
+        if args.repeat < 1 or any(t < 1 for t in titles):
+            raise ValueError("--repeat and title lengths must be >= 1")
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    fonts = args.font or [cc.default_font_path()]
+    for font in fonts:
+        if not os.path.exists(font):
+            print(f"Error: Font not found: {font}", file=sys.stderr)
+            sys.exit(1)
+
+    cases = [(s, p, size, t, f) for f in fonts for s in styles for p in palettes for size in sizes for t in titles]
+    print(f"rendering {len(cases)} combinations × {args.repeat}...", file=sys.stderr)
+    # first render pays one-off imports and library initialisation
+    render_stages("预热", "", styles[0], cc.PALETTES[palettes[0]], sizes[0], fonts[0])
+    started = time.perf_counter()
+    rows = [bench_case(*case, args.repeat) for case in cases]
+    elapsed = time.perf_counter() - started
+
+    by_style = summarize(rows, ("style",))
+    by_style_size = summarize(rows, ("style", "size"))
+    print_summary(by_style, ("style",))
+    print()
+    print_summary(by_style_size, ("style", "size"))
+    if len(fonts) > 1:
+        print()
+        print_summary(summarize(rows, ("font",)), ("font",))
+    print(f"\n{len(cases)} combinations in {elapsed:.1f}s (stage times in ms, median of {args.repeat})")
+
+    if args.json:
+        try:
+            import numpy
+
+            numpy_version = numpy.__version__
+        except ImportError:
+            numpy_version = None
+        from PIL import __version__ as pillow_version
+
+        report = {
+            "config": {"repeat": args.repeat, "sizes": args.sizes, "titles": titles, "fonts": [os.path.basename(f) for f in fonts]},
+            "env": {"python": sys.version.split()[0], "pillow": pillow_version, "numpy": numpy_version},
+            "by_style": by_style,
+            "by_style_size": by_style_size,
+            "rows": rows,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Results: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(by_style_size, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
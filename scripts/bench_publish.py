@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+发布流程端到端基准：在本地模拟 API（wechat_mock_server.py）上反复执行 publish_draft.py，
+按场景报告耗时分位数、吞吐量、每次发布的请求数与新建连接数，不访问真实微信接口。
+
+用法:
+  python3 bench_publish.py
+  python3 bench_publish.py --runs 50 --concurrency 4 --latency 80 --handshake 200
+  python3 bench_publish.py --scenario single-cold --scenario single-warm --json bench.json
+  python3 bench_publish.py --baseline bench.json   # 比基线慢超过 --tolerance 时退出码为 1
+
+场景:
+  single-cold      单篇，不用 token/素材缓存（每次取 token、上传封面与正文图片）
+  single-warm      单篇，token/素材缓存命中
+  single-no-reuse  同 single-cold，但每个请求都新建连接（对照连接复用）
+  batch            --articles 篇合成一个多图文草稿，封面各不相同，不用缓存
+  batch-split      同 batch，每篇单独建草稿
+  flaky            单篇，所有接口各有 10% 概率返回 -1 / 45009，默认重试
+  flaky-no-retry   同 flaky，--max-retries 0（对照重试）
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import publish_draft as pd
+import wechat_mock_server as mock
+
+FLAKY = [("*", "-1", 0.1), ("*", "45009", 0.1)]
+COLD = ["--no-token-cache", "--no-media-cache"]
+
+SCENARIOS = {
+    "single-cold": {"argv": COLD},
+    "single-warm": {},
+    "single-no-reuse": {"pool_size": 0, "argv": COLD},
+    "batch": {"batch": True, "argv": COLD},
+    "batch-split": {"batch": True, "argv": COLD + ["--split-drafts"]},
+    "flaky": {"inject": FLAKY, "argv": COLD},
+    "flaky-no-retry": {"inject": FLAKY, "argv": COLD + ["--max-retries", "0"]},
+}
+
+
+def make_fixtures(workdir, count):
+    """Write count articles (distinct cover + one inline image each) and a manifest; returns its path."""
+    from PIL import Image
+
+    articles = []
+    for i in range(count):
+        color = ((i * 67) % 256, (i * 131 + 40) % 256, (i * 29 + 90) % 256)
+        cover = os.path.join(workdir, f"cover-{i}.jpg")
+        Image.new("RGB", (1200, 510), color).save(cover, quality=90)
+        inline = os.path.join(workdir, f"figure-{i}.png")
+        Image.new("RGB", (640, 360), color[::-1]).save(inline)
+        content = os.path.join(workdir, f"article-{i}.html")
+        with open(content, "w", encoding="utf-8") as f:
+            f.write(f'<section><h2>第 {i + 1} 篇</h2><p>{"正文段落。" * 200}</p><img src="{os.path.basename(inline)}"></section>')
+        articles.append({"title": f"基准测试文章 {i + 1}", "digest": "bench", "content_file": content, "cover": cover})
+    manifest = os.path.join(workdir, "manifest.json")
+    with open(manifest, "w", encoding="utf-8") as f:
+        json.dump({"articles": articles}, f, ensure_ascii=False)
+    return manifest, articles[0]
+
+
+def percentile(sorted_values, q):
+    # nearest-rank
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def publish_once(base_url, argv, pool_size):
+    args = pd.build_parser().parse_args(argv)
+    client = pd.WeChatClient(base_url, timeout=args.timeout, pool_size=pool_size, scheduler=pd.scheduler_from_args(args))
+    started = time.perf_counter()
+    try:
+        pd.run(args, client=client, log=lambda line: None)
+        ok = True
+    except pd.PUBLISH_ERRORS:
+        ok = False
+    finally:
+        client.close()
+    return time.perf_counter() - started, ok
+
+
+def run_scenario(name, spec, state, base_url, fixtures, opts):
+    manifest, single = fixtures
+    argv = ["--appid", "bench-appid", "--appsecret", "bench-secret", "--no-journal", "--timeout", "5"]
+    if spec.get("batch"):
+        argv += ["--manifest", manifest]
+    else:
+        argv += ["--title", single["title"], "--content-file", single["content_file"], "--cover", single["cover"]]
+    argv += spec.get("argv", [])
+    pool_size = spec.get("pool_size", 4)
+
+    state.rules = list(spec.get("inject", []))
+    for _ in range(opts.warmup):
+        publish_once(base_url, argv, pool_size)
+    state.reset()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=opts.concurrency) as pool:
+        runs = list(pool.map(lambda _: publish_once(base_url, argv, pool_size), range(opts.runs)))
+    wall = time.perf_counter() - started
+    stats = state.stats()
+    state.rules = []
+
+    times = sorted(t * 1000 for t, _ in runs)
+    ok = sum(1 for _, success in runs if success)
+    return {
+        "runs": len(runs),
+        "ok": ok,
+        "success_rate": round(ok / len(runs), 4),
+        "p50_ms": round(percentile(times, 50), 2),
+        "p90_ms": round(percentile(times, 90), 2),
+        "p99_ms": round(percentile(times, 99), 2),
+        "mean_ms": round(sum(times) / len(times), 2),
+        "throughput": round(len(runs) / wall, 3),
+        "requests_per_publish": round(stats["total_requests"] / len(runs), 2),
+        "connections_per_publish": round(stats["connections"] / len(runs), 2),
+        "requests": stats["requests"],
+        "injected": stats["injected"],
+    }
+
+
+def print_table(results):
+    header = f"{'scenario':<16} {'runs':>5} {'ok':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'pub/s':>8} {'req/pub':>8} {'conn/pub':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<16} {r['runs']:>5} {r['ok']:>5} {r['p50_ms']:>9.1f} {r['p90_ms']:>9.1f} {r['p99_ms']:>9.1f} "
+            f"{r['mean_ms']:>9.1f} {r['throughput']:>8.2f} {r['requests_per_publish']:>8.2f} {r['connections_per_publish']:>9.2f}"
+        )
+
+
+def compare(results, baseline, tolerance):
+    """Return one line per metric that got worse than baseline by more than tolerance."""
+    regressions = []
+    for name, r in results.items():
+        base = (baseline.get("scenarios") or {}).get(name)
+        if not base:
+            continue
+        if r["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {base['p50_ms']:.1f} -> {r['p50_ms']:.1f} ms")
+        if r["p90_ms"] > base["p90_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p90 {base['p90_ms']:.1f} -> {r['p90_ms']:.1f} ms")
+        if r["throughput"] < base["throughput"] / (1 + tolerance):
+            regressions.append(f"{name}: throughput {base['throughput']:.2f} -> {r['throughput']:.2f} pub/s")
+        if r["success_rate"] < base["success_rate"] - tolerance / 4:
+            regressions.append(f"{name}: success rate {base['success_rate']:.2%} -> {r['success_rate']:.2%}")
+        if r["requests_per_publish"] > base["requests_per_publish"] * (1 + tolerance):
+            regressions.append(f"{name}: requests/publish {base['requests_per_publish']} -> {r['requests_per_publish']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="公众号发布流程端到端基准（本地模拟 API）")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="只跑指定场景，可重复（默认全部）")
+    parser.add_argument("--runs", type=int, default=20, help="每个场景计时的发布次数")
+    parser.add_argument("--warmup", type=int, default=1, help="每个场景计时前的预热次数")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时进行的发布数")
+    parser.add_argument("--articles", type=int, default=4, help="batch 场景的文章数")
+    parser.add_argument("--latency", type=float, default=30, help="模拟 API 每个请求的延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=10, help="额外随机延迟上限（毫秒）")
+    parser.add_argument("--handshake", type=float, default=60, help="每个新连接的建连延迟（毫秒）")
+    parser.add_argument("--seed", type=int, default=1, help="错误注入与抖动的随机种子")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件（可作为之后的基线）")
+    parser.add_argument("--baseline", default=None, help="与之前 --json 写出的基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比基线时允许的变慢比例")
+    args = parser.parse_args()
+
+    if args.runs < 1 or args.concurrency < 1 or args.articles < 1:
+        print("Error: --runs, --concurrency and --articles must be >= 1", file=sys.stderr)
+        sys.exit(2)
+
+    names = args.scenario or list(SCENARIOS)
+    state = mock.MockState(latency=args.latency / 1000, jitter=args.jitter / 1000, handshake=args.handshake / 1000, seed=args.seed)
+    server, base_url = mock.start_background(state)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="wechat-bench-") as workdir:
+        # keep token/media caches of the benchmark away from the real ones
+        os.environ["WX_CACHE_DIR"] = os.path.join(workdir, "cache")
+        fixtures = make_fixtures(workdir, args.articles)
+        try:
+            for name in names:
+                print(f"running {name}...", file=sys.stderr)
+                results[name] = run_scenario(name, SCENARIOS[name], state, base_url, fixtures, args)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    print_table(results)
+    report = {
+        "config": {k: getattr(args, k) for k in ("runs", "warmup", "concurrency", "articles", "latency", "jitter", "handshake", "seed")},
+        "scenarios": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Results: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
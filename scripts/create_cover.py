@@ -5,6 +5,9 @@
 基础用法:
   python3 create_cover.py --title "主标题" --subtitle "副标题" --output cover.jpg
 
+多格式（一次渲染，输出 cover.jpg / cover@2x.jpg / cover-square.jpg）:
+  python3 create_cover.py --title "主标题" --output cover.jpg --formats cover,cover@2x,square
+
 预设用法:
   python3 create_cover.py --title "主标题" --style minimal-grid --palette blue-tech --output cover.jpg
 
@@ -15,11 +18,22 @@
   --bg-color / --text-color / --sub-color 仍可覆盖预设颜色。
 """
 import argparse
+import functools
+import hashlib
+import inspect
+import io
+import json
 import os
 import random
+import re
+import shutil
 import sys
+import threading
+from collections import OrderedDict
 from typing import Dict, Tuple
 
+import wechat_metrics
+
 
 def clamp(v: int) -> int:
     return max(0, min(255, v))
@@ -102,27 +116,34 @@ STYLES = [
 ]
 
 
-def style_minimal_grid(draw, w, h, palette):
+def style_minimal_grid(draw, w, h, palette, scale=1):
+    def px(v):
+        return round(v * scale)
+
     grid_color = darken(palette["bg"], 12)
-    spacing = 40
+    spacing = px(40)
+    line = max(1, px(1))
     for x in range(0, w, spacing):
-        draw.line([(x, 0), (x, h)], fill=grid_color, width=1)
+        draw.line([(x, 0), (x, h)], fill=grid_color, width=line)
     for y in range(0, h, spacing):
-        draw.line([(0, y), (w, y)], fill=grid_color, width=1)
+        draw.line([(0, y), (w, y)], fill=grid_color, width=line)
 
     accent = darken(palette["accent1"], 20)
     for i in range(5):
-        off = 60 * i
-        draw.line([(w - 200 + off, h), (w, h - 200 + off)], fill=accent, width=2)
-        draw.line([(0, 200 - off), (200 - off, 0)], fill=accent, width=2)
+        off = px(60 * i)
+        draw.line([(w - px(200) + off, h), (w, h - px(200) + off)], fill=accent, width=px(2))
+        draw.line([(0, px(200) - off), (px(200) - off, 0)], fill=accent, width=px(2))
+
 
+def style_card_editorial(draw, w, h, palette, scale=1):
+    def px(v):
+        return round(v * scale)
 
-def style_card_editorial(draw, w, h, palette):
     # background dots
     dot = lighten(palette["accent1"], 15)
-    for x in range(40, w, 36):
-        for y in range(36, h, 36):
-            draw.ellipse((x, y, x + 2, y + 2), fill=dot)
+    for x in range(px(40), w, px(36)):
+        for y in range(px(36), h, px(36)):
+            draw.ellipse((x, y, x + px(2), y + px(2)), fill=dot)
 
     # card + shadow
     card_w, card_h = int(w * 0.78), int(h * 0.62)
@@ -132,15 +153,18 @@ def style_card_editorial(draw, w, h, palette):
     y1 = y0 + card_h
 
     shadow = darken(palette["accent2"], 25)
-    draw.rounded_rectangle((x0 + 8, y0 + 10, x1 + 8, y1 + 10), radius=24, fill=shadow)
-    draw.rounded_rectangle((x0, y0, x1, y1), radius=24, fill=palette["card"])
+    draw.rounded_rectangle((x0 + px(8), y0 + px(10), x1 + px(8), y1 + px(10)), radius=px(24), fill=shadow)
+    draw.rounded_rectangle((x0, y0, x1, y1), radius=px(24), fill=palette["card"])
 
     # corner label
     ribbon = palette["accent2"]
-    draw.rounded_rectangle((x0 + 20, y0 - 16, x0 + 190, y0 + 24), radius=10, fill=ribbon)
+    draw.rounded_rectangle((x0 + px(20), y0 - px(16), x0 + px(190), y0 + px(24)), radius=px(10), fill=ribbon)
 
 
-def style_diagonal_motion(draw, w, h, palette):
+def style_diagonal_motion(draw, w, h, palette, scale=1):
+    def px(v):
+        return round(v * scale)
+
     # broad diagonal bands
     band1 = lighten(palette["accent1"], 8)
     band2 = lighten(palette["accent2"], 16)
@@ -150,61 +174,260 @@ def style_diagonal_motion(draw, w, h, palette):
     # top-left accents
     accent = darken(palette["accent2"], 18)
     for i in range(6):
-        y = 26 + i * 14
-        draw.line([(24, y), (220, y - 18)], fill=accent, width=2)
+        y = px(26 + i * 14)
+        draw.line([(px(24), y), (px(220), y - px(18))], fill=accent, width=px(2))
 
 
-def style_soft_gradient(img, draw, w, h, palette):
-    # vertical + slight horizontal gradient
+GLOW_STRENGTH = 0.08
+
+
+def _gradient_numpy(w, h, top, bottom, glow):
+    import numpy as np
     from PIL import Image
 
-    overlay = Image.new("RGB", (w, h))
-    px = overlay.load()
-    top = lighten(palette["bg"], 8)
-    bottom = darken(palette["bg"], 10)
-    right_boost = lighten(palette["accent1"], 20)
+    # same float ops as the per-pixel formula, applied to whole rows/columns
+    t = (np.arange(h, dtype=np.float64) / max(1, h - 1))[:, None]
+    k = (np.arange(w, dtype=np.float64) / max(1, w - 1))[None, :]
+    channels = []
+    for c in range(3):
+        col = np.floor(top[c] * (1 - t) + bottom[c] * t)
+        px = np.floor(col * (1 - GLOW_STRENGTH * k) + glow[c] * (GLOW_STRENGTH * k))
+        channels.append(np.clip(px, 0, 255).astype(np.uint8))
+    return Image.fromarray(np.dstack(channels), "RGB")
+
+
+def _gradient_pillow(w, h, top, bottom, glow):
+    from PIL import Image
 
+    # vertical blend: one column of h pixels stretched across the width
+    column = Image.new("RGB", (1, h))
+    rows = []
     for y in range(h):
         t = y / max(1, h - 1)
-        for x in range(w):
-            r = int(top[0] * (1 - t) + bottom[0] * t)
-            g = int(top[1] * (1 - t) + bottom[1] * t)
-            b = int(top[2] * (1 - t) + bottom[2] * t)
-            # subtle right glow
-            k = x / max(1, w - 1)
-            r = int(r * (1 - 0.08 * k) + right_boost[0] * (0.08 * k))
-            g = int(g * (1 - 0.08 * k) + right_boost[1] * (0.08 * k))
-            b = int(b * (1 - 0.08 * k) + right_boost[2] * (0.08 * k))
-            px[x, y] = (clamp(r), clamp(g), clamp(b))
-
-    img.paste(overlay)
+        rows.append(tuple(clamp(int(top[c] * (1 - t) + bottom[c] * t)) for c in range(3)))
+    column.putdata(rows)
+    vertical = column.resize((w, h), Image.NEAREST)
 
-    # soft circles
-    c1 = lighten(palette["accent1"], 30)
-    c2 = lighten(palette["accent2"], 25)
-    draw.ellipse((w - 220, -70, w + 80, 210), fill=c1)
-    draw.ellipse((-120, h - 190, 220, h + 120), fill=c2)
+    # right glow: horizontal alpha ramp composited against a flat glow color
+    ramp = Image.new("L", (w, 1))
+    ramp.putdata([round(255 * GLOW_STRENGTH * x / max(1, w - 1)) for x in range(w)])
+    mask = ramp.resize((w, h), Image.NEAREST)
+    return Image.composite(Image.new("RGB", (w, h), glow), vertical, mask)
 
 
-def draw_title_block(draw, w, h, title, subtitle, style, palette, font_large, font_small):
-    # text layout differs slightly by style
-    if style == "card-editorial":
-        title_y = h // 2 - 55
-        sub_y = h // 2 + 16
-    else:
-        title_y = h // 2 - 58
-        sub_y = h // 2 + 18
+def render_gradient(w, h, top, bottom, glow):
+    """Vertical top→bottom blend with a subtle left→right glow, as one image.
 
-    bbox = draw.textbbox((0, 0), title, font=font_large)
-    tw = bbox[2] - bbox[0]
-    tx = (w - tw) / 2
-    draw.text((tx, title_y), title, fill=palette["text"], font=font_large)
+    Uses NumPy when installed (pixel-identical to the per-pixel formula),
+    otherwise Pillow band ops (within ±1 per channel).
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return _gradient_pillow(w, h, top, bottom, glow)
+    return _gradient_numpy(w, h, top, bottom, glow)
 
-    if subtitle:
-        bbox2 = draw.textbbox((0, 0), subtitle, font=font_small)
-        tw2 = bbox2[2] - bbox2[0]
-        tx2 = (w - tw2) / 2
-        draw.text((tx2, sub_y), subtitle, fill=palette["sub"], font=font_small)
+
+def style_soft_gradient(img, draw, w, h, palette, scale=1):
+    def px(v):
+        return round(v * scale)
+
+    # vertical + slight horizontal gradient
+    top = lighten(palette["bg"], 8)
+    bottom = darken(palette["bg"], 10)
+    right_boost = lighten(palette["accent1"], 20)
+
+    img.paste(render_gradient(w, h, top, bottom, right_boost))
+
+    # soft circles
+    c1 = lighten(palette["accent1"], 30)
+    c2 = lighten(palette["accent2"], 25)
+    draw.ellipse((w - px(220), px(-70), w + px(80), px(210)), fill=c1)
+    draw.ellipse((px(-120), h - px(190), px(220), h + px(120)), fill=c2)
+
+
+TITLE_SIZE, TITLE_MIN_SIZE = 52, 24
+SUBTITLE_SIZE, SUBTITLE_MIN_SIZE = 28, 18
+TITLE_MAX_LINES = 3
+LINE_SPACING = 1.25
+TITLE_GAP = 24  # title block bottom to subtitle top
+# box (design px on the 900x383 canvas) the whole title block must fit in, per style
+TEXT_BOXES = {"card-editorial": (620, 190)}
+DEFAULT_TEXT_BOX = (780, 300)
+TEXT_MARGIN = 40  # minimum distance to the edge of any output format
+ELLIPSIS = "…"
+
+# CJK text may break between any two characters, but never before/after these
+NO_LINE_START = frozenset("，。！？、：；）》」』”’】〉…—,.!?:;)]}%")
+NO_LINE_END = frozenset("（《「『“‘【〈([{")
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9'’_.+\-]*|\s+|.", re.DOTALL)
+
+_advance_cache = {}
+
+
+def char_advances(font_path, size):
+    """Per-character advance widths for (font, size), filled lazily and kept per process.
+
+    Fitting a title measures the same characters at a handful of sizes; with
+    the table each measurement is a few dict lookups instead of a reshape.
+    """
+    key = (font_path, size)
+    table = _advance_cache.get(key)
+    if table is None:
+        table = _advance_cache.setdefault(key, {})
+    return table
+
+
+def text_width(font_path, size, text):
+    table = char_advances(font_path, size)
+    total = 0.0
+    for ch in text:
+        w = table.get(ch)
+        if w is None:
+            w = table[ch] = load_font(font_path, size).getlength(ch)
+        total += w
+    return total
+
+
+def break_units(text):
+    """Split text into pieces a line may not break inside.
+
+    Latin words stay whole (a following space is kept on the word), CJK
+    characters stand alone, and punctuation is glued to its neighbour.
+    """
+    units = []
+    glue = False
+    for tok in _TOKEN_RE.findall(text):
+        if tok.isspace():
+            if units:
+                units[-1] += " "
+            continue
+        if units and (glue or tok[0] in NO_LINE_START):
+            units[-1] += tok
+        else:
+            units.append(tok)
+        glue = tok[-1] in NO_LINE_END
+    return units
+
+
+def wrap_units(units, font_path, size, max_width):
+    """Greedy line fill; a unit wider than max_width on its own is split by character."""
+    lines, line, width = [], "", 0.0
+    for unit in units:
+        pieces = [unit] if text_width(font_path, size, unit.rstrip()) <= max_width else list(unit)
+        for piece in pieces:
+            if line and width + text_width(font_path, size, piece.rstrip()) > max_width:
+                lines.append(line.rstrip())
+                line, width = "", 0.0
+            line += piece
+            width += text_width(font_path, size, piece)
+    if line.strip():
+        lines.append(line.rstrip())
+    return lines
+
+
+def block_height(size, lines):
+    return size + (lines - 1) * round(size * LINE_SPACING) if lines else 0
+
+
+def ellipsize(line, font_path, size, max_width):
+    while line and text_width(font_path, size, line + ELLIPSIS) > max_width:
+        line = line[:-1].rstrip()
+    return line + ELLIPSIS
+
+
+def fit_text(text, font_path, max_width, max_height, max_size, min_size, max_lines):
+    """Largest font size in [min_size, max_size] at which text wraps into the box.
+
+    Returns (size, lines). Sizes are binary-searched; if nothing fits, the
+    text is set at min_size and the last line that fits ends in an ellipsis.
+    Wrapped lines are then balanced: the narrowest width that keeps the same
+    line count is used, so a two-line title does not leave one word behind.
+    """
+    units = break_units(text)
+    if not units:
+        return max_size, []
+
+    def fits(size, lines):
+        return len(lines) <= max_lines and block_height(size, len(lines)) <= max_height
+
+    best = None
+    lo, hi = min_size, max(min_size, max_size)
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        lines = wrap_units(units, font_path, mid, max_width)
+        if fits(mid, lines):
+            best, lo = (mid, lines), mid + 1
+        else:
+            hi = mid - 1
+    if best is None:
+        lines = wrap_units(units, font_path, min_size, max_width)
+        keep = max(1, min(max_lines, len(lines)))
+        while keep > 1 and block_height(min_size, keep) > max_height:
+            keep -= 1
+        return min_size, lines[: keep - 1] + [ellipsize(lines[keep - 1], font_path, min_size, max_width)]
+
+    size, lines = best
+    if len(lines) > 1:
+        lo, hi = int(max_width / len(lines)), int(max_width)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if len(wrap_units(units, font_path, size, mid)) <= len(lines):
+                hi = mid
+            else:
+                lo = mid + 1
+        lines = wrap_units(units, font_path, size, hi)
+    return size, lines
+
+
+def layout_title_block(w, h, title, subtitle, style, font_path, scale=1):
+    """Fit title and subtitle into the style's text box on a w x h canvas.
+
+    scale is the canvas size relative to the 900x383 design; the box is also
+    kept TEXT_MARGIN away from the edges, which matters for narrower formats.
+    Returns [(x, y, text, font size, palette key)], one entry per line.
+    """
+    box_w, box_h = TEXT_BOXES.get(style, DEFAULT_TEXT_BOX)
+    box_w = min(box_w * scale, w - 2 * TEXT_MARGIN * scale)
+    box_h = min(box_h * scale, h - 2 * TEXT_MARGIN * scale)
+
+    # room for the subtitle at full size is reserved, then it is scaled with the title
+    has_sub = bool(subtitle.strip())
+    gap = round(TITLE_GAP * scale) if has_sub else 0
+    reserved = round(SUBTITLE_SIZE * scale) if has_sub else 0
+    title_size, title_lines = fit_text(
+        title, font_path, box_w, box_h - gap - reserved, round(TITLE_SIZE * scale), round(TITLE_MIN_SIZE * scale), TITLE_MAX_LINES
+    )
+    sub_size, sub_lines = 0, []
+    if has_sub:
+        sub_min = round(SUBTITLE_MIN_SIZE * scale)
+        sub_max = min(round(SUBTITLE_SIZE * scale), max(sub_min, round(title_size * SUBTITLE_SIZE / TITLE_SIZE)))
+        sub_size, sub_lines = fit_text(subtitle, font_path, box_w, reserved, sub_max, sub_min, 1)
+
+    # center the block, nudged up a little as the old fixed layout was
+    total = block_height(title_size, len(title_lines)) + gap + block_height(sub_size, len(sub_lines))
+    y = h // 2 - total // 2 - round(6 * scale)
+    placed = []
+    for lines, size, key in ((title_lines, title_size, "text"), (sub_lines, sub_size, "sub")):
+        for line in lines:
+            placed.append(((w - text_width(font_path, size, line)) / 2, y, line, size, key))
+            y += round(size * LINE_SPACING)
+        if lines:
+            y += gap - (round(size * LINE_SPACING) - size)
+    return placed
+
+
+def draw_title_block(draw, w, h, title, subtitle, style, palette, font_path, scale=1):
+    """Draw the auto-fitted title (wrapped, up to TITLE_MAX_LINES) and subtitle."""
+    for x, y, line, size, key in layout_title_block(w, h, title, subtitle, style, font_path, scale):
+        draw.text((x, y), line, fill=palette[key], font=load_font(font_path, size))
+
+
+def layout_source():
+    """Source of everything that decides text placement (part of cache keys)."""
+    return "".join(
+        inspect.getsource(fn) for fn in (break_units, wrap_units, fit_text, layout_title_block, draw_title_block)
+    ) + json.dumps([TEXT_BOXES, DEFAULT_TEXT_BOX, TEXT_MARGIN, TITLE_SIZE, TITLE_MIN_SIZE, SUBTITLE_SIZE, SUBTITLE_MIN_SIZE, TITLE_MAX_LINES, LINE_SPACING, TITLE_GAP])
 
 
 def pick_palette(name: str, strategy: str, seed: str):
@@ -215,8 +438,8 @@ def pick_palette(name: str, strategy: str, seed: str):
         return name, PALETTES[name]
 
     if strategy == "sequential":
-        # stable by seed hash
-        idx = abs(hash(seed)) % len(keys)
+        # stable by seed digest (builtin hash() is salted per process)
+        idx = int.from_bytes(hashlib.sha256(seed.encode("utf-8")).digest()[:8], "big") % len(keys)
         k = keys[idx]
         return k, PALETTES[k]
 
@@ -225,12 +448,7 @@ def pick_palette(name: str, strategy: str, seed: str):
     return k, PALETTES[k]
 
 
-def create_cover(title, subtitle, output, style, palette_name, rotate, seed, bg_override, text_override, sub_override, font_path):
-    from PIL import Image, ImageDraw, ImageFont
-
-    if style not in STYLES:
-        raise ValueError(f"Unknown style: {style}")
-
+def resolve_palette(palette_name, rotate, seed, bg_override=None, text_override=None, sub_override=None):
     selected_palette_name, palette = pick_palette(palette_name, rotate, seed)
     palette = dict(palette)
 
@@ -241,28 +459,371 @@ def create_cover(title, subtitle, output, style, palette_name, rotate, seed, bg_
         palette["text"] = parse_rgb(text_override)
     if sub_override:
         palette["sub"] = parse_rgb(sub_override)
+    return selected_palette_name, palette
+
+
+# FreeType faces from load_font are shared and not thread-safe: every in-process
+# render (daemon jobs, covers generated while publishing) holds this lock
+RENDER_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=64)
+def load_font(font_path, size):
+    from PIL import ImageFont
+
+    return ImageFont.truetype(font_path, size)
+
+
+def default_font_path():
+    skill_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(skill_dir, "assets", "NotoSansCJKsc-Bold.otf")
+
+
+STYLE_RENDERERS = {
+    "minimal-grid": style_minimal_grid,
+    "card-editorial": style_card_editorial,
+    "diagonal-motion": style_diagonal_motion,
+    "soft-gradient": style_soft_gradient,
+}
+
+BACKGROUND_CACHE_SIZE = 32
+_background_cache = OrderedDict()
+_background_lock = threading.Lock()
+
+
+def render_background(style, palette, width, height, scale=1):
+    """Draw only the style background (everything except the title block).
+
+    scale multiplies the styles' fixed pixel sizes (grid spacing, line widths,
+    radii), so a 2x canvas at scale=2 looks like the 1x one at twice the detail.
+    """
+    from PIL import Image, ImageDraw
 
-    width, height = 900, 383
     img = Image.new("RGB", (width, height), color=palette["bg"])
     draw = ImageDraw.Draw(img)
 
     if style == "minimal-grid":
-        style_minimal_grid(draw, width, height, palette)
+        style_minimal_grid(draw, width, height, palette, scale)
     elif style == "card-editorial":
-        style_card_editorial(draw, width, height, palette)
+        style_card_editorial(draw, width, height, palette, scale)
     elif style == "diagonal-motion":
-        style_diagonal_motion(draw, width, height, palette)
+        style_diagonal_motion(draw, width, height, palette, scale)
     elif style == "soft-gradient":
-        style_soft_gradient(img, draw, width, height, palette)
+        style_soft_gradient(img, draw, width, height, palette, scale)
+    return img
+
+
+@functools.lru_cache(maxsize=None)
+def _style_source(style):
+    return inspect.getsource(STYLE_RENDERERS[style])
+
 
+def background_key(style, palette, width, height, scale=1):
+    # the style function's source is part of the key so edited styles never hit stale disk entries
+    payload = {
+        "style": style,
+        "src": _style_source(style),
+        "palette": {k: list(v) for k, v in sorted(palette.items())},
+        "size": [width, height],
+        "scale": scale,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_background(style, palette, width, height, cache_dir=None, scale=1):
+    """Return a fresh copy of the style background, rendering it at most once.
+
+    Backgrounds depend only on style, palette (incl. overrides) and size, so
+    they are kept in an in-memory LRU and, with cache_dir, as PNG files.
+    """
+    from PIL import Image
+
+    key = background_key(style, palette, width, height, scale)
+    with _background_lock:
+        img = _background_cache.get(key)
+        if img is not None:
+            _background_cache.move_to_end(key)
+            return img.copy()
+
+    path = os.path.join(cache_dir, f"bg-{key[:32]}.png") if cache_dir else None
+    if path and os.path.exists(path):
+        img = Image.open(path).convert("RGB")
+    else:
+        img = render_background(style, palette, width, height, scale)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            img.save(tmp, "PNG")
+            os.replace(tmp, path)
+
+    with _background_lock:
+        _background_cache[key] = img
+        while len(_background_cache) > BACKGROUND_CACHE_SIZE:
+            _background_cache.popitem(last=False)
+    return img.copy()
+
+
+COVER_SIZE = (900, 383)
+# named outputs: pixel size and the suffix added to the --output file name
+COVER_FORMATS = {
+    "cover": {"size": COVER_SIZE, "suffix": ""},
+    "cover@2x": {"size": (1800, 766), "suffix": "@2x"},
+    "square": {"size": (500, 500), "suffix": "-square"},
+}
+
+
+def format_crop(fmt):
+    """(w, h) of the centered region of the 900x383 design that fmt shows."""
+    fw, fh = COVER_FORMATS[fmt]["size"]
+    dw, dh = COVER_SIZE
+    if fw * dh < dw * fh:
+        return fw * dh / fh, dh
+    return dw, fh * dw / fw
+
+
+def base_scale(formats):
+    """Scale of the one shared background: enough pixels for the largest format."""
+    return max(COVER_FORMATS[f]["size"][0] / format_crop(f)[0] for f in formats)
+
+
+def format_outputs(output, formats):
+    """{format: path}; output is the "cover" path, other formats add their suffix."""
+    stem, ext = os.path.splitext(output)
+    return {f: f"{stem}{COVER_FORMATS[f]['suffix']}{ext or '.jpg'}" for f in formats}
+
+
+def draw_formats(title, subtitle, style, palette, font_path, formats=("cover",), bg_cache_dir=None, metrics=None, scale=None):
+    """Render every format from a single background; returns {format: image}.
+
+    The background is drawn once at base_scale(formats), then each format is
+    center-cropped to its aspect ratio and downsampled before its own title
+    block is drawn, so text stays sharp at every size. With only "cover" the
+    base is the 900x383 canvas itself and no resampling happens. scale
+    overrides base_scale(formats), e.g. to match formats rendered earlier.
+    """
+    from PIL import Image, ImageDraw
+
+    if style not in STYLES:
+        raise ValueError(f"Unknown style: {style}")
+    for fmt in formats:
+        if fmt not in COVER_FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
     if not os.path.exists(font_path):
         raise FileNotFoundError(f"Font not found: {font_path}")
+    metrics = metrics or wechat_metrics.NULL
+
+    scale = scale or base_scale(formats)
+    bw, bh = round(COVER_SIZE[0] * scale), round(COVER_SIZE[1] * scale)
+    with metrics.span("cover_style", style=style):
+        base = get_background(style, palette, bw, bh, bg_cache_dir, scale)
+
+    images = {}
+    for fmt in formats:
+        w, h = COVER_FORMATS[fmt]["size"]
+        cw, ch = (round(v * scale) for v in format_crop(fmt))
+        img = base
+        if (cw, ch) != (bw, bh):
+            left, top = (bw - cw) // 2, (bh - ch) // 2
+            img = base.crop((left, top, left + cw, top + ch))
+        if img.size != (w, h):
+            factor = cw // w
+            with metrics.span("cover_resample", format=fmt):
+                if factor > 1 and (cw, ch) == (w * factor, h * factor):
+                    # exact integer downscale: box filter, an order of magnitude faster than LANCZOS
+                    img = img.reduce(factor)
+                else:
+                    img = img.resize((w, h), Image.LANCZOS, reducing_gap=2.0)
+        elif img is base:
+            img = base.copy()
+
+        # text follows the format's height; the layout wraps/shrinks it to the format's width
+        with metrics.span("cover_text", format=fmt):
+            draw_title_block(ImageDraw.Draw(img), w, h, title, subtitle, style, palette, font_path, h / COVER_SIZE[1])
+        images[fmt] = img
+    return images
+
+
+def draw_cover(title, subtitle, style, palette, font_path, bg_cache_dir=None, metrics=None):
+    """Background (cached) + title block for an already-resolved palette."""
+    return draw_formats(title, subtitle, style, palette, font_path, ("cover",), bg_cache_dir, metrics)["cover"]
+
+
+def render_cover(title, subtitle, style, palette_name, rotate, seed, bg_override, text_override, sub_override, font_path, bg_cache_dir=None, metrics=None):
+    """Render a cover in memory; returns (PIL image, palette name used)."""
+    if style not in STYLES:
+        raise ValueError(f"Unknown style: {style}")
 
-    font_large = ImageFont.truetype(font_path, 52)
-    font_small = ImageFont.truetype(font_path, 28)
-    draw_title_block(draw, width, height, title, subtitle, style, palette, font_large, font_small)
+    selected_palette_name, palette = resolve_palette(
+        palette_name, rotate, seed, bg_override, text_override, sub_override
+    )
+    return draw_cover(title, subtitle, style, palette, font_path, bg_cache_dir, metrics), selected_palette_name
+
+
+# bump when output changes in ways the cache key cannot see (encoder settings, shared helpers)
+RENDERER_VERSION = 1
+JPEG_QUALITY = 95
+JPEG_MIN_QUALITY = 30
+# keep full-resolution chroma (crisper colored title text) when it still fits at this quality
+SHARP_CHROMA_MIN_QUALITY = 85
+
+
+def _jpeg_bytes(img, quality, subsampling=None, progressive=False, optimize=False):
+    buf = io.BytesIO()
+    opts = {"quality": quality, "progressive": progressive, "optimize": optimize}
+    if subsampling is not None:
+        opts["subsampling"] = subsampling
+    img.save(buf, "JPEG", **opts)
+    return buf.getvalue()
+
+
+def _best_quality(img, max_bytes, subsampling, hi, progressive, optimize):
+    """Binary-search the highest quality in [JPEG_MIN_QUALITY, hi] that fits; (quality, bytes) or None."""
+    lo, best = JPEG_MIN_QUALITY, None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        data = _jpeg_bytes(img, mid, subsampling, progressive, optimize)
+        if len(data) <= max_bytes:
+            best = (mid, data)
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best
+
+
+def encode_jpeg(img, max_bytes=None, quality=JPEG_QUALITY, progressive=False, optimize=False):
+    """Encode img as JPEG in memory, shrinking quality/chroma to fit max_bytes.
+
+    Without a budget (or when the default encoding already fits) this is the
+    plain quality=95 save. Otherwise quality is binary-searched for 4:4:4
+    and 4:2:0 chroma; 4:4:4 wins if it fits at SHARP_CHROMA_MIN_QUALITY or
+    better. If nothing fits, Huffman optimization is switched on and the
+    search repeated; failing that, the smallest encoding tried is returned,
+    so callers should check len() against the budget themselves.
+    """
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    data = _jpeg_bytes(img, quality, None, progressive, optimize)
+    if not max_bytes or len(data) <= max_bytes:
+        return data
+
+    for opt in (optimize, True) if not optimize else (True,):
+        sharp = _best_quality(img, max_bytes, 0, quality, progressive, opt)
+        if sharp and sharp[0] >= SHARP_CHROMA_MIN_QUALITY:
+            return sharp[1]
+        small = _best_quality(img, max_bytes, 2, quality, progressive, opt)
+        if small or sharp:
+            return max(c for c in (sharp, small) if c)[1]
+    return _jpeg_bytes(img, JPEG_MIN_QUALITY, 2, progressive, True)
+
+
+def write_bytes(path, data):
+    # write-then-rename so a concurrent reader never sees a partial JPEG
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+@functools.lru_cache(maxsize=16)
+def _font_digest(path, size, mtime_ns):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def font_digest(font_path):
+    """SHA-256 of the font file, memoized per (path, size, mtime)."""
+    st = os.stat(font_path)
+    return _font_digest(os.path.abspath(font_path), st.st_size, st.st_mtime_ns)
+
+
+def cover_cache_key(title, subtitle, style, palette_name, palette, font_path, encode=None, fmt=None):
+    """Stable digest of every input that affects the encoded cover.
+
+    fmt describes the output format and the background scale it was derived from.
+    """
+    payload = {
+        "version": RENDERER_VERSION,
+        "title": title,
+        "subtitle": subtitle,
+        "style": style,
+        "style_src": _style_source(style),
+        "layout_src": layout_source(),
+        "palette_name": palette_name,
+        "palette": {k: list(v) for k, v in sorted(palette.items())},
+        "font": font_digest(font_path),
+        "quality": JPEG_QUALITY,
+        "encode": encode or {},
+        "format": fmt or {},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def default_cache_dir():
+    if os.environ.get("COVER_CACHE_DIR"):
+        return os.environ["COVER_CACHE_DIR"]
+    base = os.environ.get("WX_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "wechat-article-skill")
+    return os.path.join(base, "renders")
+
+
+def create_cover(title, subtitle, output, style, palette_name, rotate, seed, bg_override, text_override, sub_override, font_path, bg_cache_dir=None, cache_dir=None, max_bytes=None, progressive=False, optimize=False, metrics=None, formats=None):
+    """Render and save a cover; returns the palette name used.
+
+    formats (default ("cover",)) names the COVER_FORMATS to write in one
+    render, at the paths given by format_outputs(output, formats).
+    Each JPEG is encoded in memory (see encode_jpeg for max_bytes) and only
+    the final bytes are written. With cache_dir, every format is
+    content-addressed by cover_cache_key; cached ones are just copied and
+    the rest share one background render. metrics
+    (wechat_metrics.Metrics) records the stages.
+    """
+    metrics = metrics or wechat_metrics.NULL
+    formats = tuple(formats or ("cover",))
+    if style not in STYLES:
+        raise ValueError(f"Unknown style: {style}")
+    for fmt in formats:
+        if fmt not in COVER_FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+    if not os.path.exists(font_path):
+        raise FileNotFoundError(f"Font not found: {font_path}")
 
-    img.save(output, "JPEG", quality=95)
+    selected_palette_name, palette = resolve_palette(
+        palette_name, rotate, seed, bg_override, text_override, sub_override
+    )
+    outputs = format_outputs(output, formats)
+
+    cached = {}
+    missing = list(formats)
+    if cache_dir:
+        encode = {"max_bytes": max_bytes, "progressive": progressive, "optimize": optimize}
+        missing = []
+        for fmt in formats:
+            desc = {"name": fmt, "size": list(COVER_FORMATS[fmt]["size"]), "scale": base_scale(formats)}
+            key = cover_cache_key(title, subtitle, style, selected_palette_name, palette, font_path, encode, desc)
+            cached[fmt] = os.path.join(cache_dir, f"{key}.jpg")
+            if os.path.exists(cached[fmt]):
+                metrics.add("cover_cache_hits")
+                if os.path.abspath(cached[fmt]) != os.path.abspath(outputs[fmt]):
+                    shutil.copyfile(cached[fmt], outputs[fmt])
+            else:
+                missing.append(fmt)
+        if not missing:
+            return selected_palette_name
+
+    # the background scale follows all requested formats so cached and fresh outputs match
+    images = draw_formats(title, subtitle, style, palette, font_path, missing, bg_cache_dir, metrics, base_scale(formats))
+    for fmt in missing:
+        with metrics.span("cover_encode", format=fmt):
+            data = encode_jpeg(images[fmt], max_bytes, progressive=progressive, optimize=optimize)
+        metrics.add("cover_bytes", len(data))
+        with open(outputs[fmt], "wb") as f:
+            f.write(data)
+
+        if cached:
+            os.makedirs(cache_dir, exist_ok=True)
+            write_bytes(cached[fmt], data)
     return selected_palette_name
 
 
@@ -275,11 +836,36 @@ def print_presets():
         print(f"- {p}")
 
 
-if __name__ == "__main__":
+# options that name files, resolved against the caller's cwd when run remotely
+PATH_ARGS = ("output", "font", "bg_cache_dir", "cache_dir", "metrics_jsonl", "metrics_prom")
+
+
+def parse_size(text):
+    """'64K' / '1.5M' / '200000' -> bytes."""
+    text = str(text).strip().upper().rstrip("B")
+    units = {"K": 1024, "M": 1024 * 1024}
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+
+
+def parse_formats(text):
+    formats = tuple(dict.fromkeys(f.strip() for f in text.split(",") if f.strip()))
+    unknown = [f for f in formats if f not in COVER_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"unknown format: {', '.join(unknown) or text!r} (choose from {', '.join(COVER_FORMATS)})")
+    return formats
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="生成公众号封面图")
     parser.add_argument("--title", required=False, default="", help="主标题")
     parser.add_argument("--subtitle", default="", help="副标题")
-    parser.add_argument("--output", default="cover.jpg", help="输出文件路径")
+    parser.add_argument("--output", default="cover.jpg", help="输出文件路径（其他格式在文件名后加后缀，如 cover@2x.jpg、cover-square.jpg）")
+    parser.add_argument("--formats", type=parse_formats, default=("cover",), help=f"逗号分隔的输出格式，一次渲染全部输出（可选 {', '.join(COVER_FORMATS)}；默认 cover）")
 
     # new options
     parser.add_argument("--style", default="minimal-grid", choices=STYLES, help="封面风格")
@@ -294,38 +880,82 @@ if __name__ == "__main__":
     parser.add_argument("--sub-color", default=None, help="覆盖副标题文字色 R,G,B")
 
     parser.add_argument("--font", default=None, help="字体文件路径（默认 assets/NotoSansCJKsc-Bold.otf）")
-    args = parser.parse_args()
+    parser.add_argument("--bg-cache-dir", default=os.environ.get("COVER_BG_CACHE_DIR"), help="背景层磁盘缓存目录（或设置 COVER_BG_CACHE_DIR）")
+    parser.add_argument("--cache-dir", default=None, help="成品封面缓存目录（默认 $COVER_CACHE_DIR 或 ~/.cache/wechat-article-skill/renders）")
+    parser.add_argument("--no-cache", action="store_true", help="不读写成品封面缓存")
+
+    # encoder
+    parser.add_argument("--max-bytes", type=parse_size, default=None, help="输出文件大小上限，如 64K / 2M（自动降低质量与色度采样）")
+    parser.add_argument("--progressive", action="store_true", help="输出渐进式 JPEG")
+    parser.add_argument("--optimize", action="store_true", help="启用 Huffman 表优化（更小，稍慢）")
+    wechat_metrics.add_arguments(parser)
+    return parser
 
-    if args.list_presets:
-        print_presets()
-        sys.exit(0)
 
+def run(args):
+    """Execute parsed CLI args; returns {"output", "style", "palette"} (+ "outputs" for extra formats, "metrics" when enabled)."""
     if not args.title.strip():
-        print("Error: --title is required unless using --list-presets", file=sys.stderr)
-        sys.exit(1)
+        raise ValueError("--title is required unless using --list-presets")
+
+    seed = args.seed or args.title
+    metrics = wechat_metrics.from_args(args, "create_cover")
+    try:
+        with metrics.span("total"):
+            used_palette = create_cover(
+                title=args.title,
+                subtitle=args.subtitle,
+                output=args.output,
+                style=args.style,
+                palette_name=args.palette,
+                rotate=args.rotate,
+                seed=seed,
+                bg_override=args.bg_color,
+                text_override=args.text_color,
+                sub_override=args.sub_color,
+                font_path=args.font or default_font_path(),
+                bg_cache_dir=args.bg_cache_dir,
+                cache_dir=None if args.no_cache else (args.cache_dir or default_cache_dir()),
+                max_bytes=args.max_bytes,
+                progressive=args.progressive,
+                optimize=args.optimize,
+                metrics=metrics,
+                formats=args.formats,
+            )
+        result = {"output": args.output, "style": args.style, "palette": used_palette}
+        if args.formats != ("cover",):
+            result["outputs"] = format_outputs(args.output, args.formats)
+        if metrics.enabled:
+            result["metrics"] = metrics.summary()
+        return result
+    finally:
+        metrics.close()
+
+
+def print_result(result):
+    if result.get("outputs"):
+        for fmt, path in result["outputs"].items():
+            print(f"Cover saved ({fmt}): {path}")
+    else:
+        print(f"Cover saved: {result['output']}")
+    print(f"Style: {result['style']}")
+    print(f"Palette: {result['palette']}")
+    if result.get("metrics"):
+        print(f"Metrics: {json.dumps(result['metrics'], ensure_ascii=False)}")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
 
-    if args.font is None:
-        skill_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        args.font = os.path.join(skill_dir, "assets", "NotoSansCJKsc-Bold.otf")
+    if args.list_presets:
+        print_presets()
+        sys.exit(0)
 
     try:
-        seed = args.seed or args.title
-        used_palette = create_cover(
-            title=args.title,
-            subtitle=args.subtitle,
-            output=args.output,
-            style=args.style,
-            palette_name=args.palette,
-            rotate=args.rotate,
-            seed=seed,
-            bg_override=args.bg_color,
-            text_override=args.text_color,
-            sub_override=args.sub_color,
-            font_path=args.font,
-        )
-        print(f"Cover saved: {args.output}")
-        print(f"Style: {args.style}")
-        print(f"Palette: {used_palette}")
+        print_result(run(args))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
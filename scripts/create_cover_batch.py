@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+批量生成公众号封面（进程池并行，每个进程只加载一次字体）。
+
+任务文件为 JSONL（每行一个对象）或 CSV（首行为表头），字段:
+  title（必填）, subtitle, style, palette, rotate, seed, output,
+  bg_color, text_color, sub_color
+
+用法:
+  python3 create_cover_batch.py jobs.jsonl --output-dir covers/
+  python3 create_cover_batch.py jobs.csv --jobs 8 --results results.jsonl
+  python3 create_cover_batch.py jobs.jsonl --formats cover,cover@2x,square   # 每个任务一次渲染多种格式
+
+每个任务的结果（输出路径、实际配色、耗时、错误）写入结果清单（JSONL）。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import create_cover as cc
+
+
+def load_jobs(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            return [dict(row) for row in csv.DictReader(f)]
+        jobs = []
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                jobs.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON: {e}")
+        return jobs
+
+
+_worker = {}
+
+
+def _init_worker(font_path, cache_dir, bg_cache_dir, formats=("cover",)):
+    # fonts are loaded once per worker; load_font's lru_cache keeps them for every job
+    _worker.update(font_path=font_path, cache_dir=cache_dir, bg_cache_dir=bg_cache_dir, formats=formats)
+    cc.load_font(font_path, 52)
+    cc.load_font(font_path, 28)
+
+
+def _render_job(item):
+    index, job = item
+    started = time.perf_counter()
+    result = {"index": index, "title": job.get("title", ""), "output": job["output"], "style": job.get("style") or "minimal-grid"}
+    try:
+        title = job.get("title") or ""
+        if not title.strip():
+            raise ValueError("title is required")
+        result["palette"] = cc.create_cover(
+            title=title,
+            subtitle=job.get("subtitle") or "",
+            output=job["output"],
+            style=result["style"],
+            palette_name=job.get("palette") or "auto",
+            rotate=job.get("rotate") or "sequential",
+            seed=job.get("seed") or title,
+            bg_override=job.get("bg_color") or None,
+            text_override=job.get("text_color") or None,
+            sub_override=job.get("sub_color") or None,
+            font_path=_worker["font_path"],
+            bg_cache_dir=_worker["bg_cache_dir"],
+            cache_dir=_worker["cache_dir"],
+            formats=_worker["formats"],
+        )
+        if _worker["formats"] != ("cover",):
+            result["outputs"] = cc.format_outputs(job["output"], _worker["formats"])
+        result["ok"] = True
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = str(e)
+    result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def run_batch(jobs, font_path, workers, cache_dir=None, bg_cache_dir=None, formats=("cover",)):
+    """Render (index, job) pairs across a process pool; yields results in job order."""
+    workers = max(1, min(workers, len(jobs)))
+    initargs = (font_path, cache_dir, bg_cache_dir, formats)
+    if workers == 1:
+        _init_worker(*initargs)
+        yield from map(_render_job, jobs)
+        return
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.map(_render_job, jobs, chunksize=chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量生成公众号封面")
+    parser.add_argument("jobs_file", help="任务文件（.jsonl 或 .csv）")
+    parser.add_argument("--output-dir", default=".", help="任务未指定 output 时的输出目录，相对 output 也以此为基准")
+    parser.add_argument("--results", default=None, help="结果清单路径（默认 <任务文件>.results.jsonl）")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("--font", default=None, help="字体文件路径（默认 assets/NotoSansCJKsc-Bold.otf）")
+    parser.add_argument("--bg-cache-dir", default=os.environ.get("COVER_BG_CACHE_DIR"), help="背景层磁盘缓存目录")
+    parser.add_argument("--cache-dir", default=None, help="成品封面缓存目录（默认同 create_cover.py）")
+    parser.add_argument("--no-cache", action="store_true", help="不读写成品封面缓存")
+    parser.add_argument("--formats", type=cc.parse_formats, default=("cover",), help="逗号分隔的输出格式（同 create_cover.py --formats）")
+    args = parser.parse_args()
+
+    font_path = args.font or cc.default_font_path()
+    if not os.path.exists(font_path):
+        print(f"Error: Font not found: {font_path}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        raw_jobs = load_jobs(args.jobs_file)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = []
+    for i, job in enumerate(raw_jobs):
+        job = dict(job)
+        job["output"] = os.path.join(args.output_dir, job.get("output") or f"cover-{i + 1:04d}.jpg")
+        jobs.append((i, job))
+
+    results_path = args.results or f"{args.jobs_file}.results.jsonl"
+    cache_dir = None if args.no_cache else (args.cache_dir or cc.default_cache_dir())
+    started = time.perf_counter()
+    failed = 0
+    with open(results_path, "w", encoding="utf-8") as out:
+        for result in run_batch(jobs, font_path, args.jobs, cache_dir, args.bg_cache_dir, args.formats):
+            failed += 0 if result["ok"] else 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    elapsed = time.perf_counter() - started
+
+    print(f"Rendered {len(jobs) - failed}/{len(jobs)} covers in {elapsed:.2f}s")
+    print(f"Results: {results_path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,20 @@
 用法:
   python3 create_cover_preview_grid.py
   python3 create_cover_preview_grid.py --title "封面预览" --output /path/to/grid.jpg
+  python3 create_cover_preview_grid.py --jobs 8
+  python3 create_cover_preview_grid.py --mode subprocess   # 旧流程：逐个调用 create_cover.py
+
+默认 inprocess 模式在进程池内直接调用 create_cover，按格子尺寸渲染背景与标题
+（不先画整张封面再缩小）；格子缓存在 cells/ 下，缓存键与 create_cover 的封面
+缓存相同（含渲染器版本与字体内容哈希），只有会改变像素的组合才会重新渲染。
 """
 
 import argparse
+import json
 import os
 import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from PIL import Image, ImageDraw, ImageFont
@@ -21,6 +30,9 @@ from PIL import Image, ImageDraw, ImageFont
 STYLES = ["minimal-grid", "card-editorial", "diagonal-motion", "soft-gradient"]
 PALETTES = ["blue-tech", "purple-insight", "green-growth", "orange-energy", "rose-story", "slate-pro"]
 
+CELL_W, CELL_H = 300, 128
+COVER_TITLE = "AI 创作提效"
+
 
 def load_font(size: int):
     candidates = [
@@ -36,7 +48,7 @@ def load_font(size: int):
     return ImageFont.load_default()
 
 
-def generate_single_previews(skill_dir: Path, singles_dir: Path):
+def generate_single_previews(skill_dir: Path, singles_dir: Path, cover_title: str = COVER_TITLE):
     create_cover = skill_dir / "scripts" / "create_cover.py"
     singles_dir.mkdir(parents=True, exist_ok=True)
 
@@ -47,7 +59,7 @@ def generate_single_previews(skill_dir: Path, singles_dir: Path):
                 "python3",
                 str(create_cover),
                 "--title",
-                "AI 创作提效",
+                cover_title,
                 "--subtitle",
                 f"{s} · {p}",
                 "--style",
@@ -60,8 +72,88 @@ def generate_single_previews(skill_dir: Path, singles_dir: Path):
             subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 
-def build_grid(singles_dir: Path, output: Path, title: str):
-    cell_w, cell_h = 300, 128
+def load_single_previews(singles_dir: Path):
+    cells = {}
+    for s in STYLES:
+        for p in PALETTES:
+            img = Image.open(singles_dir / f"{s}__{p}.jpg").convert("RGB")
+            cells[(s, p)] = img.resize((CELL_W, CELL_H))
+    return cells
+
+
+def _import_create_cover():
+    scripts_dir = str(Path(__file__).resolve().parent)
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    import create_cover
+
+    return create_cover
+
+
+def cell_key(cc, style: str, palette: str, cover_title: str, font_path: str) -> str:
+    """Digest of everything that affects one cell's pixels (create_cover's cache key)."""
+    _, colors = cc.resolve_palette(palette, "sequential", palette)
+    return cc.cover_cache_key(
+        cover_title, f"{style} · {palette}", style, palette, colors, font_path, fmt={"name": "preview-cell", "size": [CELL_W, CELL_H]}
+    )
+
+
+def _render_cell(job):
+    style, palette, cover_title, font_path = job
+    cc = _import_create_cover()
+    _, colors = cc.resolve_palette(palette, "sequential", palette)
+    # drawn at cell size with the styles' pixel sizes scaled down, like create_cover's smaller formats
+    scale = CELL_H / cc.COVER_SIZE[1]
+    img = cc.render_background(style, colors, CELL_W, CELL_H, scale)
+    cc.draw_title_block(ImageDraw.Draw(img), CELL_W, CELL_H, cover_title, f"{style} · {palette}", style, colors, font_path, scale)
+    return style, palette, img.tobytes()
+
+
+def render_cells(cells_dir: Path, cover_title: str, font_path: str, jobs: int):
+    """Render every style × palette cell in-process, reusing unchanged cells.
+
+    Returns ({(style, palette): cell image}, number of re-rendered cells).
+    """
+    cc = _import_create_cover()
+    cells_dir.mkdir(parents=True, exist_ok=True)
+    index_path = cells_dir / "index.json"
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        index = {}
+
+    cells = {}
+    stale = []
+    keys = {}
+    for s in STYLES:
+        for p in PALETTES:
+            name = f"{s}__{p}"
+            keys[name] = cell_key(cc, s, p, cover_title, font_path)
+            cached = cells_dir / f"{name}.png"
+            if index.get(name) == keys[name] and cached.exists():
+                cells[(s, p)] = Image.open(cached).convert("RGB")
+            else:
+                stale.append((s, p, cover_title, font_path))
+
+    if len(stale) > 1 and jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(stale))) as pool:
+            rendered = list(pool.map(_render_cell, stale))
+    else:
+        rendered = [_render_cell(job) for job in stale]
+
+    for s, p, raw in rendered:
+        name = f"{s}__{p}"
+        img = Image.frombytes("RGB", (CELL_W, CELL_H), raw)
+        img.save(cells_dir / f"{name}.png")
+        index[name] = keys[name]
+        cells[(s, p)] = img
+
+    index_path.write_text(json.dumps(index, indent=2, sort_keys=True), encoding="utf-8")
+    return cells, len(rendered)
+
+
+def build_grid(cells, output: Path, title: str):
+    cell_w, cell_h = CELL_W, CELL_H
     left_w = 210
     top_h = 140
     pad = 14
@@ -104,8 +196,7 @@ def build_grid(singles_dir: Path, output: Path, title: str):
 
         for c, p in enumerate(PALETTES):
             x = left_w + pad + c * (cell_w + pad)
-            img = Image.open(singles_dir / f"{s}__{p}.jpg").convert("RGB").resize((cell_w, cell_h))
-            canvas.paste(img, (x, y))
+            canvas.paste(cells[(s, p)], (x, y))
             draw.rectangle((x, y, x + cell_w, y + cell_h), outline=(210, 216, 228), width=1)
 
     output.parent.mkdir(parents=True, exist_ok=True)
@@ -116,6 +207,10 @@ def main():
     parser = argparse.ArgumentParser(description="生成封面风格×配色预览拼图")
     parser.add_argument("--title", default="微信公众号封面预览（风格 × 配色）", help="拼图标题")
     parser.add_argument("--output", default="", help="输出路径")
+    parser.add_argument("--cover-title", default=COVER_TITLE, help="每个格子里封面的主标题")
+    parser.add_argument("--font", default=None, help="封面字体（默认 assets/NotoSansCJKsc-Bold.otf）")
+    parser.add_argument("--mode", default="inprocess", choices=["inprocess", "subprocess"], help="渲染方式")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="inprocess 模式的进程数")
     args = parser.parse_args()
 
     skill_dir = Path(__file__).resolve().parent.parent
@@ -126,8 +221,17 @@ def main():
 
     output = Path(args.output).resolve() if args.output else (base / "cover-style-palette-preview-grid.jpg")
 
-    generate_single_previews(skill_dir, singles)
-    build_grid(singles, output, args.title)
+    if args.mode == "subprocess":
+        generate_single_previews(skill_dir, singles, args.cover_title)
+        cells = load_single_previews(singles)
+    else:
+        font_path = args.font or str(skill_dir / "assets" / "NotoSansCJKsc-Bold.otf")
+        if not os.path.exists(font_path):
+            print(f"Error: Font not found: {font_path}", file=sys.stderr)
+            sys.exit(1)
+        cells, rendered = render_cells(base / "cells", args.cover_title, font_path, max(1, args.jobs))
+        print(f"Rendered {rendered}/{len(cells)} cells", file=sys.stderr)
+    build_grid(cells, output, args.title)
 
     print(output)
 
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+公众号正文 HTML 预检与压缩（单遍流式，仅依赖标准库）。
+
+预检（在任何网络请求之前）:
+  - 拒绝 <script>、on* 事件属性、javascript: 链接
+  - 拒绝外部 CSS（<link rel="stylesheet">、@import），<style> 块会被微信丢弃，给出警告
+  - 图片：开启正文图片上传时检查本地图片是否存在；关闭时只允许 mmbiz 图片；
+    style 中 url(...) 引用的非微信图片无法自动上传，直接拒绝
+  - 正文 HTML（含标签与内联样式，按压缩后计）超过 2 万字符、文字超过 2 万字或超过 1 MB 时拒绝
+
+压缩（渲染结果不变）:
+  - 合并空白，去掉块级标签之间和行首行尾不显示的空白（<pre>/<code>/<textarea> 及 white-space: pre* 的元素内保持原样）
+  - 删除注释；规范化 style 属性（去多余空白与分号，只去掉完全相同的重复声明，兼容写法保留）
+
+Markdown 正文（.md / .markdown）先经 md_to_wechat.py 流式转换，再做同样的预检。
+
+用法:
+  python3 html_preflight.py article.html
+  python3 html_preflight.py article.md --output article.html
+  python3 html_preflight.py article.html --output article.min.html --no-inline-images
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import urllib.parse
+from html.parser import HTMLParser
+
+import md_to_wechat
+
+# draft/add: content must be under 20,000 characters and 1 MB
+CONTENT_MAX_CHARS = 20000
+CONTENT_MAX_BYTES = 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+WECHAT_IMAGE_HOSTS = ("mmbiz.qpic.cn", "mmbiz.qlogo.cn")
+# whitespace next to these never renders, so it can be dropped
+BLOCK_TAGS = frozenset(
+    "address article aside blockquote br dd div dl dt figcaption figure footer h1 h2 h3 h4 h5 h6 "
+    "header hr li ol p pre section table tbody td tfoot th thead tr ul".split()
+)
+VOID_TAGS = frozenset("area base br col embed hr img input link meta source track wbr".split())
+# whitespace inside these is content, so it is passed through untouched
+PREFORMATTED_TAGS = frozenset(("pre", "textarea", "code"))
+PRE_STYLE_RE = re.compile(r"(?:^|;)\s*white-space\s*:\s*(?:pre|pre-wrap|pre-line|break-spaces)\b", re.IGNORECASE)
+
+WHITESPACE_RE = re.compile(r"[ \t\n\r\f]+")
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)(.*?)\1\s*\)""", re.IGNORECASE)
+
+
+def is_wechat_image(src):
+    host = urllib.parse.urlsplit(src).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in WECHAT_IMAGE_HOSTS)
+
+
+def _split_css(text, sep):
+    """Split on sep outside quotes and parentheses."""
+    parts, buf, quote, depth = [], [], None, 0
+    for ch in text:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        elif ch == sep and depth == 0:
+            parts.append("".join(buf))
+            buf = []
+            continue
+        buf.append(ch)
+    parts.append("".join(buf))
+    return parts
+
+
+def _compact_css_value(value):
+    out, quote, space = [], None, False
+    for ch in value.strip():
+        if quote:
+            out.append(ch)
+            if ch == quote:
+                quote = None
+            continue
+        if ch in " \t\n\r\f":
+            space = True
+            continue
+        if space and out and out[-1] not in ",(" and ch not in ",)":
+            out.append(" ")
+        space = False
+        if ch in "\"'":
+            quote = ch
+        out.append(ch)
+    return "".join(out)
+
+
+def normalize_style(style):
+    """Minify a style attribute; only exact repeats of a declaration are dropped.
+
+    Differing values of one property stay: they are fallbacks for clients
+    that reject the later one (background:#fff;background:linear-gradient(...)).
+    """
+    decls = {}
+    for part in _split_css(style, ";"):
+        prop, colon, value = part.partition(":")
+        prop = prop.strip().lower()
+        value = _compact_css_value(value)
+        if not colon or not prop or not value:
+            continue  # browsers ignore these
+        if value.lower().endswith("!important"):
+            value = value[: -len("!important")].rstrip() + "!important"
+        # the repeat moves to the last position, so shorthand/longhand order is kept
+        decls.pop((prop, value), None)
+        decls[(prop, value)] = True
+    return ";".join(f"{prop}:{value}" for prop, value in decls)
+
+
+def _escape_text(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_attr(value):
+    return value.replace("&", "&amp;").replace('"', "&quot;")
+
+
+class PreflightResult:
+    def __init__(self, html_text, errors, warnings, stats):
+        self.html = html_text
+        self.errors = errors
+        self.warnings = warnings
+        self.stats = stats
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+class Preflight(HTMLParser):
+    """Validates and (optionally) compacts HTML as it is fed, in one pass."""
+
+    def __init__(self, inline_images=True, base_dir=None, compact=True):
+        super().__init__(convert_charrefs=True)
+        self.inline_images = inline_images
+        self.base_dir = base_dir
+        self.compact = compact
+        self.errors = []
+        self.warnings = []
+        self.out = []
+        self.text_chars = 0
+        self.bytes_in = 0
+        self.replaced_bytes = 0  # data: URIs that inline upload swaps for short URLs
+        self._raw = []
+        self._pre_tags = []  # open elements whose whitespace must be preserved
+        self._in_style = False
+        self._boundary = True  # at the start of a block: leading whitespace is invisible
+        self._pending_space = False
+        self._last_space = False
+
+    def _where(self):
+        return f"line {self.getpos()[0]}"
+
+    def error(self, message):
+        self.errors.append(f"{self._where()}: {message}")
+
+    def warn(self, message):
+        self.warnings.append(f"{self._where()}: {message}")
+
+    def feed(self, data):
+        self.bytes_in += len(data.encode("utf-8"))
+        if not self.compact:
+            self._raw.append(data)
+        super().feed(data)
+
+    # checks
+
+    def _check_image(self, src, where):
+        if not src:
+            self.error(f"{where} has no src")
+            return
+        scheme = urllib.parse.urlsplit(src).scheme.lower()
+        if scheme in ("http", "https") and is_wechat_image(src):
+            return
+        if not self.inline_images:
+            self.error(f"{where} {src[:80]!r} is not a WeChat (mmbiz) image and inline image upload is off")
+            return
+        if scheme == "data":
+            self.replaced_bytes += len(src)
+        elif scheme in ("", "file"):
+            path = urllib.parse.unquote(urllib.parse.urlsplit(src).path) if scheme == "file" else src
+            if self.base_dir and not os.path.isabs(path):
+                path = os.path.join(self.base_dir, path)
+            if not os.path.isfile(path):
+                self.error(f"{where} not found: {src}")
+        elif scheme not in ("http", "https"):
+            self.error(f"{where} has unsupported src scheme: {src[:80]!r}")
+
+    def _check_attrs(self, tag, attrs):
+        for name, value in attrs:
+            if name.startswith("on"):
+                self.error(f"<{tag}> has a script event handler ({name})")
+            elif name in ("href", "src") and value and value.strip().lower().startswith("javascript:"):
+                self.error(f"<{tag}> has a javascript: URL")
+            elif name == "style" and value:
+                for m in CSS_URL_RE.finditer(value):
+                    url = m.group(2).strip()
+                    if not is_wechat_image(url):
+                        self.error(f"<{tag}> style url() {url[:80]!r} is not a WeChat image and cannot be uploaded automatically")
+        if tag == "img":
+            self._check_image(next((v for n, v in attrs if n == "src"), None), "<img>")
+        elif tag == "link" and "stylesheet" in (dict(attrs).get("rel") or "").lower():
+            self.error("external stylesheet <link> is not allowed; use inline style attributes")
+        elif tag == "script":
+            self.error("<script> is not allowed")
+        elif tag == "style":
+            self.warn("<style> blocks are dropped by WeChat; use inline style attributes")
+
+    # output
+
+    def _emit_tag(self, text, block):
+        if block:
+            self._pending_space = False
+            self._boundary = True
+        elif self._pending_space:
+            self.out.append(" ")
+            self._last_space = True
+            self._pending_space = False
+        self.out.append(text)
+        if block:
+            self._last_space = False
+
+    def _format_attrs(self, attrs):
+        parts, seen = [], set()
+        for name, value in attrs:
+            if name in seen:
+                continue  # the first occurrence is the one HTML uses
+            seen.add(name)
+            if name == "style" and value is not None:
+                value = normalize_style(value)
+                if not value:
+                    continue
+            parts.append(f" {name}" if value is None else f' {name}="{_escape_attr(value)}"')
+        return "".join(parts)
+
+    @property
+    def _pre(self):
+        return bool(self._pre_tags)
+
+    def handle_starttag(self, tag, attrs):
+        self._check_attrs(tag, attrs)
+        if tag == "style":
+            self._in_style = True
+        if tag not in VOID_TAGS and (
+            tag in PREFORMATTED_TAGS or PRE_STYLE_RE.search(next((v for n, v in attrs if n == "style"), None) or "")
+        ):
+            self._pre_tags.append(tag)
+        if not self.compact:
+            return
+        self._emit_tag(f"<{tag}{self._format_attrs(attrs)}>", tag in BLOCK_TAGS)
+
+    def handle_startendtag(self, tag, attrs):
+        self._check_attrs(tag, attrs)
+        if not self.compact:
+            return
+        close = ">" if tag in VOID_TAGS else "/>"
+        self._emit_tag(f"<{tag}{self._format_attrs(attrs)}{close}", tag in BLOCK_TAGS)
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+        if tag in self._pre_tags:
+            # close the innermost match and anything left unclosed inside it
+            del self._pre_tags[len(self._pre_tags) - 1 - self._pre_tags[::-1].index(tag):]
+        if not self.compact:
+            return
+        self._emit_tag(f"</{tag}>", tag in BLOCK_TAGS)
+
+    def handle_data(self, data):
+        if self.cdata_elem:
+            # raw <script>/<style> content
+            if self._in_style and "@import" in data.lower():
+                self.error("@import of external CSS is not allowed")
+            if self.compact:
+                self.out.append(data)
+            return
+        if self._pre:
+            self.text_chars += len(data)
+            if self.compact:
+                self.out.append(_escape_text(data))
+                self._boundary = False
+                self._last_space = data[-1:].isspace()
+            return
+
+        collapsed = WHITESPACE_RE.sub(" ", data)
+        self.text_chars += len(collapsed.strip())
+        if not self.compact:
+            return
+        text = collapsed.strip(" ")
+        if not text:
+            if not self._boundary and not self._last_space:
+                self._pending_space = True
+            return
+        if collapsed[0] == " " and not self._boundary and not self._last_space:
+            self._pending_space = True
+        if self._pending_space:
+            self.out.append(" ")
+            self._pending_space = False
+        self.out.append(_escape_text(text))
+        self._boundary = False
+        self._last_space = False
+        if collapsed[-1] == " ":
+            self._pending_space = True
+
+    def handle_comment(self, data):
+        pass
+
+    def handle_decl(self, decl):
+        if self.compact:
+            self.out.append(f"<!{decl}>")
+
+    def result(self):
+        self.close()
+        text = ("".join(self.out) if self.compact else "".join(self._raw)).strip()
+        size = len(text.encode("utf-8")) - self.replaced_bytes
+        if size > CONTENT_MAX_BYTES:
+            self.errors.append(f"content is {size} bytes, over the {CONTENT_MAX_BYTES} byte limit")
+        # WeChat counts the submitted HTML, markup and inline styles included; the visible
+        # text is checked too so the error says which one is over
+        html_chars = len(text) - self.replaced_bytes
+        if html_chars > CONTENT_MAX_CHARS:
+            self.errors.append(
+                f"content HTML is {html_chars} characters (markup and styles included), over the {CONTENT_MAX_CHARS} limit"
+            )
+        if self.text_chars > CONTENT_MAX_CHARS:
+            self.errors.append(f"content text has {self.text_chars} characters, over the {CONTENT_MAX_CHARS} limit")
+        stats = {
+            "bytes_in": self.bytes_in,
+            "bytes_out": len(text.encode("utf-8")),
+            "html_chars": html_chars,
+            "text_chars": self.text_chars,
+        }
+        return PreflightResult(text, self.errors, self.warnings, stats)
+
+
+def preflight_file(path, inline_images=True, compact=True):
+    """Stream path through Preflight; relative image paths resolve against its folder.
+
+    Markdown files are compiled block by block on the way in.
+    """
+    checker = Preflight(inline_images=inline_images, base_dir=os.path.dirname(os.path.abspath(path)), compact=compact)
+    with open(path, "r", encoding="utf-8") as f:
+        if md_to_wechat.is_markdown(path):
+            chunks = md_to_wechat.compile_lines(f)
+        else:
+            chunks = iter(lambda: f.read(READ_CHUNK_SIZE), "")
+        for chunk in chunks:
+            checker.feed(chunk)
+    return checker.result()
+
+
+def preflight_html(text, inline_images=True, base_dir=None, compact=True):
+    checker = Preflight(inline_images=inline_images, base_dir=base_dir, compact=compact)
+    checker.feed(text)
+    return checker.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="公众号正文 HTML 预检与压缩")
+    parser.add_argument("content_file", help="HTML 或 Markdown 内容文件")
+    parser.add_argument("--output", default=None, help="写出压缩后的 HTML")
+    parser.add_argument("--no-inline-images", action="store_true", help="按不上传正文图片检查（只允许 mmbiz 图片）")
+    args = parser.parse_args()
+
+    try:
+        result = preflight_file(args.content_file, inline_images=not args.no_inline_images)
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    for message in result.warnings:
+        print(f"Warn: {message}", file=sys.stderr)
+    for message in result.errors:
+        print(f"Error: {message}", file=sys.stderr)
+    if args.output and result.ok:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result.html)
+    print(json.dumps(dict(result.stats, ok=result.ok, errors=len(result.errors), warnings=len(result.warnings))))
+    if not result.ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Markdown → 公众号 HTML（按 references/article-style.md 的内联样式，逐行流式，仅依赖标准库）。
+
+对应关系:
+  段落                 <p>（16px、两倍行高）；段内每个换行变成 <br />（短句换行）
+  **重点** / __重点__   <strong style="color: #1a73e8;">
+  *斜体* / _斜体_       <em>
+  ## 标题 / ### 标题    <h2>（蓝色下划线）/ <h3>；章节标题前自动加 <hr />（--no-chapter-rules 关闭）
+  --- / *** / ___      <hr />
+  > 引用               <blockquote>（蓝色左边线）
+  - 列表 / 1. 列表      <ul> / <ol>
+  ``` 代码块 ```        <pre>
+  `代码` [链接](url) ![图](path)   <code> / <a> / <img>（本地图片由发布脚本上传）
+文首的一级标题（# 标题）视为文章标题，不进正文（标题用 --title 传给发布脚本）。
+以块级 HTML 标签开头的段落原样保留，行内 HTML 标签也原样保留。
+
+不建整篇文档树：一次只缓存当前段落/列表，输出边转换边写出，耗时与内存随篇幅线性增长。
+publish_draft.py / article_build.py / html_preflight.py 遇到 .md 正文会自动调用本模块。
+
+用法:
+  python3 md_to_wechat.py article.md --output article.html
+  python3 md_to_wechat.py article.md > article.html
+"""
+import argparse
+import html
+import re
+import sys
+
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+# bump when the generated HTML changes, so cached builds of .md files are redone
+COMPILER_VERSION = 2
+
+# references/article-style.md
+SECTION_STYLE = "font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; padding: 20px; max-width: 100%;"
+P_STYLE = "font-size: 16px; line-height: 2; color: #333; margin: 15px 0; text-align: justify;"
+STRONG_STYLE = "color: #1a73e8;"
+HR_STYLE = "border: none; border-top: 1px solid #eee; margin: 30px 0;"
+H2_STYLE = "font-size: 20px; font-weight: bold; color: #333; margin: 30px 0 15px 0; padding-bottom: 10px; border-bottom: 2px solid #1a73e8;"
+# elements the style guide leaves open, in the same palette
+H3_STYLE = "font-size: 18px; font-weight: bold; color: #333; margin: 25px 0 10px 0;"
+QUOTE_STYLE = "margin: 15px 0; padding: 10px 15px; border-left: 3px solid #1a73e8; background: #f5f8fd; color: #555; font-size: 15px; line-height: 2;"
+LIST_STYLE = "margin: 15px 0; padding-left: 2em; color: #333;"
+LI_STYLE = "font-size: 16px; line-height: 2; margin: 5px 0;"
+PRE_STYLE = "margin: 15px 0; padding: 12px 15px; background: #f6f8fa; border-radius: 4px; font-size: 13px; line-height: 1.6; overflow-x: auto; white-space: pre;"
+CODE_STYLE = "font-family: Menlo, Consolas, monospace; font-size: 14px; background: #f6f8fa; padding: 2px 4px; border-radius: 3px; color: #c7254e;"
+IMG_STYLE = "max-width: 100%; height: auto; display: block; margin: 15px auto;"
+A_STYLE = "color: #1a73e8; text-decoration: none;"
+
+SECTION_OPEN = f'<section style="{SECTION_STYLE}">'
+P_OPEN = f'<p style="{P_STYLE}">'
+STRONG_OPEN = f'<strong style="{STRONG_STYLE}">'
+HR = f'<hr style="{HR_STYLE}" />'
+H2_OPEN = f'<h2 style="{H2_STYLE}">'
+H3_OPEN = f'<h3 style="{H3_STYLE}">'
+QUOTE_OPEN = f'<blockquote style="{QUOTE_STYLE}">'
+LI_OPEN = f'<li style="{LI_STYLE}">'
+PRE_OPEN = f'<pre style="{PRE_STYLE}"><code>'
+CODE_OPEN = f'<code style="{CODE_STYLE}">'
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+HEADING_RE = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+HR_RE = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+QUOTE_RE = re.compile(r"^ {0,3}> ?(.*)$")
+LIST_RE = re.compile(r"^ {0,3}(?:([-*+])|(\d{1,9})[.)])[ \t]+(.*)$")
+HTML_BLOCK_RE = re.compile(
+    r"^ {0,3}(?:<!--|</?(?:address|article|aside|blockquote|div|dl|figure|footer|h[1-6]|header|hr|ol|p|pre|section|table|ul)\b)",
+    re.IGNORECASE,
+)
+# link labels and targets stop at the next bracket/parenthesis, so a failed match never rescans
+# the rest of the paragraph and the scan stays linear
+INLINE_RE = re.compile(
+    r"(?P<escaped>\\[!-/:-@\[-`{-~])"
+    r"|(?P<code>`+)"
+    r"|(?P<image>!\[(?P<alt>[^\[\]\n]*)\]\((?P<src>[^()\s]+)(?:[ \t]+\"[^\"\n]{0,200}\")?\))"
+    r"|(?P<link>\[(?P<label>[^\[\]\n]*)\]\((?P<href>[^()\s]+)(?:[ \t]+\"[^\"\n]{0,200}\")?\))"
+    r"|(?P<tag></?[A-Za-z][A-Za-z0-9]*(?:\s+[A-Za-z_:][\w:.-]*(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'=<>`]+))?)*\s*/?>)"
+    r"|(?P<emph>\*{1,3}|_{1,3})"
+    r"|(?P<br>\n)"
+)
+CLOSE_TAGS = {"**": "</strong>", "__": "</strong>", "*": "</em>", "_": "</em>"}
+
+
+def is_markdown(path):
+    return str(path).lower().endswith(MARKDOWN_EXTENSIONS)
+
+
+def _escape(text):
+    return html.escape(text, quote=False)
+
+
+def _closing_run(text, run, start):
+    """Index of the next backtick run exactly as long as run, or -1."""
+    i = text.find(run, start)
+    while i >= 0:
+        end = i + len(run)
+        if end == len(text) or text[end] != "`":
+            return i
+        while end < len(text) and text[end] == "`":
+            end += 1
+        i = text.find(run, end)
+    return -1
+
+
+def render_inline(text):
+    """Inline Markdown to HTML in one left-to-right pass; newlines become <br />.
+
+    Emphasis markers are kept as literal text until their closer shows up,
+    so unmatched ones simply stay visible. A *** run nests whichever way its
+    closers ask for, innermost first:
+
+    >>> render_inline("*a **b***").replace(STRONG_OPEN, "<strong>")
+    '<em>a <strong>b</strong></em>'
+    >>> render_inline("***a** b*").replace(STRONG_OPEN, "<strong>")
+    '<em><strong>a</strong> b</em>'
+    >>> render_inline("***a***").replace(STRONG_OPEN, "<strong>")
+    '<strong><em>a</em></strong>'
+    """
+    out = []
+    # (marker, index of its placeholder in out); the placeholder is the marker's literal
+    # text, followed by the tags of parts of a *** run that have already closed
+    openers = []
+    open_counts = dict.fromkeys(list(CLOSE_TAGS) + ["***", "___"], 0)
+
+    def close(part):
+        """Close the innermost opener that part can close (a lone part or a *** run)."""
+        triple = part[0] * 3
+        k = len(openers) - 1
+        while openers[k][0] not in (part, triple):
+            k -= 1
+        # openers above the match cannot close any more: they stay literal
+        for marker, _ in openers[k + 1 :]:
+            open_counts[marker] -= 1
+        del openers[k + 1 :]
+        marker, at = openers.pop()
+        open_counts[marker] -= 1
+        tag = STRONG_OPEN if len(part) == 2 else "<em>"
+        if marker == triple:
+            # part becomes the inner tag; the rest of the run stays open around it
+            rest = part[0] * (3 - len(part))
+            out[at] = rest + tag
+            openers.append((rest, at))
+            open_counts[rest] += 1
+        else:
+            out[at] = tag + out[at][len(part) :]
+        out.append(CLOSE_TAGS[part])
+
+    def can_close_part(part):
+        return open_counts[part] + open_counts[part[0] * 3] > 0
+    unclosed_runs = set()  # backtick run lengths with no closer further on
+    i, n = 0, len(text)
+    while i < n:
+        m = INLINE_RE.search(text, i)
+        if m is None:
+            out.append(_escape(text[i:]))
+            break
+        if m.start() > i:
+            out.append(_escape(text[i : m.start()]))
+        i = m.end()
+        # nested groups close before their parent, so lastgroup names the outer alternative
+        kind = m.lastgroup
+        tok = m.group()
+        if kind == "escaped":
+            out.append(_escape(tok[1]))
+        elif kind == "br":
+            out.append("<br />")
+        elif kind == "tag":
+            out.append(tok)
+        elif kind == "code":
+            end = -1 if len(tok) in unclosed_runs else _closing_run(text, tok, i)
+            if end < 0:
+                unclosed_runs.add(len(tok))
+                out.append(tok)
+                continue
+            code = text[i:end].replace("\n", " ")
+            if code.startswith(" ") and code.endswith(" ") and code.strip():
+                code = code[1:-1]
+            out.append(CODE_OPEN + _escape(code) + "</code>")
+            i = end + len(tok)
+        elif kind == "image":
+            src = html.escape(m.group("src"))
+            out.append(f'<img src="{src}" alt="{html.escape(m.group("alt"))}" style="{IMG_STYLE}" />')
+        elif kind == "link":
+            out.append(f'<a href="{html.escape(m.group("href"))}" style="{A_STYLE}">{render_inline(m.group("label"))}</a>')
+        else:
+            prev = text[m.start() - 1] if m.start() else " "
+            nxt = text[i] if i < n else " "
+            intraword = tok[0] == "_"
+            can_close = not prev.isspace() and not (intraword and nxt.isalnum())
+            can_open = not nxt.isspace() and not (intraword and prev.isalnum())
+            left = tok
+            if can_close and len(tok) < 3:
+                if can_close_part(tok):
+                    close(tok)
+                    left = ""
+            elif can_close and (can_close_part(tok[0]) or can_close_part(tok[:2])):
+                k = len(openers) - 1
+                while openers[k][0][0] != tok[0]:
+                    k -= 1
+                if openers[k][0] == tok:
+                    # *** closing *** : strong outside, emphasis inside
+                    close(tok[0])
+                    close(tok[:2])
+                    left = ""
+                else:
+                    # the innermost open part closes first, then the other one if it can
+                    first = openers[k][0]
+                    other = tok[0] * (3 - len(first))
+                    close(first)
+                    left = other
+                    if can_close_part(other):
+                        close(other)
+                        left = ""
+            if left:
+                if can_open:
+                    openers.append((left, len(out)))
+                    open_counts[left] += 1
+                out.append(left)
+    return "".join(out)
+
+
+class MarkdownCompiler:
+    """Line-at-a-time Markdown to article-style HTML.
+
+    feed(line) returns the HTML of every block the line completes; close()
+    flushes the last one. Only the block being built is held in memory.
+    """
+
+    def __init__(self, chapter_rules=True):
+        self.chapter_rules = chapter_rules
+        self.title = None
+        self._kind = None  # "p", "quote", "list", "code" or "html"
+        self._lines = []
+        self._list_tag = None
+        self._fence = None
+        self._code_lines = 0
+        self._blocks = 0
+        self._last = None
+
+    def _emit(self, block, kind):
+        self._blocks += 1
+        self._last = kind
+        return "\n" + block + "\n"
+
+    def _flush(self):
+        kind, lines = self._kind, self._lines
+        self._kind, self._lines = None, []
+        if kind == "p":
+            return [self._emit(P_OPEN + render_inline("\n".join(lines)) + "</p>", "p")]
+        if kind == "quote":
+            return [self._emit(QUOTE_OPEN + render_inline("\n".join(lines)) + "</blockquote>", "quote")]
+        if kind == "list":
+            tag, start = self._list_tag
+            attrs = f' start="{start}"' if tag == "ol" and start != 1 else ""
+            items = "".join(LI_OPEN + render_inline("\n".join(item)) + "</li>" for item in lines)
+            return [self._emit(f'<{tag}{attrs} style="{LIST_STYLE}">{items}</{tag}>', "list")]
+        if kind == "html":
+            return [self._emit("\n".join(lines), "html")]
+        return []
+
+    def _heading(self, level, text):
+        if level == 1 and self._blocks == 0 and self.title is None and not self._kind:
+            # the article title travels separately (--title); WeChat shows it above the body
+            self.title = text
+            return []
+        out = []
+        if level <= 2 and self.chapter_rules and self._blocks and self._last != "hr":
+            out.append(self._emit(HR, "hr"))
+        opener, close = (H2_OPEN, "</h2>") if level <= 2 else (H3_OPEN, "</h3>")
+        out.append(self._emit(opener + render_inline(text) + close, "h"))
+        return out
+
+    def feed(self, line):
+        line = line.rstrip("\r\n")
+        if self._kind == "code":
+            if line.lstrip(" ").startswith(self._fence) and not line.strip().strip(self._fence[0]):
+                self._kind = None
+                return ["</code></pre>\n"]
+            self._code_lines += 1
+            return [("\n" if self._code_lines > 1 else "") + _escape(line)]
+        if self._kind == "html":
+            if line.strip():
+                self._lines.append(line)
+                return []
+            return self._flush()
+
+        if not line.strip():
+            return self._flush()
+        fence = FENCE_RE.match(line)
+        if fence:
+            out = self._flush()
+            self._kind, self._fence, self._code_lines = "code", fence.group(1), 0
+            # code lines stream straight through; the block is counted when it opens
+            self._blocks += 1
+            self._last = "code"
+            return out + ["\n" + PRE_OPEN]
+        heading = HEADING_RE.match(line)
+        if heading:
+            return self._flush() + self._heading(len(heading.group(1)), heading.group(2) or "")
+        if HR_RE.match(line):
+            return self._flush() + [self._emit(HR, "hr")]
+        quote = QUOTE_RE.match(line)
+        if quote:
+            out = self._flush() if self._kind != "quote" else []
+            self._kind = "quote"
+            self._lines.append(quote.group(1).strip())
+            return out
+        item = LIST_RE.match(line)
+        if item:
+            tag = "ul" if item.group(1) else "ol"
+            out = []
+            if self._kind != "list" or self._list_tag[0] != tag:
+                out = self._flush()
+                self._kind, self._list_tag = "list", (tag, int(item.group(2) or 1))
+            self._lines.append([item.group(3).strip()])
+            return out
+        if HTML_BLOCK_RE.match(line):
+            out = self._flush()
+            self._kind = "html"
+            self._lines.append(line)
+            return out
+        if self._kind == "list":
+            # continuation of the last item
+            self._lines[-1].append(line.strip())
+            return []
+        if self._kind not in ("p", "quote"):
+            out = self._flush()
+            self._kind = "p"
+            self._lines.append(line.strip())
+            return out
+        self._lines.append(line.strip())
+        return []
+
+    def close(self):
+        if self._kind == "code":
+            self._kind = None
+            return ["</code></pre>\n"]
+        return self._flush()
+
+
+def compile_lines(lines, chapter_rules=True):
+    """Yield the HTML of an article, block by block, from an iterable of Markdown lines."""
+    compiler = MarkdownCompiler(chapter_rules)
+    yield SECTION_OPEN + "\n"
+    for line in lines:
+        yield from compiler.feed(line)
+    yield from compiler.close()
+    yield "\n</section>\n"
+
+
+def compile_text(text, chapter_rules=True):
+    return "".join(compile_lines(text.splitlines(), chapter_rules))
+
+
+def compile_file(path, output, chapter_rules=True):
+    with open(path, "r", encoding="utf-8") as src:
+        for chunk in compile_lines(src, chapter_rules):
+            output.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把 Markdown 转成公众号内联样式 HTML")
+    parser.add_argument("markdown_file", help="Markdown 文件")
+    parser.add_argument("--output", default=None, help="输出 HTML 文件（默认写到标准输出）")
+    parser.add_argument("--no-chapter-rules", action="store_true", help="章节标题前不自动加分隔线")
+    args = parser.parse_args()
+
+    try:
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                compile_file(args.markdown_file, out, not args.no_chapter_rules)
+        else:
+            compile_file(args.markdown_file, sys.stdout, not args.no_chapter_rules)
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
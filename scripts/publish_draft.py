@@ -12,16 +12,66 @@
     --appid <APPID> \
     --appsecret <APPSECRET>
 
+--content-file 也可以是 Markdown（article.md），会按 references/article-style.md 转成内联样式 HTML。
+
 也支持环境变量:
   WX_APPID, WX_APPSECRET, WX_AUTHOR
+
+access_token 按 appid 缓存在 $WX_CACHE_DIR/tokens/（默认 ~/.cache/wechat-article-skill），
+过期前自动刷新，多个发布进程通过文件锁共享同一次获取。
 """
 import argparse
+import base64
+import contextlib
+import hashlib
+import html
+import http.client
 import json
+import math
+import mimetypes
 import os
-import subprocess
+import random
+import re
+import ssl
 import sys
+import threading
+import time
 import urllib.parse
 import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import html_preflight
+import wechat_metrics
+
+# refresh this many seconds before WeChat says the token expires
+TOKEN_REFRESH_MARGIN = 300
+# access_token invalid / expired
+TOKEN_EXPIRED_ERRCODES = (40001, 40014, 42001)
+# invalid media_id (e.g. a cached material deleted in the backend)
+INVALID_MEDIA_ERRCODE = 40007
+
+# transient errcodes worth retrying: system busy, API frequency / quota limits
+RETRYABLE_ERRCODES = (-1, 45009, 45011)
+RATE_LIMIT_ERRCODES = (45009, 45011)
+# rate-limit errors back off this many times longer than other retries
+RATE_LIMIT_BACKOFF = 4
+# requests per second per endpoint (token bucket); ENDPOINT_RATES caps specific endpoints lower
+DEFAULT_RATE = 10.0
+ENDPOINT_RATES = {
+    "cgi-bin/material/add_material": 5.0,
+    "cgi-bin/draft/add": 5.0,
+}
+# a repeat after an ambiguous failure could create a duplicate
+NON_IDEMPOTENT_ENDPOINTS = ("cgi-bin/draft/add",)
+
+# upload size limits enforced by WeChat
+IMAGE_MATERIAL_MAX_BYTES = 10 * 1024 * 1024  # material/add_material type=image
+UPLOADIMG_MAX_BYTES = 1024 * 1024  # media/uploadimg (body images)
+
+DEFAULT_TIMEOUT = float(os.environ.get("WX_HTTP_TIMEOUT") or 20)
+DEFAULT_UPLOAD_TIMEOUT = 120.0
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
 
 def fail(msg, code=1):
@@ -29,173 +79,1535 @@ def fail(msg, code=1):
     sys.exit(code)
 
 
-def http_get_json(url, timeout=20):
-    try:
-        with urllib.request.urlopen(url, timeout=timeout) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except Exception as e:
-        fail(f"HTTP GET failed: {e}")
+class InputError(ValueError):
+    """Invalid arguments, manifest or input files (nothing was sent yet)."""
+
 
+class WeChatAPIError(Exception):
+    """Non-success payload from a WeChat API call."""
 
-def http_post_json(url, payload, timeout=20):
+    def __init__(self, action, data):
+        super().__init__(f"{action} failed: {data}")
+        self.action = action
+        self.data = data
+        self.errcode = data.get("errcode") if isinstance(data, dict) else None
+
+
+def cache_dir():
+    return os.environ.get("WX_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "wechat-article-skill")
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive advisory lock shared across processes (no-op where fcntl is missing)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as fh:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def read_json_file(path):
     try:
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-            method="POST",
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_file(path, data):
+    # write-then-rename so readers never see a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class WeChatHTTPError(Exception):
+    """Transport-level failure talking to the WeChat API (network, HTTP status, non-JSON body).
+
+    retryable: a repeat may succeed (timeouts, resets, HTTP 5xx).
+    ambiguous: the request was fully sent before the failure, so the server
+    may already have acted on it.
+    """
+
+    def __init__(self, msg, retryable=False, ambiguous=False, status=None):
+        super().__init__(msg)
+        self.retryable = retryable
+        self.ambiguous = ambiguous
+        self.status = status
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestScheduler:
+    """Retry, backoff, per-endpoint rate limiting and a global concurrency cap.
+
+    Every WeChatClient call goes through run(): at most max_concurrency
+    requests are in flight, each endpoint is throttled by its own token
+    bucket, and retryable failures (transport errors, RETRYABLE_ERRCODES)
+    are retried with exponential backoff and full jitter. Non-idempotent
+    calls are not repeated after an ambiguous transport failure.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=8.0, max_concurrency=8, rate=None, endpoint_rates=None, metrics=None):
+        self.max_attempts = max(1, max_attempts)
+        self.metrics = metrics or wechat_metrics.NULL
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate = rate or DEFAULT_RATE
+        self.endpoint_rates = dict(ENDPOINT_RATES, **(endpoint_rates or {}))
+        self.retries = 0
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, endpoint):
+        with self._lock:
+            if endpoint not in self._buckets:
+                self._buckets[endpoint] = TokenBucket(min(self.rate, self.endpoint_rates.get(endpoint, self.rate)))
+            return self._buckets[endpoint]
+
+    def backoff(self, attempt, errcode=None):
+        base = self.base_delay * (RATE_LIMIT_BACKOFF if errcode in RATE_LIMIT_ERRCODES else 1)
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+    def run(self, endpoint, fn, idempotent=True):
+        """Call fn() under the endpoint's limits; returns its (decoded) result.
+
+        A dict result whose errcode is retryable is retried; after the last
+        attempt it is returned as-is so the caller raises WeChatAPIError.
+        """
+        bucket = self.bucket(endpoint)
+        for attempt in range(self.max_attempts):
+            last = attempt == self.max_attempts - 1
+            bucket.acquire()
+            try:
+                with self._slots:
+                    result = fn()
+            except WeChatHTTPError as e:
+                if last or not e.retryable or (e.ambiguous and not idempotent):
+                    raise
+                delay = self.backoff(attempt)
+                reason = f"http{e.status}" if e.status else "transport"
+            else:
+                errcode = result.get("errcode") if isinstance(result, dict) else None
+                if last or errcode not in RETRYABLE_ERRCODES:
+                    return result
+                delay = self.backoff(attempt, errcode)
+                reason = errcode
+            with self._lock:
+                self.retries += 1
+            self.metrics.add("retries", endpoint=endpoint, reason=reason)
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+
+class WeChatClient:
+    """Pooled keep-alive HTTP(S) connections to the WeChat API.
+
+    One client is shared by the token, upload and draft calls so a publish
+    run reuses a single TLS session. base_url defaults to $WX_API_BASE or
+    https://api.weixin.qq.com, which also lets tests point at a local server.
+    """
+
+    def __init__(self, base_url=None, timeout=DEFAULT_TIMEOUT, upload_timeout=DEFAULT_UPLOAD_TIMEOUT, pool_size=4, scheduler=None, metrics=None):
+        base_url = base_url or os.environ.get("WX_API_BASE") or "https://api.weixin.qq.com"
+        parsed = urllib.parse.urlsplit(base_url)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported API base URL: {base_url}")
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.upload_timeout = upload_timeout
+        self.pool_size = pool_size
+        self.scheduler = scheduler or RequestScheduler()
+        self.metrics = metrics or wechat_metrics.NULL
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self, timeout):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=ssl.create_default_context())
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def url(self, path, params=None):
+        q = f"?{urllib.parse.urlencode(params)}" if params else ""
+        return f"{self.prefix}/{path.lstrip('/')}{q}"
+
+    def request(self, method, path, params=None, body=b"", headers=None, timeout=None):
+        """Send one request and return (status, body bytes).
+
+        body is bytes or a zero-arg callable returning an iterable of byte
+        chunks (streamed as-is; headers must then carry Content-Length).
+        A reused connection that the server already closed is retried once
+        on a fresh connection, but only if the request never fully went out
+        or the endpoint is idempotent: a non-idempotent call (draft/add) the
+        server may already have executed is left to the caller as ambiguous.
+        """
+        timeout = timeout or self.timeout
+        target = self.url(path, params)
+        headers = dict(headers or {})
+        if not callable(body):
+            headers["Content-Length"] = str(len(body))
+
+        with self.metrics.span("http", endpoint=path):
+            for attempt in (0, 1):
+                conn, reused = self._acquire(timeout)
+                if not reused:
+                    self.metrics.add("http_connections")
+                sent = False
+                nbytes = 0
+                try:
+                    conn.putrequest(method, target, skip_accept_encoding=True)
+                    for k, v in headers.items():
+                        conn.putheader(k, v)
+                    conn.endheaders()
+                    for chunk in body() if callable(body) else (body,):
+                        if chunk:
+                            conn.send(chunk)
+                            nbytes += len(chunk)
+                    sent = True
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                    conn.close()
+                    if reused and attempt == 0 and (not sent or path not in NON_IDEMPOTENT_ENDPOINTS):
+                        continue
+                    raise WeChatHTTPError(f"{method} {path} failed: {e}", retryable=True, ambiguous=sent) from e
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    raise WeChatHTTPError(f"{method} {path} failed: {e}", retryable=True, ambiguous=sent) from e
+
+                self.metrics.add("http_bytes_sent", nbytes, endpoint=path)
+                self.metrics.add("http_bytes_received", len(data), endpoint=path)
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if resp.status >= 400:
+                    raise WeChatHTTPError(
+                        f"{method} {path} returned HTTP {resp.status}: {data[:300]!r}",
+                        retryable=resp.status >= 500 or resp.status == 429,
+                        ambiguous=resp.status >= 500,
+                        status=resp.status,
+                    )
+                return resp.status, data
+            raise AssertionError("unreachable")
+
+    def _decode(self, path, data):
+        try:
+            result = json.loads(data.decode("utf-8"))
+        except ValueError:
+            raise WeChatHTTPError(f"{path} returned non-json: {data[:300]!r}")
+        if isinstance(result, dict) and result.get("errcode"):
+            self.metrics.add("errcodes", endpoint=path, errcode=result["errcode"])
+        return result
+
+    def call(self, path, fn):
+        """Run fn() (one HTTP exchange) through the scheduler for endpoint path."""
+        return self.scheduler.run(path, fn, idempotent=path not in NON_IDEMPOTENT_ENDPOINTS)
+
+    def get_json(self, path, params=None):
+        return self.call(path, lambda: self._decode(path, self.request("GET", path, params)[1]))
+
+    def post_json(self, path, params=None, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        return self.call(path, lambda: self._decode(path, self.request("POST", path, params, body, headers)[1]))
+
+    def post_multipart(self, path, params, field, file_path, filename=None):
+        """Upload file_path as multipart/form-data, streaming it in chunks."""
+        filename = filename or os.path.basename(file_path)
+        ctype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        boundary = f"----wechat-article-{uuid.uuid4().hex}"
+        safe_name = filename.replace('"', "_")
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{safe_name}"\r\n'
+            f"Content-Type: {ctype}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        size = len(head) + os.path.getsize(file_path) + len(tail)
+
+        def chunks():
+            yield head
+            with open(file_path, "rb") as f:
+                while True:
+                    chunk = f.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            yield tail
+
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}", "Content-Length": str(size)}
+        return self.call(
+            path,
+            lambda: self._decode(path, self.request("POST", path, params, chunks, headers, timeout=self.upload_timeout)[1]),
         )
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except Exception as e:
-        fail(f"HTTP POST failed: {e}")
-
-
-def get_access_token(appid, appsecret):
-    q = urllib.parse.urlencode(
-        {
-            "grant_type": "client_credential",
-            "appid": appid,
-            "secret": appsecret,
-        }
-    )
-    url = f"https://api.weixin.qq.com/cgi-bin/token?{q}"
-    data = http_get_json(url)
+
+
+def fetch_access_token(client, appid, appsecret):
+    params = {
+        "grant_type": "client_credential",
+        "appid": appid,
+        "secret": appsecret,
+    }
+    with client.metrics.span("token_fetch"):
+        data = client.get_json("cgi-bin/token", params)
     if "access_token" not in data:
-        fail(f"get token failed: {data}")
-    return data["access_token"]
-
-
-def upload_cover(token, image_path):
-    if not shutil_which("curl"):
-        fail("curl not found. Please install curl first.")
-
-    cmd = [
-        "curl",
-        "-sS",
-        "-X",
-        "POST",
-        f"https://api.weixin.qq.com/cgi-bin/material/add_material?access_token={token}&type=image",
-        "-F",
-        f"media=@{image_path}",
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        fail(f"upload cover failed: {result.stderr.strip() or result.stdout.strip()}")
+        raise WeChatAPIError("get token", data)
+    return data["access_token"], int(data.get("expires_in", 7200))
+
+
+def token_cache_path(appid):
+    return os.path.join(cache_dir(), "tokens", f"{appid}.json")
+
+
+def _usable_token(entry, stale_token=None):
+    if not entry or not entry.get("access_token"):
+        return None
+    if entry["access_token"] == stale_token:
+        return None
+    if entry.get("expires_at", 0) - TOKEN_REFRESH_MARGIN <= time.time():
+        return None
+    return entry["access_token"]
+
+
+def get_access_token(client, appid, appsecret, use_cache=True, stale_token=None):
+    """Return a valid access_token, fetching a new one only when needed.
+
+    stale_token: a token the server just rejected (40001/42001); it is never
+    returned again, but if another process already replaced it the fresh one
+    is reused instead of fetching (and invalidating) yet another.
+    """
+    if not use_cache:
+        return fetch_access_token(client, appid, appsecret)[0]
+
+    path = token_cache_path(appid)
+    token = _usable_token(read_json_file(path), stale_token)
+    if token:
+        return token
+
+    with file_lock(path + ".lock"):
+        # another publisher may have refreshed while we waited for the lock
+        token = _usable_token(read_json_file(path), stale_token)
+        if token:
+            return token
+        token, expires_in = fetch_access_token(client, appid, appsecret)
+        now = time.time()
+        write_json_file(path, {"access_token": token, "fetched_at": now, "expires_at": now + expires_in})
+        return token
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MediaCache:
+    """Local index of uploaded images: sha256 of the bytes -> {media_id, url}.
 
+    One JSON file per (kind, appid) under $WX_CACHE_DIR/media/, so identical
+    covers are uploaded once per account instead of on every publish.
+    """
+
+    def __init__(self, appid, kind="material"):
+        self.path = os.path.join(cache_dir(), "media", f"{kind}-{appid}.json")
+
+    def get(self, digest):
+        return (read_json_file(self.path) or {}).get(digest)
+
+    def put(self, digest, entry):
+        with file_lock(self.path + ".lock"):
+            index = read_json_file(self.path) or {}
+            index[digest] = dict(entry, uploaded_at=int(time.time()))
+            write_json_file(self.path, index)
+
+    def evict(self, digest=None, media_id=None):
+        with file_lock(self.path + ".lock"):
+            index = read_json_file(self.path) or {}
+            drop = [k for k, v in index.items() if k == digest or (media_id and v.get("media_id") == media_id)]
+            for k in drop:
+                del index[k]
+            if drop:
+                write_json_file(self.path, index)
+
+
+def material_exists(client, token, media_id):
+    # images come back as raw bytes; a JSON body means an error such as 40007
+    path = "cgi-bin/material/get_material"
+    body = json.dumps({"media_id": media_id}).encode("utf-8")
+    _, data = client.call(
+        path,
+        lambda: client.request("POST", path, {"access_token": token}, body, {"Content-Type": "application/json"}),
+    )
+    if not data.lstrip().startswith(b"{"):
+        return True
     try:
-        data = json.loads(result.stdout)
-    except Exception:
-        fail(f"upload cover returned non-json: {result.stdout[:300]}")
+        payload = json.loads(data.decode("utf-8"))
+    except ValueError:
+        return True
+    if payload.get("errcode") in TOKEN_EXPIRED_ERRCODES:
+        raise WeChatAPIError("get material", payload)
+    return not payload.get("errcode")
+
+
+def cover_material_name(image_path, digest):
+    # content-addressed, so a synced index finds the material again from any machine
+    return f"{digest[:16]}-{os.path.basename(image_path)}"
 
+
+def cached_material_exists(client, token, entry, index=None):
+    """Whether a media cache entry's material still exists; asks the index first, the API if it cannot tell."""
+    known = index.material_known(entry["media_id"], entry.get("uploaded_at", 0)) if index else None
+    return material_exists(client, token, entry["media_id"]) if known is None else known
+
+
+def upload_cover(client, token, image_path, media_cache=None, validate_cache=False, index=None):
+    """Upload a cover as permanent material and return its media_id.
+
+    With media_cache, byte-identical images already uploaded for the same
+    appid are answered from the local index (optionally checking that the
+    material still exists on the server). With index, a wechat_index.WeChatIndex,
+    a material uploaded earlier under the same content-addressed name is
+    reused even without a media cache entry.
+    """
+    digest = file_sha256(image_path) if media_cache or index else None
+    if media_cache:
+        hit = media_cache.get(digest)
+        if hit and (not validate_cache or cached_material_exists(client, token, hit, index)):
+            return hit["media_id"]
+    if index:
+        found = index.find_material(digest[:16] + "-")
+        if found:
+            if media_cache:
+                media_cache.put(digest, {"media_id": found["media_id"], "url": found.get("url") or ""})
+            return found["media_id"]
+
+    name = cover_material_name(image_path, digest) if digest else None
+    data = client.post_multipart(
+        "cgi-bin/material/add_material",
+        {"access_token": token, "type": "image"},
+        "media",
+        image_path,
+        filename=name,
+    )
     if "media_id" not in data:
-        fail(f"upload cover failed: {data}")
+        raise WeChatAPIError("upload cover", data)
+    if media_cache:
+        media_cache.put(digest, {"media_id": data["media_id"], "url": data.get("url", "")})
+    if index:
+        index.put_material(data["media_id"], name, data.get("url", ""))
     return data["media_id"]
 
 
-def create_draft(token, title, author, digest, content, thumb_media_id, need_open_comment, only_fans_can_comment):
-    payload = {
-        "articles": [
-            {
-                "title": title,
-                "author": author,
-                "digest": digest,
-                "content": content,
-                "thumb_media_id": thumb_media_id,
-                "need_open_comment": int(need_open_comment),
-                "only_fans_can_comment": int(only_fans_can_comment),
-            }
-        ]
+class ArticleContentError(Exception):
+    """Article content that cannot be published as-is (bad image reference, ...)."""
+
+
+IMG_TAG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+IMG_SRC_RE = re.compile(r"""(\ssrc\s*=\s*)(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+
+
+def find_inline_images(content):
+    """Single pass over <img> tags: [(tag start, tag end, src or None)]."""
+    found = []
+    for tag in IMG_TAG_RE.finditer(content):
+        m = IMG_SRC_RE.search(tag.group(0))
+        src = next((g for g in m.groups()[1:] if g is not None), None) if m else None
+        found.append((tag.start(), tag.end(), html.unescape(src).strip() if src else None))
+    return found
+
+
+def _store_inline_bytes(data, ext):
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(cache_dir(), "inline", digest + ext)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return path, digest
+
+
+def resolve_image_source(src, base_dir, timeout=DEFAULT_TIMEOUT):
+    """Return (local file path, sha256) for an <img src>: local path, data: URI or http(s) URL."""
+    if src.startswith("data:"):
+        header, _, payload = src.partition(",")
+        ctype = header[5:].split(";")[0] or "image/png"
+        try:
+            data = base64.b64decode(payload) if ";base64" in header else urllib.parse.unquote_to_bytes(payload)
+        except ValueError as e:
+            raise ArticleContentError(f"bad data: URI image: {e}")
+        return _store_inline_bytes(data, mimetypes.guess_extension(ctype) or ".img")
+
+    if src.startswith("//"):
+        src = "https:" + src
+    scheme = urllib.parse.urlsplit(src).scheme.lower()
+    if scheme in ("http", "https"):
+        try:
+            req = urllib.request.Request(src, headers={"User-Agent": "Mozilla/5.0"})
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                data = resp.read()
+                ctype = resp.headers.get_content_type()
+        except (OSError, ValueError) as e:
+            raise WeChatHTTPError(f"download image failed: {src}: {e}") from e
+        ext = os.path.splitext(urllib.parse.urlsplit(src).path)[1] or mimetypes.guess_extension(ctype) or ".img"
+        return _store_inline_bytes(data, ext)
+
+    path = urllib.parse.unquote(src[len("file://"):] if scheme == "file" else src)
+    path = path if os.path.isabs(path) else os.path.join(base_dir, path)
+    if not os.path.isfile(path):
+        raise ArticleContentError(f"image not found: {src}")
+    return path, file_sha256(path)
+
+
+def upload_inline_image(client, token, image_path, digest=None, media_cache=None):
+    """Upload a body image via media/uploadimg and return its mmbiz URL."""
+    if media_cache:
+        digest = digest or file_sha256(image_path)
+        hit = media_cache.get(digest)
+        if hit:
+            return hit["url"]
+
+    data = client.post_multipart("cgi-bin/media/uploadimg", {"access_token": token}, "media", image_path)
+    if "url" not in data:
+        raise WeChatAPIError("upload image", data)
+    if media_cache:
+        media_cache.put(digest, {"url": data["url"]})
+    return data["url"]
+
+
+def rewrite_inline_images(account, content, base_dir, workers=4):
+    """Upload every non-WeChat <img> in content and point its src at the mmbiz URL.
+
+    Sources are resolved and hashed concurrently, identical bytes are uploaded
+    once, and uploads run on a bounded pool before a single rewrite pass.
+    """
+    found = find_inline_images(content)
+    # images already hosted by WeChat survive draft/add untouched
+    srcs = sorted({src for _, _, src in found if src and not html_preflight.is_wechat_image(src)})
+    if not srcs:
+        return content
+
+    workers = max(1, workers)
+    timeout = account.client.timeout
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resolved = dict(zip(srcs, pool.map(lambda src: resolve_image_source(src, base_dir, timeout), srcs)))
+        unique = {digest: path for path, digest in resolved.values()}
+        urls = dict(zip(unique, pool.map(lambda d: account.upload_inline_image(unique[d], d), unique)))
+
+    out = []
+    last = 0
+    for start, end, src in found:
+        if src not in resolved:
+            continue
+        tag = IMG_SRC_RE.sub(lambda m: f'{m.group(1)}"{html.escape(urls[resolved[src][1]])}"', content[start:end], count=1)
+        out.append(content[last:start])
+        out.append(tag)
+        last = end
+    out.append(content[last:])
+    return "".join(out)
+
+
+MAX_ARTICLES_PER_DRAFT = 8
+# journal entries older than this are dropped on the next write
+JOURNAL_TTL = 30 * 86400
+# an interrupted draft/add is looked for among this many most recent drafts
+DRAFT_LOOKUP_COUNT = 20
+# ...and only drafts saved at most this many seconds before the send count (clock skew)
+DRAFT_LOOKUP_SKEW = 5
+# page size limit of draft/batchget and material/batchget_material
+BATCHGET_COUNT = 20
+
+
+def import_create_cover():
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    if scripts_dir not in sys.path:
+        sys.path.insert(0, scripts_dir)
+    import create_cover
+
+    return create_cover
+
+
+def fit_image_budget(image_path, max_bytes):
+    """Return image_path, or a JPEG re-encoded to fit max_bytes if the file is larger.
+
+    The original file is never modified; re-encoded copies are kept under
+    $WX_CACHE_DIR/prepared/ keyed by source digest and budget.
+    """
+    if not max_bytes or os.path.getsize(image_path) <= max_bytes:
+        return image_path
+
+    out = os.path.join(cache_dir(), "prepared", f"{file_sha256(image_path)[:32]}-{max_bytes}.jpg")
+    if os.path.exists(out):
+        return out
+    try:
+        from PIL import Image
+
+        cc = import_create_cover()
+        with Image.open(image_path) as im:
+            data = cc.encode_jpeg(flatten_image(im), max_bytes, optimize=True)
+    except ImportError:
+        raise ArticleContentError(f"{image_path} exceeds {max_bytes} bytes; install Pillow to re-encode it")
+    except OSError as e:
+        raise ArticleContentError(f"cannot decode image {image_path}: {e}")
+    if len(data) > max_bytes:
+        raise ArticleContentError(f"{image_path} does not fit in {max_bytes} bytes even at the lowest JPEG quality")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    cc.write_bytes(out, data)
+    return out
+
+
+def flatten_image(im):
+    # JPEG has no alpha: composite transparent images onto white
+    if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+        from PIL import Image
+
+        im = im.convert("RGBA")
+        bg = Image.new("RGB", im.size, (255, 255, 255))
+        bg.paste(im, mask=im.getchannel("A"))
+        return bg
+    return im.convert("RGB")
+
+
+COVER_SIZE = (900, 383)  # 2.35:1
+
+
+def prepare_cover_image(image_path, max_bytes=IMAGE_MATERIAL_MAX_BYTES, size=COVER_SIZE):
+    """Return an upload-ready cover: EXIF-oriented, center-cropped and scaled to size, JPEG.
+
+    Large JPEGs are decoded at reduced scale (draft mode) and downscaled with
+    Pillow's reducing resize. A cover that already is a size-sized JPEG within
+    max_bytes is returned untouched; otherwise the result is written under
+    $WX_CACHE_DIR/prepared/ and the original file is never modified. Without
+    Pillow this degrades to fit_image_budget.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return fit_image_budget(image_path, max_bytes)
+
+    tw, th = size
+    try:
+        with Image.open(image_path) as im:
+            orientation = im.getexif().get(0x0112, 1)
+            if (
+                im.format == "JPEG"
+                and im.size == (tw, th)
+                and orientation == 1
+                and os.path.getsize(image_path) <= max_bytes
+            ):
+                return image_path
+
+            out = os.path.join(cache_dir(), "prepared", f"{file_sha256(image_path)[:32]}-{tw}x{th}-{max_bytes}.jpg")
+            if os.path.exists(out):
+                return out
+
+            if im.format == "JPEG":
+                # orientations 5-8 are stored rotated by 90 degrees
+                w, h = im.size if orientation < 5 else im.size[::-1]
+                scale = max(tw / w, th / h)
+                if scale < 1:
+                    req = (math.ceil(im.size[0] * scale), math.ceil(im.size[1] * scale))
+                    im.draft("RGB", req)
+            im = ImageOps.exif_transpose(im)
+            im = flatten_image(im)
+            # center-crop to the target aspect, then resize (integer reduce first for big inputs)
+            w, h = im.size
+            if w * th > h * tw:
+                cw, ch = h * tw / th, h
+            else:
+                cw, ch = w, w * th / tw
+            box = ((w - cw) / 2, (h - ch) / 2, (w + cw) / 2, (h + ch) / 2)
+            im = im.resize(size, Image.BICUBIC, box=box, reducing_gap=2.0)
+    except OSError as e:
+        raise ArticleContentError(f"cannot decode image {image_path}: {e}")
+
+    data = import_create_cover().encode_jpeg(im, max_bytes, optimize=True)
+    if len(data) > max_bytes:
+        raise ArticleContentError(f"{image_path} does not fit in {max_bytes} bytes even at the lowest JPEG quality")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    import_create_cover().write_bytes(out, data)
+    return out
+
+
+class Account:
+    """One Official Account: credentials plus the client and caches its calls share."""
+
+    def __init__(self, appid, appsecret, client, use_token_cache=True, use_media_cache=True, validate_media_cache=False, cover_max_bytes=IMAGE_MATERIAL_MAX_BYTES, preprocess_cover=True, index=None):
+        self.appid = appid
+        self.appsecret = appsecret
+        self.client = client
+        self.use_token_cache = use_token_cache
+        self.media_cache = MediaCache(appid) if use_media_cache else None
+        self.image_cache = MediaCache(appid, kind="uploadimg") if use_media_cache else None
+        self.validate_media_cache = validate_media_cache
+        self.cover_max_bytes = cover_max_bytes
+        self.preprocess_cover = preprocess_cover
+        # a wechat_index.WeChatIndex: answers lookups locally and records what this account creates
+        self.index = index
+        self.metrics = client.metrics
+        self._token = None
+        self._token_lock = threading.Lock()
+        # cover digest -> media_id uploaded this run, and one lock per digest: articles
+        # sharing a cover are prepared concurrently but must upload it only once
+        self._covers = {}
+        self._cover_locks = {}
+        self._covers_lock = threading.Lock()
+
+    def token(self, stale_token=None):
+        if self.use_token_cache:
+            return get_access_token(self.client, self.appid, self.appsecret, stale_token=stale_token)
+        # without the disk cache, still fetch once per run rather than once per call
+        with self._token_lock:
+            if self._token is None or self._token == stale_token:
+                self._token = fetch_access_token(self.client, self.appid, self.appsecret)[0]
+            return self._token
+
+    def call(self, fn):
+        """Run fn(token); on an expired/invalid token, refresh once and retry."""
+        token = self.token()
+        try:
+            return fn(token)
+        except WeChatAPIError as e:
+            if e.errcode not in TOKEN_EXPIRED_ERRCODES:
+                raise
+            return fn(self.token(stale_token=token))
+
+    def upload_cover(self, image_path):
+        with self.metrics.span("cover_prepare"):
+            if self.preprocess_cover:
+                image_path = prepare_cover_image(image_path, self.cover_max_bytes)
+            else:
+                image_path = fit_image_budget(image_path, self.cover_max_bytes)
+        digest = file_sha256(image_path)
+        with self._covers_lock:
+            lock = self._cover_locks.setdefault(digest, threading.Lock())
+        with lock:
+            if digest in self._covers:
+                self.metrics.add("media_cache_hits", kind="cover")
+                return self._covers[digest]
+            self.metrics.add("image_bytes", os.path.getsize(image_path), kind="cover")
+            with self.metrics.span("cover_upload"):
+                media_id = self.call(
+                    lambda t: upload_cover(self.client, t, image_path, self.media_cache, self.validate_media_cache, self.index)
+                )
+            self._covers[digest] = media_id
+            return media_id
+
+    def forget_cover(self, media_id):
+        """Drop a cover material the backend no longer has from every cache."""
+        with self._covers_lock:
+            self._covers = {k: v for k, v in self._covers.items() if v != media_id}
+        if self.media_cache:
+            self.media_cache.evict(media_id=media_id)
+        if self.index:
+            self.index.forget(media_id)
+
+    def upload_inline_image(self, image_path, digest=None):
+        # digest stays that of the source bytes, so a cache hit skips re-encoding too
+        digest = digest or file_sha256(image_path)
+        if self.image_cache and self.image_cache.get(digest):
+            self.metrics.add("media_cache_hits", kind="uploadimg")
+            return self.image_cache.get(digest)["url"]
+        image_path = fit_image_budget(image_path, UPLOADIMG_MAX_BYTES)
+        self.metrics.add("image_bytes", os.path.getsize(image_path), kind="inline")
+        with self.metrics.span("inline_image_upload"):
+            return self.call(lambda t: upload_inline_image(self.client, t, image_path, digest, self.image_cache))
+
+    def add_draft(self, articles):
+        with self.metrics.span("draft_add"):
+            data = self.call(lambda t: add_draft(self.client, t, articles))
+        if self.index:
+            self.index.put_draft(data["media_id"], articles)
+        return data
+
+    def update_draft(self, media_id, article, index=0):
+        with self.metrics.span("draft_update"):
+            data = self.call(lambda t: update_draft(self.client, t, media_id, article, index))
+        if self.index:
+            self.index.put_draft_article(media_id, index, article)
+        return data
+
+    def draft_exists(self, media_id):
+        return self.call(lambda t: draft_exists(self.client, t, media_id))
+
+    def find_draft(self, articles, since):
+        return self.call(lambda t: find_draft(self.client, t, articles, since))
+
+    def batchget_drafts(self, offset, count=BATCHGET_COUNT, no_content=False):
+        return self.call(lambda t: batchget_drafts(self.client, t, offset, count, no_content))
+
+    def batchget_materials(self, offset, count=BATCHGET_COUNT, material_type="image"):
+        return self.call(lambda t: batchget_materials(self.client, t, offset, count, material_type))
+
+
+def article_payload(article, content, thumb_media_id):
+    return {
+        "title": article["title"],
+        "author": article.get("author", ""),
+        "digest": article.get("digest", ""),
+        "content": content,
+        "thumb_media_id": thumb_media_id,
+        "need_open_comment": int(article.get("need_open_comment", 1)),
+        "only_fans_can_comment": int(article.get("only_fans_can_comment", 0)),
     }
-    url = f"https://api.weixin.qq.com/cgi-bin/draft/add?access_token={token}"
-    data = http_post_json(url, payload)
+
+
+def add_draft(client, token, articles):
+    data = client.post_json("cgi-bin/draft/add", {"access_token": token}, {"articles": articles})
     if "media_id" not in data:
-        fail(f"create draft failed: {data}")
+        raise WeChatAPIError("create draft", data)
     return data
 
 
+def update_draft(client, token, media_id, article, index=0):
+    """Replace article number index of an existing draft (draft/update)."""
+    data = client.post_json(
+        "cgi-bin/draft/update",
+        {"access_token": token},
+        {"media_id": media_id, "index": index, "articles": article},
+    )
+    if data.get("errcode", 0) != 0:
+        raise WeChatAPIError("update draft", data)
+    return data
+
+
+def draft_exists(client, token, media_id):
+    data = client.post_json("cgi-bin/draft/get", {"access_token": token}, {"media_id": media_id})
+    if data.get("errcode") in TOKEN_EXPIRED_ERRCODES:
+        raise WeChatAPIError("get draft", data)
+    return "news_item" in data
+
+
+TAG_RE = re.compile(r"<[^>]*>")
+SPACE_RE = re.compile(r"\s+")
+
+
+def content_fingerprint(content):
+    """Digest of the visible text of content: WeChat rewrites the markup it stores
+    (attributes, image URLs), but not the text, so this survives the round trip."""
+    text = SPACE_RE.sub("", html.unescape(TAG_RE.sub("", content or "")))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def draft_signature(articles):
+    return [(a.get("title"), a.get("thumb_media_id"), content_fingerprint(a.get("content"))) for a in articles]
+
+
+def batchget_drafts(client, token, offset, count=BATCHGET_COUNT, no_content=False):
+    """One page of draft/batchget: {"total_count", "item_count", "item": [{media_id, content, update_time}]}."""
+    data = client.post_json(
+        "cgi-bin/draft/batchget",
+        {"access_token": token},
+        {"offset": offset, "count": count, "no_content": int(no_content)},
+    )
+    if "item" not in data:
+        raise WeChatAPIError("list drafts", data)
+    return data
+
+
+def batchget_materials(client, token, offset, count=BATCHGET_COUNT, material_type="image"):
+    """One page of material/batchget_material: items carry media_id, name, url and update_time."""
+    data = client.post_json(
+        "cgi-bin/material/batchget_material",
+        {"access_token": token},
+        {"type": material_type, "offset": offset, "count": count},
+    )
+    if "item" not in data:
+        raise WeChatAPIError("list materials", data)
+    return data
+
+
+def find_draft(client, token, articles, since):
+    """Return the media_id of a draft saved since (a time.time() taken before the send)
+    whose titles, covers and body text match articles, or None.
+
+    Titles and covers alone also match an older draft of the same article
+    (the media cache reuses its cover), so the body text is compared too, and
+    drafts saved before the send are never taken for the one it may have created.
+    """
+    data = batchget_drafts(client, token, 0, DRAFT_LOOKUP_COUNT)
+    want = draft_signature(articles)
+    for item in data["item"]:
+        if int(item.get("update_time") or 0) < since - DRAFT_LOOKUP_SKEW:
+            continue
+        if draft_signature((item.get("content") or {}).get("news_item") or []) == want:
+            return item.get("media_id")
+    return None
+
+
+def open_index(appid):
+    """The account's wechat_index.WeChatIndex, or None until wechat_index.py has synced it."""
+    import wechat_index
+
+    return wechat_index.open_index(appid)
+
+
+class PublishJournal:
+    """Local record of publish progress, one entry per draft keyed by an input digest.
+
+    An entry holds the cover media_ids once uploaded, then state "pending"
+    (with pending_at, the time of the send) right before draft/add and "done"
+    with the draft media_id after it, so a
+    rerun with the same inputs resumes instead of uploading again or creating
+    a second draft.
+    """
+
+    def __init__(self, appid):
+        self.path = os.path.join(cache_dir(), "journal", f"{appid}.json")
+
+    def get(self, key):
+        return (read_json_file(self.path) or {}).get(key) or {}
+
+    def update(self, key, **fields):
+        with file_lock(self.path + ".lock"):
+            index = read_json_file(self.path) or {}
+            cutoff = time.time() - JOURNAL_TTL
+            index = {k: v for k, v in index.items() if v.get("updated_at", 0) >= cutoff}
+            index[key] = dict(index.get(key) or {}, **fields, updated_at=int(time.time()))
+            write_json_file(self.path, index)
+
+
+def article_digest(article, inline_images=True):
+    """sha256 over everything that ends up in the article's draft."""
+    fields = {k: article.get(k) for k in ("title", "author", "digest", "need_open_comment", "only_fans_can_comment", "cover_options")}
+    fields["content"] = file_sha256(article["content_file"])
+    fields["cover"] = file_sha256(article["cover"]) if article.get("cover") else None
+    fields["inline_images"] = inline_images
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def resume_draft(account, entry, articles):
+    """Return the media_id of a draft an earlier run already created for this entry, if any."""
+    if entry.get("media_id"):
+        # the user may have deleted it since; then it is created again
+        return entry["media_id"] if account.draft_exists(entry["media_id"]) else None
+    if entry.get("state") == "pending" and entry.get("thumbs"):
+        # the last run died inside draft/add: it may or may not have gone through
+        since = entry.get("pending_at") or entry.get("updated_at") or 0
+        return account.find_draft(
+            [{"title": a["title"], "thumb_media_id": t, "content": article_text(a)} for a, t in zip(articles, entry["thumbs"])],
+            since,
+        )
+    return None
+
+
+def submit_draft(account, payload, journal=None, key=None):
+    """draft/add payload and return the new media_id, without creating it twice.
+
+    After an ambiguous failure (the request may have landed) the recent
+    drafts are searched before sending again. With journal, entry key is
+    "pending" during the send and "done" with the media_id after it, so a
+    run that dies in between is resumed by resume_draft.
+    """
+    sent_at = time.time()
+    if journal:
+        journal.update(key, state="pending", pending_at=sent_at, thumbs=[a["thumb_media_id"] for a in payload])
+    try:
+        media_id = account.add_draft(payload).get("media_id")
+    except WeChatHTTPError as e:
+        if not e.ambiguous:
+            raise
+        media_id = account.find_draft(payload, sent_at) or account.add_draft(payload).get("media_id")
+    if journal:
+        journal.update(key, state="done", media_id=media_id)
+    return media_id
+
+
+def read_content(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def generate_cover(article, metrics=None):
+    """Render article["cover_options"] with create_cover.py and return the JPEG path."""
+    cc = import_create_cover()
+
+    opts = dict(article["cover_options"])
+    title = opts.get("title") or article["title"]
+    key = hashlib.sha256(json.dumps([title, opts], sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    output = os.path.join(cache_dir(), "covers", f"{key[:32]}.jpg")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    # covers of a batch are prepared on worker threads; only the render itself is serialized
+    with cc.RENDER_LOCK:
+        cc.create_cover(
+            title=title,
+            subtitle=opts.get("subtitle", ""),
+            output=output,
+            style=opts.get("style", "minimal-grid"),
+            palette_name=opts.get("palette", "auto"),
+            rotate=opts.get("rotate", "sequential"),
+            seed=opts.get("seed") or title,
+            bg_override=opts.get("bg_color"),
+            text_override=opts.get("text_color"),
+            sub_override=opts.get("sub_color"),
+            font_path=opts.get("font") or cc.default_font_path(),
+            cache_dir=cc.default_cache_dir(),
+            metrics=metrics,
+        )
+    return output
+
+
+def prepare_cover(account, article):
+    if article.get("cover"):
+        return account.upload_cover(article["cover"])
+    with account.metrics.span("cover_render"):
+        path = generate_cover(article, account.metrics)
+    return account.upload_cover(path)
+
+
+def article_text(article):
+    """The article's HTML as given: inline "content", else its content_file."""
+    content = article.get("content")
+    return read_content(article["content_file"]) if content is None else content
+
+
+def prepare_content(account, article, workers=4, inline_images=True):
+    content = article_text(article)
+    if inline_images:
+        base_dir = os.path.dirname(os.path.abspath(article["content_file"]))
+        with account.metrics.span("inline_images"):
+            content = rewrite_inline_images(account, content, base_dir, workers)
+    account.metrics.add("content_bytes", len(content.encode("utf-8")))
+    return content
+
+
+def publish_articles(account, articles, workers=4, split=False, progress=None, inline_images=True, journal=None, dedupe=None):
+    """Upload/generate all covers and body images concurrently, then create the draft(s).
+
+    split=False submits every article as one multi-article draft;
+    split=True creates one draft per article, in parallel.
+    progress, if given, is called with the step line before draft creation.
+    journal, a PublishJournal, lets a rerun skip finished steps and drafts.
+    dedupe ("title" or "content") skips drafts account.index already holds
+    with the same titles (and, for "content", the same final content).
+    """
+    workers = max(1, workers)
+    units = [[i] for i in range(len(articles))] if split else [list(range(len(articles)))]
+    keys = [None] * len(units)
+    thumbs = [None] * len(articles)
+    contents = [None] * len(articles)
+    drafts = [None] * len(units)
+    if journal:
+        digests = [article_digest(a, inline_images) for a in articles]
+        for u, unit in enumerate(units):
+            keys[u] = hashlib.sha256("\n".join(digests[i] for i in unit).encode("utf-8")).hexdigest()
+            entry = journal.get(keys[u])
+            for i, thumb in zip(unit, entry.get("thumbs") or []):
+                thumbs[i] = thumb
+            media_id = resume_draft(account, entry, [articles[i] for i in unit])
+            if media_id:
+                drafts[u] = {"media_id": media_id, "resumed": True}
+                journal.update(keys[u], state="done", media_id=media_id)
+    if dedupe == "title":
+        for u, unit in enumerate(units):
+            if drafts[u] is None:
+                media_id = account.index.find_draft([articles[i]["title"] for i in unit])
+                if media_id:
+                    drafts[u] = {"media_id": media_id, "resumed": True}
+
+    todo = [u for u in range(len(units)) if drafts[u] is None]
+    pending = [i for u in todo for i in units[u]]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        content_jobs = {i: pool.submit(prepare_content, account, articles[i], workers, inline_images) for i in pending}
+        uploads = [i for i in pending if thumbs[i] is None]
+        for i, thumb in zip(uploads, pool.map(lambda i: prepare_cover(account, articles[i]), uploads)):
+            thumbs[i] = thumb
+        for i, job in content_jobs.items():
+            contents[i] = job.result()
+    if dedupe == "content":
+        for u in list(todo):
+            unit = units[u]
+            media_id = account.index.find_draft([articles[i]["title"] for i in unit], [contents[i] for i in unit])
+            if media_id:
+                drafts[u] = {"media_id": media_id, "resumed": True}
+                todo.remove(u)
+    if journal:
+        for u in todo:
+            journal.update(keys[u], thumbs=[thumbs[i] for i in units[u]])
+    if progress:
+        if len(todo) < len(units):
+            progress(f"[3/3] {len(units) - len(todo)} draft(s) already created, skipped")
+        if todo:
+            progress("[3/3] Creating draft..." if not split else f"[3/3] Creating {len(todo)} drafts...")
+
+    def create(u):
+        payload = [article_payload(articles[i], contents[i], thumbs[i]) for i in units[u]]
+        return {"media_id": submit_draft(account, payload, journal, keys[u]), "resumed": False}
+
+    def submit(u):
+        try:
+            return create(u)
+        except WeChatAPIError as e:
+            if not (account.media_cache or account.index) or e.errcode != INVALID_MEDIA_ERRCODE:
+                raise
+            # a cached cover was deleted in the backend: forget it and upload again
+            for i in units[u]:
+                account.forget_cover(thumbs[i])
+                thumbs[i] = prepare_cover(account, articles[i])
+            return create(u)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for u, draft in zip(todo, pool.map(submit, todo)):
+            drafts[u] = draft
+
+    if not split:
+        return {"media_id": drafts[0]["media_id"], "thumb_media_ids": thumbs, "resumed": drafts[0]["resumed"]}
+    return {
+        "drafts": [
+            {"title": a["title"], "media_id": d["media_id"], "thumb_media_id": t, "resumed": d["resumed"]}
+            for a, d, t in zip(articles, drafts, thumbs)
+        ]
+    }
+
+
+def update_articles(account, articles, media_id, workers=4, progress=None, inline_images=True):
+    """Upload covers and body images, then overwrite the articles of draft media_id in place.
+
+    draft/update replaces one article per call, so article i of articles
+    becomes article i of the draft; the draft keeps its media_id.
+    """
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        content_jobs = [pool.submit(prepare_content, account, a, workers, inline_images) for a in articles]
+        thumbs = list(pool.map(lambda a: prepare_cover(account, a), articles))
+        contents = [job.result() for job in content_jobs]
+    if progress:
+        progress("[3/3] Updating draft...")
+    for i, article in enumerate(articles):
+        account.update_draft(media_id, article_payload(article, contents[i], thumbs[i]), i)
+    return {"media_id": media_id, "thumb_media_ids": thumbs, "updated": True}
+
+
 def ensure_file(path, name):
     if not path:
-        fail(f"{name} path is empty")
+        raise InputError(f"{name} path is empty")
     if not os.path.exists(path):
-        fail(f"{name} not found: {path}")
+        raise InputError(f"{name} not found: {path}")
     if not os.path.isfile(path):
-        fail(f"{name} is not a file: {path}")
+        raise InputError(f"{name} is not a file: {path}")
 
 
-def shutil_which(cmd):
-    # avoid importing shutil for tiny dependency surface
-    for p in os.environ.get("PATH", "").split(os.pathsep):
-        full = os.path.join(p, cmd)
-        if os.path.isfile(full) and os.access(full, os.X_OK):
-            return full
-    return None
+def validate_article(article, label="article"):
+    if len(str(article.get("title", "")).strip()) == 0:
+        raise InputError(f"{label}: title cannot be empty")
 
+    ensure_file(article.get("content_file"), f"{label}: content file")
+    if article.get("cover") or not article.get("cover_options"):
+        ensure_file(article.get("cover"), f"{label}: cover image")
+    else:
+        validate_cover_options(article["cover_options"], label)
 
-def validate_inputs(args, appid, appsecret):
-    if not appid or not appsecret:
-        fail("AppID/AppSecret required (--appid/--appsecret or WX_APPID/WX_APPSECRET)")
+    if len(article.get("digest", "")) > 120:
+        print(f"Warn: {label}: digest length > 120 chars, WeChat display may truncate.", file=sys.stderr)
 
-    ensure_file(args.content_file, "content file")
-    ensure_file(args.cover, "cover image")
+    if article.get("need_open_comment") not in (0, 1):
+        raise InputError(f"{label}: need_open_comment must be 0 or 1")
 
-    if len(args.title.strip()) == 0:
-        fail("title cannot be empty")
+    if article.get("only_fans_can_comment") not in (0, 1):
+        raise InputError(f"{label}: only_fans_can_comment must be 0 or 1")
 
-    if len(args.digest) > 120:
-        print("Warn: digest length > 120 chars, WeChat display may truncate.", file=sys.stderr)
 
-    if args.need_open_comment not in (0, 1):
-        fail("--need-open-comment must be 0 or 1")
+def validate_cover_options(opts, label="article"):
+    """Reject cover_options that create_cover would fail on mid-publish."""
+    if not isinstance(opts, dict):
+        raise InputError(f"{label}: cover_options must be an object")
+    cc = import_create_cover()
+    if opts.get("style", "minimal-grid") not in cc.STYLES:
+        raise InputError(f"{label}: unknown cover style: {opts['style']}")
+    palette = opts.get("palette", "auto")
+    if palette != "auto" and palette not in cc.PALETTES:
+        raise InputError(f"{label}: unknown cover palette: {palette}")
+    if opts.get("rotate", "sequential") not in ("sequential", "random"):
+        raise InputError(f"{label}: cover rotate must be sequential or random")
+    for key in ("bg_color", "text_color", "sub_color"):
+        if opts.get(key):
+            try:
+                cc.parse_rgb(opts[key])
+            except ValueError as e:
+                raise InputError(f"{label}: cover {key}: {e}")
+    font = opts.get("font") or cc.default_font_path()
+    if not os.path.isfile(font):
+        raise InputError(f"{label}: cover font not found: {font}")
 
-    if args.only_fans_can_comment not in (0, 1):
-        fail("--only-fans-can-comment must be 0 or 1")
 
+def preflight_content(article, label="article", inline_images=True, compact=True):
+    """Check the content file locally and keep its (compacted) HTML in article["content"]."""
+    try:
+        result = html_preflight.preflight_file(article["content_file"], inline_images=inline_images, compact=compact)
+    except UnicodeDecodeError as e:
+        raise InputError(f"{label}: content file is not UTF-8: {e}")
+    for message in result.warnings:
+        print(f"Warn: {label}: {message}", file=sys.stderr)
+    if not result.ok:
+        raise ArticleContentError(f"{label}: " + "; ".join(result.errors))
+    article["content"] = result.html
 
-if __name__ == "__main__":
+
+# cover_options entries that name files
+COVER_OPTION_PATHS = ("font",)
+
+
+def load_manifest(path, defaults):
+    """Read a batch manifest: {"articles": [...]} or a bare list of articles.
+
+    Relative content_file/cover paths (and file paths inside cover_options,
+    such as font) resolve against the manifest's folder;
+    missing author/comment fields fall back to defaults (the CLI flags).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except ValueError as e:
+        raise InputError(f"manifest is not valid JSON: {path}: {e}")
+    items = data.get("articles") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise InputError(f"manifest has no articles: {path}")
+
+    base = os.path.dirname(os.path.abspath(path))
+    articles = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise InputError(f"article {i + 1}: manifest entries must be objects")
+        article = dict(defaults, **item)
+        for key in ("content_file", "cover"):
+            if article.get(key):
+                if not isinstance(article[key], str):
+                    raise InputError(f"article {i + 1}: {key} must be a path")
+                article[key] = os.path.join(base, article[key])
+        if isinstance(article.get("cover_options"), dict):
+            opts = article["cover_options"] = dict(article["cover_options"])
+            for key in COVER_OPTION_PATHS:
+                if opts.get(key):
+                    if not isinstance(opts[key], str):
+                        raise InputError(f"article {i + 1}: cover_options.{key} must be a path")
+                    opts[key] = os.path.join(base, opts[key])
+        articles.append(article)
+    return articles
+
+
+def load_accounts(path):
+    """Read the fan-out account list from a wechat-article.config.json.
+
+    Uses its "accounts" list ({name, appid, appsecret, author}); a config
+    without one stands for its own top-level appid/appsecret. A top-level
+    author is the default for accounts that do not set their own.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except ValueError as e:
+        raise InputError(f"accounts config is not valid JSON: {path}: {e}")
+    if isinstance(data, dict):
+        items = data.get("accounts") or ([data] if data.get("appid") else None)
+        default_author = data.get("author")
+    else:
+        items, default_author = data, None
+    if not isinstance(items, list) or not items:
+        raise InputError(f"accounts config has no accounts: {path}")
+
+    accounts = []
+    seen = set()
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("appid") or not item.get("appsecret"):
+            raise InputError(f"account {i + 1}: appid and appsecret are required")
+        if item["appid"] in seen:
+            raise InputError(f"account {i + 1}: duplicate appid {item['appid']}")
+        seen.add(item["appid"])
+        accounts.append(
+            {
+                "name": item.get("name") or item["appid"],
+                "appid": item["appid"],
+                "appsecret": item["appsecret"],
+                "author": item.get("author") or default_author,
+            }
+        )
+    return accounts
+
+
+def with_author(articles, author):
+    # articles that name their own author keep it
+    return [dict({"author": author}, **a) for a in articles]
+
+
+# options that name files, resolved against the caller's cwd when run remotely
+PATH_ARGS = ("content_file", "cover", "manifest", "accounts", "metrics_jsonl", "metrics_prom")
+
+
+def scheduler_from_args(args, metrics=None):
+    return RequestScheduler(max_attempts=args.max_retries + 1, max_concurrency=args.max_concurrency, rate=args.rate_limit, metrics=metrics)
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="创建公众号草稿")
-    parser.add_argument("--title", required=True, help="文章标题")
+    parser.add_argument("--title", default="", help="文章标题")
     parser.add_argument("--author", default=None, help="作者（或设置 WX_AUTHOR 环境变量）")
     parser.add_argument("--digest", default="", help="文章摘要，建议 120 字以内")
-    parser.add_argument("--content-file", required=True, help="HTML 内容文件路径")
-    parser.add_argument("--cover", required=True, help="封面图路径")
+    parser.add_argument("--content-file", default=None, help="正文文件路径：HTML，或 .md（按 article-style.md 自动转换）")
+    parser.add_argument("--cover", default=None, help="封面图路径")
+    parser.add_argument("--manifest", default=None, help="批量模式：多篇文章的 JSON 清单")
+    parser.add_argument("--split-drafts", action="store_true", help="批量模式下每篇文章单独建草稿（并发）")
+    parser.add_argument("--workers", type=int, default=4, help="封面与正文图片生成/上传的并发数")
+    parser.add_argument("--no-inline-images", action="store_true", help="不上传/改写正文中的 <img>")
+    parser.add_argument("--no-compact", action="store_true", help="只做预检，正文按原样提交（不压缩空白和 style）")
+    parser.add_argument("--accounts", default=None, help="多账号模式：读取配置文件中的 accounts 列表，同时发布到每个账号")
+    parser.add_argument("--account-workers", type=int, default=4, help="多账号模式下同时发布的账号数")
     parser.add_argument("--appid", default=None, help="AppID（或设置 WX_APPID 环境变量）")
     parser.add_argument("--appsecret", default=None, help="AppSecret（或设置 WX_APPSECRET 环境变量）")
     parser.add_argument("--need-open-comment", type=int, default=1, help="是否开启评论：1 开启，0 关闭")
     parser.add_argument("--only-fans-can-comment", type=int, default=0, help="是否仅粉丝可评论：1 是，0 否")
-    args = parser.parse_args()
+    parser.add_argument("--no-token-cache", action="store_true", help="不读写本地 access_token 缓存（本次运行内仍复用同一个 token）")
+    parser.add_argument("--no-media-cache", action="store_true", help="总是重新上传封面，不查本地素材索引")
+    parser.add_argument("--validate-media-cache", action="store_true", help="命中素材索引时先确认素材仍存在")
+    parser.add_argument("--cover-max-bytes", type=int, default=IMAGE_MATERIAL_MAX_BYTES, help="封面超过该字节数时先压缩再上传（不改原文件）")
+    parser.add_argument("--no-cover-preprocess", action="store_true", help="不对封面做旋转/裁剪/缩放到 900×383，原样上传")
+    parser.add_argument("--update-draft", default=None, metavar="MEDIA_ID", help="覆盖已有草稿的内容（draft/update），不新建草稿")
+    parser.add_argument("--no-journal", action="store_true", help="不记录/续用发布进度（相同输入重复运行会新建草稿）")
+    parser.add_argument("--no-index", action="store_true", help="不查询/写入 wechat_index.py 同步的本地草稿与素材索引")
+    parser.add_argument("--dedupe", choices=("title", "content"), default=None, help="本地索引里已有标题相同（content：标题与正文都相同）的草稿时不再新建")
+    parser.add_argument("--max-retries", type=int, default=3, help="瞬时错误（超时、-1、45009 等）的最大重试次数")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="同时进行的 API 请求上限")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE, help="每个接口每秒请求数上限")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="API 请求超时秒数（或设置 WX_HTTP_TIMEOUT）")
+    parser.add_argument("--upload-timeout", type=float, default=DEFAULT_UPLOAD_TIMEOUT, help="图片上传超时秒数")
+    wechat_metrics.add_arguments(parser)
+    return parser
+
+
+def load_articles(args):
+    """Build and validate the article list from the CLI args (author is filled in per account)."""
+    defaults = {
+        "need_open_comment": args.need_open_comment,
+        "only_fans_can_comment": args.only_fans_can_comment,
+    }
+    if args.manifest:
+        ensure_file(args.manifest, "manifest")
+        articles = load_manifest(args.manifest, defaults)
+    else:
+        articles = [dict(defaults, title=args.title, digest=args.digest, content_file=args.content_file, cover=args.cover)]
+    for i, article in enumerate(articles):
+        label = f"article {i + 1}" if args.manifest else "article"
+        validate_article(article, label)
+        preflight_content(article, label, inline_images=not args.no_inline_images, compact=not args.no_compact)
+    if not args.split_drafts and len(articles) > MAX_ARTICLES_PER_DRAFT:
+        raise InputError(f"a draft holds at most {MAX_ARTICLES_PER_DRAFT} articles; use --split-drafts")
+    return articles
+
+
+def publish_to_account(args, appid, appsecret, articles, client=None, log=print, metrics=None):
+    """Run the three publish steps for one account and return publish_articles()' result."""
+    own_client = client is None
+    if own_client:
+        client = WeChatClient(
+            timeout=args.timeout,
+            upload_timeout=args.upload_timeout,
+            scheduler=scheduler_from_args(args, metrics),
+            metrics=metrics,
+        )
+    account = Account(
+        appid,
+        appsecret,
+        client,
+        use_token_cache=not args.no_token_cache,
+        use_media_cache=not args.no_media_cache,
+        validate_media_cache=args.validate_media_cache,
+        cover_max_bytes=args.cover_max_bytes,
+        preprocess_cover=not args.no_cover_preprocess,
+        index=None if args.no_index else open_index(appid),
+    )
+    if args.dedupe and account.index is None:
+        raise InputError(f"--dedupe needs the local index of {appid}; run wechat_index.py first")
+    try:
+        log("[1/3] Getting access token...")
+        with account.metrics.span("token"):
+            account.token()
+
+        log("[2/3] Uploading cover image..." if len(articles) == 1 else f"[2/3] Preparing {len(articles)} covers...")
+        if args.update_draft:
+            return update_articles(account, articles, args.update_draft, args.workers, log, not args.no_inline_images)
+        return publish_articles(
+            account,
+            articles,
+            workers=args.workers,
+            split=args.split_drafts,
+            progress=log,
+            inline_images=not args.no_inline_images,
+            journal=None if args.no_journal else PublishJournal(appid),
+            dedupe=args.dedupe,
+        )
+    finally:
+        if account.index:
+            account.index.close()
+        if own_client:
+            client.close()
+
+
+def publish_fanout(args, accounts, articles, author, log=print, metrics=None):
+    """Publish the same articles to every account, args.account_workers at a time.
+
+    Every account gets its own client, so connections, rate limits and
+    retries are per appid, like the token, media and journal caches.
+    One account failing does not stop the others.
+    """
+
+    def publish_one(acct):
+        prefix = f"[{acct['name']}] "
+        result = {"name": acct["name"], "appid": acct["appid"]}
+        try:
+            result.update(
+                publish_to_account(
+                    args,
+                    acct["appid"],
+                    acct["appsecret"],
+                    with_author(articles, acct["author"] or author),
+                    log=lambda line: log(prefix + line),
+                    metrics=metrics,
+                )
+            )
+        except (ValueError, OSError) + PUBLISH_ERRORS as e:
+            # a cover that fails to render or a file gone mid-run only fails this account
+            log(prefix + f"Error: {e}")
+            return dict(result, ok=False, error=str(e))
+        return dict(result, ok=True)
+
+    workers = max(1, min(args.account_workers, len(accounts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(publish_one, accounts))
+    return {"ok": all(r["ok"] for r in results), "accounts": results}
+
+
+def run(args, client=None, log=print):
+    """Execute parsed CLI args and return the result document.
+
+    Raises InputError / ArticleContentError / WeChatAPIError / WeChatHTTPError.
+    A caller-supplied client (e.g. a long-lived daemon's) is reused and left open;
+    --accounts mode, and runs with metrics enabled, always use their own clients.
+    """
+    metrics = wechat_metrics.from_args(args, "publish_draft")
+    if metrics.enabled:
+        client = None
+    try:
+        with metrics.span("total"):
+            output = _run(args, client, log, metrics)
+        if metrics.enabled:
+            output["metrics"] = metrics.summary()
+        return output
+    finally:
+        metrics.close()
+
+
+def _run(args, client, log, metrics):
+    author = args.author or os.environ.get("WX_AUTHOR", "")
+    if args.update_draft and (args.accounts or args.split_drafts):
+        raise InputError("--update-draft updates one draft of one account; it cannot be combined with --accounts or --split-drafts")
+    if args.update_draft and args.dedupe:
+        raise InputError("--dedupe applies to new drafts; it cannot be combined with --update-draft")
+    if args.accounts:
+        if args.appid or args.appsecret:
+            raise InputError("--accounts cannot be combined with --appid/--appsecret")
+        ensure_file(args.accounts, "accounts config")
+        accounts = load_accounts(args.accounts)
+        return publish_fanout(args, accounts, load_articles(args), author, log, metrics)
 
     appid = args.appid or os.environ.get("WX_APPID")
     appsecret = args.appsecret or os.environ.get("WX_APPSECRET")
-    author = args.author or os.environ.get("WX_AUTHOR", "")
+    if not appid or not appsecret:
+        raise InputError("AppID/AppSecret required (--appid/--appsecret or WX_APPID/WX_APPSECRET)")
 
-    validate_inputs(args, appid, appsecret)
+    articles = with_author(load_articles(args), author)
+    result = publish_to_account(args, appid, appsecret, articles, client, log, metrics)
 
-    with open(args.content_file, "r", encoding="utf-8") as f:
-        content = f.read().strip()
+    if not args.manifest:
+        return {
+            "ok": True,
+            "media_id": result.get("media_id"),
+            "need_open_comment": args.need_open_comment,
+            "only_fans_can_comment": args.only_fans_can_comment,
+        }
+    output = {"ok": True}
+    output.update(result)
+    return output
 
-    print("[1/3] Getting access token...")
-    token = get_access_token(appid, appsecret)
 
-    print("[2/3] Uploading cover image...")
-    thumb_media_id = upload_cover(token, args.cover)
+PUBLISH_ERRORS = (InputError, ArticleContentError, WeChatAPIError, WeChatHTTPError)
 
-    print("[3/3] Creating draft...")
-    result = create_draft(
-        token=token,
-        title=args.title,
-        author=author,
-        digest=args.digest,
-        content=content,
-        thumb_media_id=thumb_media_id,
-        need_open_comment=args.need_open_comment,
-        only_fans_can_comment=args.only_fans_can_comment,
-    )
 
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        output = run(args)
+    except PUBLISH_ERRORS as e:
+        fail(str(e))
+
+    if not output["ok"]:
+        # fan-out with some accounts failed: still report every account
+        print(json.dumps(output, ensure_ascii=False))
+        fail(f"{sum(not r['ok'] for r in output['accounts'])} of {len(output['accounts'])} accounts failed")
     print("Done!")
-    print(json.dumps({
-        "ok": True,
-        "media_id": result.get("media_id"),
-        "need_open_comment": args.need_open_comment,
-        "only_fans_can_comment": args.only_fans_can_comment,
-    }, ensure_ascii=False))
+    print(json.dumps(output, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
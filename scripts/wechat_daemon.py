@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+常驻本地服务：预热 Pillow、封面字体与微信 API 连接，接收封面渲染和草稿发布任务。
+
+启动服务（只监听 127.0.0.1）:
+  python3 wechat_daemon.py serve [--port 8765]
+
+每次启动生成随机口令，写入 $WX_CACHE_DIR/daemon/token-<端口>（仅本用户可读）；
+客户端每个请求都带上该口令，服务拒绝口令不符、带 Origin 头（浏览器发起）或
+Content-Type 不是 application/json 的请求，其他用户和网页都无法提交任务。
+
+客户端命令（参数与对应脚本完全相同；服务未运行时自动在本进程内执行）:
+  python3 wechat_daemon.py cover --title "主标题" --style minimal-grid --output cover.jpg
+  python3 wechat_daemon.py publish --title "标题" --content-file article.html --cover cover.jpg
+
+其他:
+  python3 wechat_daemon.py status
+  python3 wechat_daemon.py stop
+
+服务端口可用环境变量 WX_DAEMON_URL 指定（默认 http://127.0.0.1:8765，主机必须是本机）。
+注意：任务在服务进程中执行，WX_CACHE_DIR / WX_API_BASE 等取服务启动时的环境。
+"""
+import argparse
+import hmac
+import http.client
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import create_cover as cc
+import publish_draft as pd
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+LOOPBACK = "127.0.0.1"
+TOKEN_HEADER = "X-Wechat-Daemon-Token"
+# how long a client waits to find out whether a daemon is listening
+CONNECT_TIMEOUT = 0.5
+JOB_TIMEOUT = 600
+
+MODULES = {"cover": cc, "publish": pd}
+
+
+def daemon_url():
+    return os.environ.get("WX_DAEMON_URL") or DEFAULT_URL
+
+
+def daemon_port():
+    return urllib.parse.urlsplit(daemon_url()).port or 8765
+
+
+def token_path(port):
+    return os.path.join(pd.cache_dir(), "daemon", f"token-{port}")
+
+
+def write_token(port):
+    """Create a fresh secret readable only by this user; clients must present it."""
+    path = token_path(port)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    token = secrets.token_hex(32)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    os.replace(tmp, path)
+    return token
+
+
+def read_token(port):
+    try:
+        with open(token_path(port), "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class DaemonState:
+    """Everything kept warm between jobs."""
+
+    def __init__(self, token):
+        self.started = time.time()
+        self.token = token
+        self.jobs = 0
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def count_job(self):
+        with self._lock:
+            self.jobs += 1
+
+    def warm_up(self):
+        import PIL.Image  # noqa: F401
+
+        font = cc.default_font_path()
+        if os.path.exists(font):
+            cc.load_font(font, 52)
+            cc.load_font(font, 28)
+            cc.font_digest(font)
+
+    def client_for(self, args):
+        key = (args.timeout, args.upload_timeout, args.max_retries, args.max_concurrency, args.rate_limit)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = pd.WeChatClient(
+                    timeout=args.timeout,
+                    upload_timeout=args.upload_timeout,
+                    scheduler=pd.scheduler_from_args(args),
+                )
+            return self._clients[key]
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+def resolve_paths(module, args, cwd):
+    for name in module.PATH_ARGS:
+        value = getattr(args, name, None)
+        if value and value != "-" and not os.path.isabs(value):
+            setattr(args, name, os.path.join(cwd, value))
+
+
+def run_job(state, kind, argv, cwd):
+    """Run one cover/publish job in this process and return its response document."""
+    module = MODULES[kind]
+    args = module.build_parser().parse_args(argv)
+    resolve_paths(module, args, cwd)
+    logs = []
+    state.count_job()
+    try:
+        if kind == "cover":
+            # the same lock publish jobs take when they render a cover (cc.RENDER_LOCK)
+            with cc.RENDER_LOCK:
+                result = cc.run(args)
+        else:
+            result = pd.run(args, client=state.client_for(args), log=logs.append)
+    except (ValueError, OSError) + pd.PUBLISH_ERRORS as e:
+        return {"ok": False, "error": str(e), "log": logs}
+    except Exception as e:
+        # a bug in one job must not take the connection (or the daemon) down with it
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "log": logs}
+    return {"ok": True, "result": result, "log": logs}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, fmt, *args):
+        sys.stderr.write("[daemon] " + (fmt % args) + "\n")
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self, json_body):
+        """Only same-user, non-browser callers: secret token, no Origin, JSON bodies."""
+        if self.headers.get("Origin") is not None:
+            self._send(403, {"ok": False, "error": "cross-origin requests are not accepted"})
+            return False
+        token = self.headers.get(TOKEN_HEADER) or ""
+        if not hmac.compare_digest(token.encode("utf-8"), self.state.token.encode("utf-8")):
+            self._send(403, {"ok": False, "error": "missing or invalid daemon token"})
+            return False
+        ctype = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if json_body and ctype != "application/json":
+            self._send(415, {"ok": False, "error": "Content-Type must be application/json"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized(json_body=False):
+            return
+        if self.path != "/health":
+            self._send(404, {"ok": False, "error": "not found"})
+            return
+        self._send(200, {"ok": True, "pid": os.getpid(), "uptime": round(time.time() - self.state.started, 1), "jobs": self.state.jobs})
+
+    def do_POST(self):
+        if not self._authorized(json_body=True):
+            self.close_connection = True
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+        except ValueError:
+            self._send(400, {"ok": False, "error": "invalid JSON"})
+            return
+
+        if self.path == "/shutdown":
+            self._send(200, {"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+
+        kind = self.path.strip("/")
+        if kind not in MODULES:
+            self._send(404, {"ok": False, "error": "not found"})
+            return
+        try:
+            resp = run_job(self.state, kind, req.get("argv") or [], req.get("cwd") or os.getcwd())
+        except SystemExit:
+            resp = {"ok": False, "error": "invalid arguments"}
+        self._send(200, resp)
+
+
+def serve(port):
+    server = ThreadingHTTPServer((LOOPBACK, port), Handler)
+    server.daemon_threads = True
+    state = DaemonState(write_token(port))
+    state.warm_up()
+    Handler.state = state
+    print(f"wechat daemon listening on http://{LOOPBACK}:{port} (pid {os.getpid()})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        state.close()
+        try:
+            os.remove(token_path(port))
+        except OSError:
+            pass
+
+
+def call_daemon(method, path, payload=None, timeout=JOB_TIMEOUT):
+    """Send one request to the daemon; returns the JSON reply or None if nobody is listening."""
+    port = daemon_port()
+    token = read_token(port)
+    if token is None:
+        return None
+    conn = http.client.HTTPConnection(LOOPBACK, port, timeout=CONNECT_TIMEOUT)
+    try:
+        conn.connect()
+    except OSError:
+        conn.close()
+        return None
+    try:
+        conn.sock.settimeout(timeout)
+        body = json.dumps(payload or {}, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json", TOKEN_HEADER: token}
+        conn.request(method, path, body=body if method == "POST" else None, headers=headers)
+        return json.loads(conn.getresponse().read().decode("utf-8"))
+    finally:
+        conn.close()
+
+
+def client_argv(kind, argv):
+    # env-provided credentials belong to the caller, not to the daemon's environment
+    argv = list(argv)
+    if kind == "publish":
+        for flag, env in (("--appid", "WX_APPID"), ("--appsecret", "WX_APPSECRET"), ("--author", "WX_AUTHOR")):
+            if flag not in argv and os.environ.get(env):
+                argv += [flag, os.environ[env]]
+    return argv
+
+
+def run_client(kind, argv):
+    module = MODULES[kind]
+    args = module.build_parser().parse_args(argv)  # validate / --help locally
+    if kind == "cover" and args.list_presets:
+        cc.print_presets()
+        return
+
+    resp = call_daemon("POST", f"/{kind}", {"argv": client_argv(kind, argv), "cwd": os.getcwd()})
+    if resp is None:
+        # no daemon running: same behaviour as calling the script directly
+        module.main(argv)
+        return
+
+    for line in resp.get("log") or []:
+        print(line)
+    if not resp.get("ok"):
+        print(f"Error: {resp.get('error')}", file=sys.stderr)
+        sys.exit(1)
+    if kind == "cover":
+        cc.print_result(resp["result"])
+    elif not resp["result"].get("ok"):
+        print(json.dumps(resp["result"], ensure_ascii=False))
+        print("Error: some accounts failed", file=sys.stderr)
+        sys.exit(1)
+    else:
+        print("Done!")
+        print(json.dumps(resp["result"], ensure_ascii=False))
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("serve", "status", "stop", "cover", "publish"):
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(2)
+    command, rest = sys.argv[1], sys.argv[2:]
+
+    if command in MODULES:
+        run_client(command, rest)
+        return
+
+    if command == "serve":
+        parser = argparse.ArgumentParser(description="启动常驻渲染/发布服务（只监听 127.0.0.1）")
+        parser.add_argument("--port", type=int, default=daemon_port(), help="监听端口")
+        args = parser.parse_args(rest)
+        serve(args.port)
+        return
+
+    resp = call_daemon("GET" if command == "status" else "POST", "/health" if command == "status" else "/shutdown", timeout=5)
+    if resp is None:
+        print("daemon not running")
+        sys.exit(1)
+    print(json.dumps(resp, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
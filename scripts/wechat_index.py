@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+公众号草稿与图片素材的本地索引（SQLite，仅依赖标准库）。
+
+同步: 分页拉取 draft/batchget 与 material/batchget_material（每页 20 条，最多
+--workers 页并发），把 media_id、标题、正文摘要哈希、update_time 写入
+$WX_CACHE_DIR/index/<appid>.sqlite3。之后的同步是增量的：两个接口都按更新时间
+从新到旧返回，翻到比上次同步最新条目更旧的一页就停。全量同步（--full，或距上次
+全量超过 7 天时自动进行）会翻完所有页，并删除后台已不存在的条目。
+
+publish_draft.py / article_build.py 发现索引存在时会直接查它（毫秒级，不调接口）:
+  - 复用内容相同的封面素材（即使本机素材缓存已清空）
+  - --validate-media-cache 时先按索引判断素材是否还在
+  - --dedupe title|content 时跳过标题相同的已有草稿（content 还要求正文与本机当初提交的一致，
+    微信保存时会改写正文，所以只能匹配本机建的草稿）
+新建草稿、上传封面后也会顺手写入索引。
+
+用法:
+  python3 wechat_index.py --appid <APPID> --appsecret <APPSECRET>          # 增量同步
+  python3 wechat_index.py --appid <APPID> --appsecret <APPSECRET> --full   # 全量同步
+  python3 wechat_index.py --appid <APPID> --find-title "标题"               # 只查本地索引
+  python3 wechat_index.py --appid <APPID> --stats
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import publish_draft as pd
+
+# batchget returns at most 20 items per page
+PAGE_SIZE = 20
+# an incremental sync turns into a full one (which also drops deleted items) this often
+FULL_SYNC_INTERVAL = 7 * 86400
+# raise when the table layout changes; older index files are rebuilt by the next full sync
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    media_id TEXT PRIMARY KEY,
+    update_time INTEGER NOT NULL,
+    synced_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS draft_articles (
+    media_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    content_sha256 TEXT,
+    thumb_media_id TEXT,
+    PRIMARY KEY (media_id, idx)
+);
+CREATE INDEX IF NOT EXISTS draft_articles_title ON draft_articles (title);
+-- digests of the content this machine submitted; WeChat rewrites content on save,
+-- so these never match what sync sees and sync never touches this table
+CREATE TABLE IF NOT EXISTS submitted_articles (
+    media_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    content_sha256 TEXT NOT NULL,
+    PRIMARY KEY (media_id, idx)
+);
+CREATE TABLE IF NOT EXISTS materials (
+    media_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    url TEXT,
+    update_time INTEGER NOT NULL,
+    synced_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS materials_name ON materials (name);
+CREATE TABLE IF NOT EXISTS sync_state (
+    kind TEXT PRIMARY KEY,
+    watermark INTEGER NOT NULL,
+    total_count INTEGER NOT NULL,
+    synced_at INTEGER NOT NULL,
+    full_synced_at INTEGER
+);
+"""
+
+
+def index_path(appid):
+    return os.path.join(pd.cache_dir(), "index", f"{appid}.sqlite3")
+
+
+def content_digest(content):
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def open_index(appid, create=False):
+    """The account's WeChatIndex, or None if it was never synced (and create is false)."""
+    path = index_path(appid)
+    if not create and not os.path.exists(path):
+        return None
+    return WeChatIndex(path)
+
+
+class WeChatIndex:
+    """Drafts and image materials of one account as of the last sync; thread-safe.
+
+    Rows written by the publish scripts themselves (put_draft, put_material)
+    keep the index current between syncs without moving the sync watermark.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._db.executescript(
+                    "DROP TABLE IF EXISTS drafts; DROP TABLE IF EXISTS draft_articles; DROP TABLE IF EXISTS submitted_articles;"
+                    "DROP TABLE IF EXISTS materials; DROP TABLE IF EXISTS sync_state;"
+                )
+                self._db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # writes
+
+    def _put_drafts(self, items, synced_at):
+        for item in items:
+            self._db.execute(
+                "INSERT OR REPLACE INTO drafts (media_id, update_time, synced_at) VALUES (?, ?, ?)",
+                (item["media_id"], int(item.get("update_time") or 0), synced_at),
+            )
+            self._db.execute("DELETE FROM draft_articles WHERE media_id = ?", (item["media_id"],))
+            self._db.executemany(
+                "INSERT INTO draft_articles (media_id, idx, title, content_sha256, thumb_media_id) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        item["media_id"],
+                        i,
+                        a.get("title") or "",
+                        content_digest(a["content"]) if "content" in a else None,
+                        a.get("thumb_media_id"),
+                    )
+                    for i, a in enumerate((item.get("content") or {}).get("news_item") or [])
+                ],
+            )
+
+    def _put_materials(self, items, synced_at):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO materials (media_id, name, url, update_time, synced_at) VALUES (?, ?, ?, ?, ?)",
+            [(m["media_id"], m.get("name") or "", m.get("url"), int(m.get("update_time") or 0), synced_at) for m in items],
+        )
+
+    def store(self, kind, items, synced_at):
+        """Upsert one batchget page ("draft" or "image" items) in a single transaction."""
+        put = self._put_drafts if kind == "draft" else self._put_materials
+        with self._lock, self._db:
+            put(items, synced_at)
+
+    def _put_submitted(self, media_id, idx, article):
+        self._db.execute(
+            "INSERT OR REPLACE INTO submitted_articles (media_id, idx, content_sha256) VALUES (?, ?, ?)",
+            (media_id, idx, content_digest(article.get("content"))),
+        )
+
+    def put_draft(self, media_id, articles):
+        """Record a draft this machine just created or updated."""
+        now = int(time.time())
+        with self._lock, self._db:
+            self._put_drafts([{"media_id": media_id, "update_time": now, "content": {"news_item": articles}}], now)
+            self._db.execute("DELETE FROM submitted_articles WHERE media_id = ?", (media_id,))
+            for i, article in enumerate(articles):
+                self._put_submitted(media_id, i, article)
+
+    def put_draft_article(self, media_id, idx, article):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO draft_articles (media_id, idx, title, content_sha256, thumb_media_id) VALUES (?, ?, ?, ?, ?)",
+                (media_id, idx, article.get("title") or "", content_digest(article.get("content")), article.get("thumb_media_id")),
+            )
+            self._put_submitted(media_id, idx, article)
+            self._db.execute("UPDATE drafts SET update_time = ? WHERE media_id = ?", (int(time.time()), media_id))
+
+    def put_material(self, media_id, name, url=""):
+        now = int(time.time())
+        self.store("image", [{"media_id": media_id, "name": name, "url": url, "update_time": now}], now)
+
+    def forget(self, media_id):
+        """Drop a draft or material the backend reported as gone."""
+        with self._lock, self._db:
+            for table in ("drafts", "draft_articles", "submitted_articles", "materials"):
+                self._db.execute(f"DELETE FROM {table} WHERE media_id = ?", (media_id,))
+
+    def drop_unseen(self, kind, started):
+        """After a full sync: delete rows neither listed nor written since started."""
+        with self._lock, self._db:
+            if kind == "draft":
+                for table in ("draft_articles", "submitted_articles"):
+                    self._db.execute(
+                        f"DELETE FROM {table} WHERE media_id IN (SELECT media_id FROM drafts WHERE synced_at < ?)",
+                        (started,),
+                    )
+                return self._db.execute("DELETE FROM drafts WHERE synced_at < ?", (started,)).rowcount
+            return self._db.execute("DELETE FROM materials WHERE synced_at < ?", (started,)).rowcount
+
+    def sync_state(self, kind):
+        rows = self._query("SELECT * FROM sync_state WHERE kind = ?", (kind,))
+        return dict(rows[0]) if rows else None
+
+    def set_sync_state(self, kind, watermark, total_count, synced_at, full):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO sync_state (kind, watermark, total_count, synced_at, full_synced_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind) DO UPDATE SET watermark = excluded.watermark, total_count = excluded.total_count, "
+                "synced_at = excluded.synced_at, full_synced_at = COALESCE(excluded.full_synced_at, full_synced_at)",
+                (kind, watermark, total_count, synced_at, synced_at if full else None),
+            )
+
+    # lookups
+
+    def find_draft(self, titles, contents=None):
+        """media_id of the most recently updated draft whose articles have exactly these titles
+        (and, if contents are given, that this machine submitted with exactly these contents), or None.
+
+        Contents are compared with submitted_articles, not the synced digests:
+        WeChat rewrites the HTML it stores, so those never equal what was sent.
+        """
+        titles = list(titles)
+        content_digests = None if contents is None else [content_digest(c) for c in contents]
+        if not titles:
+            return None
+        candidates = self._query(
+            "SELECT d.media_id FROM draft_articles a JOIN drafts d ON d.media_id = a.media_id "
+            "WHERE a.idx = 0 AND a.title = ? ORDER BY d.update_time DESC",
+            (titles[0],),
+        )
+        for row in candidates:
+            articles = self._query("SELECT title FROM draft_articles WHERE media_id = ? ORDER BY idx", (row["media_id"],))
+            if [a["title"] for a in articles] != titles:
+                continue
+            if content_digests is not None:
+                submitted = self._query(
+                    "SELECT content_sha256 FROM submitted_articles WHERE media_id = ? ORDER BY idx", (row["media_id"],)
+                )
+                if [a["content_sha256"] for a in submitted] != content_digests:
+                    continue
+            return row["media_id"]
+        return None
+
+    def find_drafts_by_title(self, title):
+        return [
+            dict(r)
+            for r in self._query(
+                "SELECT d.media_id, a.idx, a.title, a.content_sha256, a.thumb_media_id, d.update_time "
+                "FROM draft_articles a JOIN drafts d ON d.media_id = a.media_id WHERE a.title = ? "
+                "ORDER BY d.update_time DESC",
+                (title,),
+            )
+        ]
+
+    def find_material(self, name_prefix):
+        """Most recent image material whose name starts with name_prefix, or None."""
+        escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        rows = self._query(
+            "SELECT media_id, name, url, update_time FROM materials WHERE name LIKE ? ESCAPE '\\' "
+            "ORDER BY update_time DESC LIMIT 1",
+            (escaped + "%",),
+        )
+        return dict(rows[0]) if rows else None
+
+    def material_known(self, media_id, since=0):
+        """True if the material is indexed; False if a full sync that started after since did
+        not list it (so it was deleted); None when the index cannot tell."""
+        if self._query("SELECT 1 FROM materials WHERE media_id = ?", (media_id,)):
+            return True
+        state = self.sync_state("image")
+        if state and (state["full_synced_at"] or 0) > since:
+            return False
+        return None
+
+    def stats(self):
+        counts = {
+            table: self._query(f"SELECT COUNT(*) FROM {table}")[0][0]
+            for table in ("drafts", "draft_articles", "submitted_articles", "materials")
+        }
+        return {"path": self.path, "counts": counts, "sync": {r["kind"]: dict(r) for r in self._query("SELECT * FROM sync_state")}}
+
+
+def page_reaches(items, watermark):
+    """Whether a newest-first page got down to items the last sync already saw."""
+    return watermark is not None and any(int(i.get("update_time") or 0) < watermark for i in items)
+
+
+def sync_kind(index, kind, fetch, workers=4, full=False, progress=None):
+    """Stream one listing into the index, up to workers pages in flight.
+
+    fetch(offset, count) returns a batchget response. Pages are stored as they
+    arrive, in listing order; an incremental sync stops at the first page
+    holding items older than the previous watermark.
+    """
+    state = index.sync_state(kind)
+    if not state or time.time() - (state["full_synced_at"] or 0) > FULL_SYNC_INTERVAL:
+        full = True
+    watermark = None if full else state["watermark"]
+    started = int(time.time())
+
+    first = fetch(0, PAGE_SIZE)
+    total = int(first.get("total_count") or 0)
+    items = first.get("item") or []
+    index.store(kind, items, started)
+    newest = max([int(i.get("update_time") or 0) for i in items] + [state["watermark"] if state else 0])
+    fetched, pages = len(items), 1
+    done = not items or page_reaches(items, watermark)
+
+    next_offset = PAGE_SIZE
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while in_flight or (not done and next_offset < total):
+            while not done and next_offset < total and len(in_flight) < max(1, workers):
+                in_flight.append(pool.submit(fetch, next_offset, PAGE_SIZE))
+                next_offset += PAGE_SIZE
+            items = in_flight.popleft().result().get("item") or []
+            index.store(kind, items, started)
+            fetched += len(items)
+            pages += 1
+            newest = max([newest] + [int(i.get("update_time") or 0) for i in items])
+            if not items or page_reaches(items, watermark):
+                done = True
+            if progress and pages % 10 == 0:
+                progress(f"[{kind}] {fetched}/{total}")
+
+    removed = index.drop_unseen(kind, started) if full else 0
+    index.set_sync_state(kind, newest, total, started, full)
+    return {"full": full, "pages": pages, "fetched": fetched, "total_count": total, "removed": removed}
+
+
+def sync(account, index, workers=4, full=False, drafts=True, materials=True, progress=None):
+    """Sync drafts (with content digests) and image materials of account into index."""
+    result = {}
+    if drafts:
+        result["drafts"] = sync_kind(
+            index, "draft", lambda offset, count: account.batchget_drafts(offset, count), workers, full, progress
+        )
+    if materials:
+        result["materials"] = sync_kind(
+            index, "image", lambda offset, count: account.batchget_materials(offset, count), workers, full, progress
+        )
+    return result
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="同步/查询公众号草稿与素材的本地索引")
+    parser.add_argument("--appid", default=None, help="AppID（或设置 WX_APPID 环境变量）")
+    parser.add_argument("--appsecret", default=None, help="AppSecret（或设置 WX_APPSECRET 环境变量）")
+    parser.add_argument("--full", action="store_true", help="全量同步：翻完所有页，并删除后台已不存在的条目")
+    parser.add_argument("--workers", type=int, default=4, help="同时拉取的页数")
+    parser.add_argument("--drafts-only", action="store_true", help="只同步草稿")
+    parser.add_argument("--materials-only", action="store_true", help="只同步图片素材")
+    parser.add_argument("--find-title", default=None, help="不同步，只在本地索引中按标题查草稿")
+    parser.add_argument("--stats", action="store_true", help="不同步，只输出索引条目数与同步状态")
+    parser.add_argument("--no-token-cache", action="store_true", help="不读写本地 access_token 缓存")
+    parser.add_argument("--max-retries", type=int, default=3, help="瞬时错误的最大重试次数")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="同时进行的 API 请求上限")
+    parser.add_argument("--rate-limit", type=float, default=pd.DEFAULT_RATE, help="每个接口每秒请求数上限")
+    parser.add_argument("--timeout", type=float, default=pd.DEFAULT_TIMEOUT, help="API 请求超时秒数")
+    return parser
+
+
+def run(args, log=print):
+    appid = args.appid or os.environ.get("WX_APPID")
+    if not appid:
+        raise pd.InputError("AppID required (--appid or WX_APPID)")
+    if args.find_title is not None or args.stats:
+        index = open_index(appid)
+        if index is None:
+            raise pd.InputError(f"no index for {appid} yet; run a sync first")
+        try:
+            if args.stats:
+                return dict(index.stats(), ok=True)
+            return {"ok": True, "drafts": index.find_drafts_by_title(args.find_title)}
+        finally:
+            index.close()
+
+    appsecret = args.appsecret or os.environ.get("WX_APPSECRET")
+    if not appsecret:
+        raise pd.InputError("AppSecret required to sync (--appsecret or WX_APPSECRET)")
+    if args.drafts_only and args.materials_only:
+        raise pd.InputError("--drafts-only and --materials-only exclude each other")
+    client = pd.WeChatClient(timeout=args.timeout, scheduler=pd.scheduler_from_args(args))
+    index = open_index(appid, create=True)
+    try:
+        account = pd.Account(appid, appsecret, client, use_token_cache=not args.no_token_cache)
+        result = sync(
+            account,
+            index,
+            workers=args.workers,
+            full=args.full,
+            drafts=not args.materials_only,
+            materials=not args.drafts_only,
+            progress=log,
+        )
+    finally:
+        index.close()
+        client.close()
+    return dict(result, ok=True)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        output = run(args, log=lambda line: print(line, file=sys.stderr))
+    except pd.PUBLISH_ERRORS as e:
+        pd.fail(str(e))
+    except sqlite3.Error as e:
+        pd.fail(f"index error: {e}")
+    print(json.dumps(output, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
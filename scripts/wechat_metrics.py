@@ -0,0 +1,156 @@
+"""
+可选的耗时与计数埋点（create_cover.py / publish_draft.py 共用，仅依赖标准库）。
+
+开启方式（两个脚本相同）:
+  --metrics-jsonl metrics.jsonl   每个阶段一行 JSON，结束时再写一行汇总（"-" 表示 stderr）
+  --metrics-prom  wechat.prom     结束时写 Prometheus textfile（node_exporter textfile collector）
+也可用环境变量 WX_METRICS_JSONL / WX_METRICS_PROM。开启后脚本输出的 JSON 结果带 "metrics" 汇总。
+"""
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+PROM_PREFIX = "wechat_article"
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _prom_labels(key):
+    if not key:
+        return ""
+    escaped = [(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in key]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Metrics:
+    """Spans (timed stages) and counters for one script run; thread-safe.
+
+    A disabled instance (NULL) turns every call into a no-op, so callers
+    instrument unconditionally.
+    """
+
+    def __init__(self, jsonl=None, prom=None, script=None, enabled=True):
+        self.enabled = enabled
+        self.prom = prom
+        self.script = script
+        self._spans = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._out = None
+        if enabled and jsonl:
+            self._out = sys.stderr if jsonl == "-" else open(jsonl, "a", encoding="utf-8")
+
+    def _emit(self, record):
+        if self._out is None:
+            return
+        record = dict(ts=round(time.time(), 3), script=self.script, pid=os.getpid(), **record)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._out.write(line + "\n")
+            self._out.flush()
+
+    @contextlib.contextmanager
+    def span(self, name, **labels):
+        """Time the with-block as stage name; failures are recorded with ok=false."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            key = (name, _label_key(labels))
+            with self._lock:
+                entry = self._spans.setdefault(key, [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+            self._emit(dict(type="span", name=name, ms=round(seconds * 1000, 3), ok=ok, **labels))
+
+    def add(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def summary(self):
+        """{"spans": {name: {count, total_ms, max_ms}}, "counters": {name: {total, by: {labels: n}}}}."""
+        with self._lock:
+            spans = {}
+            for (name, _), (count, total, peak) in self._spans.items():
+                entry = spans.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                entry["count"] += count
+                entry["total_ms"] = round(entry["total_ms"] + total * 1000, 3)
+                entry["max_ms"] = round(max(entry["max_ms"], peak * 1000), 3)
+            counters = {}
+            for (name, key), value in sorted(self._counters.items()):
+                entry = counters.setdefault(name, {"total": 0})
+                entry["total"] += value
+                if key:
+                    entry.setdefault("by", {})[",".join(f"{k}={v}" for k, v in key)] = value
+        return {"spans": spans, "counters": counters}
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            spans = sorted(self._spans.items())
+            counters = sorted(self._counters.items())
+        script = (("script", self.script),) if self.script else ()
+        if spans:
+            lines.append(f"# TYPE {PROM_PREFIX}_stage_seconds summary")
+            for (name, key), (count, total, _) in spans:
+                labels = _prom_labels(script + (("stage", name),) + key)
+                lines.append(f"{PROM_PREFIX}_stage_seconds_sum{labels} {total:.6f}")
+                lines.append(f"{PROM_PREFIX}_stage_seconds_count{labels} {count}")
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {PROM_PREFIX}_{name}_total counter")
+            for (n, key), value in counters:
+                if n == name:
+                    lines.append(f"{PROM_PREFIX}_{name}_total{_prom_labels(script + key)} {value}")
+        lines.append(f"# TYPE {PROM_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{PROM_PREFIX}_last_run_timestamp_seconds{_prom_labels(script)} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """Write the summary line and the Prometheus textfile (atomically)."""
+        if not self.enabled:
+            return
+        self._emit(dict(type="summary", **self.summary()))
+        if self.prom:
+            directory = os.path.dirname(os.path.abspath(self.prom))
+            os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.prom}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, self.prom)
+        if self._out is not None and self._out is not sys.stderr:
+            self._out.close()
+        self._out = None
+
+
+NULL = Metrics(enabled=False)
+
+
+def add_arguments(parser):
+    parser.add_argument("--metrics-jsonl", default=os.environ.get("WX_METRICS_JSONL"), help="把各阶段耗时/计数写成 JSON lines（- 表示 stderr）")
+    parser.add_argument("--metrics-prom", default=os.environ.get("WX_METRICS_PROM"), help="结束时写 Prometheus textfile")
+
+
+def from_args(args, script):
+    """A recording Metrics if either metrics option is set, else NULL."""
+    jsonl = getattr(args, "metrics_jsonl", None)
+    prom = getattr(args, "metrics_prom", None)
+    if not jsonl and not prom:
+        return NULL
+    return Metrics(jsonl=jsonl, prom=prom, script=script)
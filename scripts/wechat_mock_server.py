@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+本地模拟微信公众号 API，用于离线测试与压测 publish_draft.py（仅依赖标准库）。
+
+实现的接口:
+  GET  /cgi-bin/token
+  POST /cgi-bin/material/add_material     POST /cgi-bin/material/get_material
+  POST /cgi-bin/material/batchget_material
+  POST /cgi-bin/media/uploadimg
+  POST /cgi-bin/draft/add                 POST /cgi-bin/draft/get
+  POST /cgi-bin/draft/batchget            POST /cgi-bin/draft/update
+  GET  /_mock/stats                       POST /_mock/reset   （请求计数/清零）
+
+用法:
+  python3 wechat_mock_server.py --port 8800 --latency 80 --handshake 150
+  python3 wechat_mock_server.py --preload-materials 5000 --preload-drafts 300   # 预置存量数据（测同步）
+  python3 wechat_mock_server.py --inject draft/add=45009:0.2 --inject token=timeout:0.05
+  WX_API_BASE=http://127.0.0.1:8800 python3 publish_draft.py ...
+
+--inject 格式为 接口=错误[:概率]，接口取路径末段（token、add_material、uploadimg、
+draft/add、draft/batchget 等，* 表示全部），错误为微信 errcode（如 40001、45009、-1）、
+timeout（挂起 --timeout-delay 秒）、http500、drop（读完请求后不执行、不应答直接断开）
+或 lost（执行请求后丢弃应答并断开，模拟请求已生效但响应丢失）。
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ERRMSGS = {
+    -1: "system error",
+    40001: "invalid credential, access_token is invalid or not latest",
+    40007: "invalid media_id",
+    42001: "access_token expired",
+    45009: "reach max api daily quota limit",
+    45011: "api minute-quota reach limit",
+}
+
+# get_material answers known media with raw image bytes (only SOI/EOI markers here)
+PLACEHOLDER_IMAGE = b"\xff\xd8\xff\xd9"
+FILENAME_RE = re.compile(rb'filename="([^"]*)"')
+FAULT_KINDS = ("timeout", "http500", "drop", "lost")
+
+
+def endpoint_name(path):
+    """"/cgi-bin/draft/add" -> "draft/add", "/cgi-bin/material/add_material" -> "add_material"."""
+    parts = [p for p in path.split("/") if p and p != "cgi-bin"]
+    if not parts:
+        return ""
+    if parts[0] in ("material", "media"):
+        return parts[-1]
+    return "/".join(parts)
+
+
+def parse_inject(spec):
+    """"draft/add=45009:0.2" -> ("draft/add", "45009", 0.2)."""
+    endpoint, sep, rest = spec.partition("=")
+    if not sep or not endpoint or not rest:
+        raise ValueError(f"invalid --inject value: {spec!r} (expected ENDPOINT=ERROR[:RATE])")
+    kind, _, rate = rest.partition(":")
+    if kind not in FAULT_KINDS and not kind.lstrip("-").isdigit():
+        raise ValueError(f"invalid --inject error: {spec!r} (errcode, {', '.join(FAULT_KINDS)})")
+    rate = float(rate) if rate else 1.0
+    if not 0 <= rate <= 1:
+        raise ValueError(f"invalid --inject rate: {spec!r}")
+    return endpoint, kind, rate
+
+
+class MockState:
+    """Configuration, fake backend data and request accounting of one mock server."""
+
+    def __init__(self, latency=0.0, jitter=0.0, handshake=0.0, bandwidth=0, timeout_delay=30.0, token_ttl=7200, rules=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.handshake = handshake
+        self.bandwidth = bandwidth
+        self.timeout_delay = timeout_delay
+        self.token_ttl = token_ttl
+        self.rules = list(rules or [])
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = {}
+        # media_id -> batchget item, oldest first (listings are newest first)
+        self.materials = {}
+        self.drafts = []
+        self.reset()
+
+    def preload(self, materials=0, drafts=0):
+        """Fill the backend with existing content, all older than anything created later."""
+        base = int(time.time()) - 86400
+        with self.lock:
+            for i in range(materials):
+                media_id = f"MOCK_MEDIA_PRELOAD_{i}"
+                self.materials[media_id] = {
+                    "media_id": media_id,
+                    "name": f"preload-{i}.jpg",
+                    "url": f"http://mmbiz.qpic.cn/mock/{media_id}/0",
+                    "update_time": base - materials + i,
+                }
+            thumb = next(iter(self.materials), None)
+            for i in range(drafts):
+                article = {"title": f"Preloaded draft {i}", "content": f"<p>draft {i}</p>", "thumb_media_id": thumb}
+                self.drafts.insert(0, {"media_id": f"MOCK_DRAFT_PRELOAD_{i}", "content": {"news_item": [article]}, "update_time": base - drafts + i})
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.injected = {}
+            self.connections = 0
+            self.bytes_in = 0
+            self.tokens_issued = 0
+            # endpoint -> faults to answer its next requests with, before any rule
+            self.scheduled = {}
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "total_requests": sum(self.requests.values()),
+                "injected": {k: dict(v) for k, v in self.injected.items()},
+                "connections": self.connections,
+                "bytes_in": self.bytes_in,
+                "tokens_issued": self.tokens_issued,
+                "drafts": len(self.drafts),
+            }
+
+    def count(self, endpoint, nbytes):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes_in += nbytes
+
+    def fail_next(self, endpoint, kind, times=1):
+        """Answer the next `times` requests to endpoint with fault kind (tests use this for deterministic faults)."""
+        with self.lock:
+            self.scheduled.setdefault(endpoint, []).extend([str(kind)] * times)
+
+    def pick_fault(self, endpoint):
+        with self.lock:
+            queued = self.scheduled.get(endpoint)
+            if queued:
+                kind = queued.pop(0)
+                per = self.injected.setdefault(endpoint, {})
+                per[kind] = per.get(kind, 0) + 1
+                return kind
+        for rule_endpoint, kind, rate in self.rules:
+            if rule_endpoint not in ("*", endpoint):
+                continue
+            with self.lock:
+                hit = self.random.random() < rate
+                if hit:
+                    per = self.injected.setdefault(endpoint, {})
+                    per[kind] = per.get(kind, 0) + 1
+            if hit:
+                return kind
+        return None
+
+    def delay(self, nbytes=0):
+        seconds = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if self.bandwidth and nbytes:
+            seconds += nbytes / self.bandwidth
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def issue_token(self):
+        token = "MOCK_TOKEN_" + uuid.uuid4().hex
+        with self.lock:
+            self.tokens[token] = time.time() + self.token_ttl
+            self.tokens_issued += 1
+        return token
+
+    def check_token(self, token):
+        """Return None for a valid token, else the errcode to answer with."""
+        with self.lock:
+            expires = self.tokens.get(token)
+        if expires is None:
+            return 40001
+        if expires <= time.time():
+            return 42001
+        return None
+
+    def revoke(self, token):
+        with self.lock:
+            self.tokens.pop(token, None)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; with Nagle on, every response on a
+    # reused connection would wait ~40 ms for the client's delayed ACK
+    disable_nagle_algorithm = True
+    state = None
+    quiet = True
+    # set for a "lost" fault: the request runs but its response is never written
+    discard_response = False
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+        if self.state.handshake:
+            # stands in for the TCP + TLS round trips of a new connection
+            time.sleep(self.state.handshake)
+
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            sys.stderr.write("[mock] " + (fmt % args) + "\n")
+
+    def _send(self, payload, status=200, content_type="application/json"):
+        if self.discard_response:
+            self.close_connection = True
+            return
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def _error(self, errcode):
+        self._send({"errcode": errcode, "errmsg": ERRMSGS.get(errcode, "mock error")})
+
+    def do_GET(self):
+        self._handle(b"")
+
+    def do_POST(self):
+        self._handle(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+
+    def _handle(self, body):
+        url = urllib.parse.urlsplit(self.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+        if url.path == "/_mock/stats":
+            self._send(self.state.stats())
+            return
+        if url.path == "/_mock/reset":
+            self.state.reset()
+            self._send({"ok": True})
+            return
+
+        endpoint = endpoint_name(url.path)
+        handler = ENDPOINTS.get((self.command, endpoint))
+        if handler is None:
+            self._send({"errcode": 404, "errmsg": f"mock: unknown endpoint {self.command} {url.path}"}, status=404)
+            return
+        self.state.count(endpoint, len(body))
+
+        fault = self.state.pick_fault(endpoint)
+        if fault == "timeout":
+            time.sleep(self.state.timeout_delay)
+            self.close_connection = True
+            return
+        if fault == "drop":
+            self.close_connection = True
+            return
+        self.discard_response = fault == "lost"
+        self.state.delay(len(body))
+        if fault == "http500":
+            self._send(b"mock internal error", status=500, content_type="text/plain")
+            return
+        if fault not in (None, "lost"):
+            if int(fault) in (40001, 42001) and query.get("access_token"):
+                self.state.revoke(query["access_token"])
+            self._error(int(fault))
+            return
+
+        if endpoint != "token":
+            errcode = self.state.check_token(query.get("access_token"))
+            if errcode:
+                self._error(errcode)
+                return
+        handler(self, query, body)
+
+    # endpoints
+
+    def token(self, query, body):
+        if not query.get("appid") or not query.get("secret"):
+            self._send({"errcode": 41002, "errmsg": "appid missing"})
+            return
+        self._send({"access_token": self.state.issue_token(), "expires_in": self.state.token_ttl})
+
+    def add_material(self, query, body):
+        if query.get("type") != "image" or b"filename=" not in body[:2048]:
+            self._send({"errcode": 40005, "errmsg": "invalid file type"})
+            return
+        media_id = "MOCK_MEDIA_" + uuid.uuid4().hex
+        name = FILENAME_RE.search(body[:2048])
+        item = {
+            "media_id": media_id,
+            "name": name.group(1).decode("utf-8", "replace") if name else "",
+            "url": f"http://mmbiz.qpic.cn/mock/{media_id}/0",
+            "update_time": int(time.time()),
+        }
+        with self.state.lock:
+            self.state.materials[media_id] = item
+        self._send({"media_id": media_id, "url": item["url"]})
+
+    def get_material(self, query, body):
+        media_id = self._json(body).get("media_id")
+        with self.state.lock:
+            known = media_id in self.state.materials
+        if not known:
+            self._error(40007)
+            return
+        self._send(PLACEHOLDER_IMAGE, content_type="image/jpeg")
+
+    def uploadimg(self, query, body):
+        if b"filename=" not in body[:2048]:
+            self._send({"errcode": 40005, "errmsg": "invalid file type"})
+            return
+        self._send({"url": f"http://mmbiz.qpic.cn/mock/{uuid.uuid4().hex}/0"})
+
+    def draft_add(self, query, body):
+        articles = self._json(body).get("articles") or []
+        if not articles:
+            self._send({"errcode": 44002, "errmsg": "empty post data"})
+            return
+        with self.state.lock:
+            for article in articles:
+                if article.get("thumb_media_id") not in self.state.materials:
+                    missing = True
+                    break
+            else:
+                missing = False
+            if not missing:
+                media_id = "MOCK_DRAFT_" + uuid.uuid4().hex
+                self.state.drafts.insert(0, {"media_id": media_id, "content": {"news_item": articles}, "update_time": int(time.time())})
+        if missing:
+            self._error(40007)
+            return
+        self._send({"media_id": media_id})
+
+    def draft_get(self, query, body):
+        media_id = self._json(body).get("media_id")
+        with self.state.lock:
+            draft = next((d for d in self.state.drafts if d["media_id"] == media_id), None)
+        if draft is None:
+            self._error(40007)
+            return
+        self._send({"news_item": draft["content"]["news_item"]})
+
+    def draft_update(self, query, body):
+        req = self._json(body)
+        article = req.get("articles") or {}
+        index = int(req.get("index", 0))
+        with self.state.lock:
+            draft = next((d for d in self.state.drafts if d["media_id"] == req.get("media_id")), None)
+            items = draft["content"]["news_item"] if draft else []
+            ok = 0 <= index < len(items) and article.get("thumb_media_id") in self.state.materials
+            if ok:
+                items[index] = article
+                draft["update_time"] = int(time.time())
+                # listings are ordered by update time
+                self.state.drafts.remove(draft)
+                self.state.drafts.insert(0, draft)
+        if not ok:
+            self._error(40007)
+            return
+        self._send({"errcode": 0, "errmsg": "ok"})
+
+    def draft_batchget(self, query, body):
+        req = self._json(body)
+        offset = int(req.get("offset", 0))
+        count = max(1, min(int(req.get("count", 20)), 20))
+        with self.state.lock:
+            total = len(self.state.drafts)
+            page = self.state.drafts[offset : offset + count]
+        if req.get("no_content"):
+            page = [
+                dict(d, content={"news_item": [{k: v for k, v in a.items() if k != "content"} for a in d["content"]["news_item"]]})
+                for d in page
+            ]
+        self._send({"total_count": total, "item_count": len(page), "item": page})
+
+    def batchget_material(self, query, body):
+        req = self._json(body)
+        if req.get("type") != "image":
+            # only image materials exist here
+            self._send({"total_count": 0, "item_count": 0, "item": []})
+            return
+        offset = int(req.get("offset", 0))
+        count = max(1, min(int(req.get("count", 20)), 20))
+        with self.state.lock:
+            items = list(self.state.materials.values())
+        newest_first = items[::-1][offset : offset + count]
+        self._send({"total_count": len(items), "item_count": len(newest_first), "item": newest_first})
+
+    def _json(self, body):
+        try:
+            return json.loads(body.decode("utf-8") or "{}")
+        except ValueError:
+            return {}
+
+
+ENDPOINTS = {
+    ("GET", "token"): Handler.token,
+    ("POST", "add_material"): Handler.add_material,
+    ("POST", "get_material"): Handler.get_material,
+    ("POST", "batchget_material"): Handler.batchget_material,
+    ("POST", "uploadimg"): Handler.uploadimg,
+    ("POST", "draft/add"): Handler.draft_add,
+    ("POST", "draft/get"): Handler.draft_get,
+    ("POST", "draft/batchget"): Handler.draft_batchget,
+    ("POST", "draft/update"): Handler.draft_update,
+}
+
+
+def make_server(state, host="127.0.0.1", port=0, quiet=True):
+    handler = type("MockHandler", (Handler,), {"state": state, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_background(state, host="127.0.0.1", port=0):
+    """Serve state on a daemon thread; returns (server, base_url). Stop with server.shutdown()."""
+    server = make_server(state, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="本地模拟微信公众号 API")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8800, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0, help="每个请求的固定延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="额外随机延迟上限（毫秒）")
+    parser.add_argument("--handshake", type=float, default=0, help="每个新连接的建连延迟（毫秒），模拟 TCP+TLS 握手")
+    parser.add_argument("--bandwidth", type=float, default=0, help="上传带宽（KB/s），0 表示不限")
+    parser.add_argument("--inject", action="append", default=[], help="错误注入：接口=错误[:概率]，可重复")
+    parser.add_argument("--timeout-delay", type=float, default=30, help="timeout 注入时挂起的秒数")
+    parser.add_argument("--token-ttl", type=int, default=7200, help="access_token 有效期（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="错误注入与抖动的随机种子")
+    parser.add_argument("--preload-materials", type=int, default=0, help="启动时预置的图片素材数")
+    parser.add_argument("--preload-drafts", type=int, default=0, help="启动时预置的草稿数")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求")
+    return parser
+
+
+def state_from_args(args):
+    state = MockState(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        handshake=args.handshake / 1000,
+        bandwidth=args.bandwidth * 1024,
+        timeout_delay=args.timeout_delay,
+        token_ttl=args.token_ttl,
+        rules=[parse_inject(spec) for spec in args.inject],
+        seed=args.seed,
+    )
+    state.preload(materials=args.preload_materials, drafts=args.preload_drafts)
+    return state
+
+
+def main():
+    args = build_parser().parse_args()
+    try:
+        state = state_from_args(args)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    server = make_server(state, args.host, args.port, quiet=not args.verbose)
+    print(f"mock WeChat API on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(state.stats(), ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
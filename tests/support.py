@@ -0,0 +1,61 @@
+"""Shared setup for the tests: scripts/ on sys.path, a private cache dir and a mock WeChat API."""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import publish_draft as pd  # noqa: E402
+import wechat_mock_server as mock  # noqa: E402
+
+APPID = "wx_test_app"
+SECRET = "test_secret"
+
+
+class MockAPITestCase(unittest.TestCase):
+    """Runs each test against a fresh wechat_mock_server on a background thread.
+
+    $WX_CACHE_DIR points at a temporary directory, so token, media and
+    journal caches start empty and never touch the user's cache.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="wx-test-")
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        old = os.environ.get("WX_CACHE_DIR")
+        os.environ["WX_CACHE_DIR"] = os.path.join(self.tmp, "cache")
+        self.addCleanup(self._restore_env, old)
+
+        self.state = mock.MockState(seed=1)
+        server, self.base_url = mock.start_background(self.state)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    @staticmethod
+    def _restore_env(old):
+        if old is None:
+            os.environ.pop("WX_CACHE_DIR", None)
+        else:
+            os.environ["WX_CACHE_DIR"] = old
+
+    def client(self, **kwargs):
+        # no backoff sleeps: a retry the test does not expect should fail fast, not slowly
+        kwargs.setdefault("scheduler", pd.RequestScheduler(base_delay=0, max_delay=0))
+        client = pd.WeChatClient(self.base_url, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def account(self, client=None, **kwargs):
+        kwargs.setdefault("preprocess_cover", False)
+        return pd.Account(APPID, SECRET, client or self.client(), **kwargs)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
+
+    def requests(self, endpoint):
+        return self.state.stats()["requests"].get(endpoint, 0)
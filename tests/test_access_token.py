@@ -0,0 +1,78 @@
+"""access_token caching: reuse, expiry, rejected tokens and one fetch under concurrency."""
+import threading
+import time
+import unittest
+
+from support import APPID, SECRET, MockAPITestCase, pd
+
+
+class TokenCacheTest(MockAPITestCase):
+    def test_cached_token_is_reused_across_clients(self):
+        first = pd.get_access_token(self.client(), APPID, SECRET)
+        second = pd.get_access_token(self.client(), APPID, SECRET)
+        self.assertEqual(first, second)
+        self.assertEqual(self.state.stats()["tokens_issued"], 1)
+
+    def test_token_near_expiry_is_refetched(self):
+        pd.write_json_file(
+            pd.token_cache_path(APPID),
+            {"access_token": "OLD", "expires_at": time.time() + pd.TOKEN_REFRESH_MARGIN - 1},
+        )
+        token = pd.get_access_token(self.client(), APPID, SECRET)
+        self.assertNotEqual(token, "OLD")
+        self.assertEqual(pd.read_json_file(pd.token_cache_path(APPID))["access_token"], token)
+
+    def test_stale_token_is_replaced_once(self):
+        old = pd.get_access_token(self.client(), APPID, SECRET)
+        new = pd.get_access_token(self.client(), APPID, SECRET, stale_token=old)
+        self.assertNotEqual(new, old)
+        # a second publisher that saw the same rejection picks up the replacement
+        again = pd.get_access_token(self.client(), APPID, SECRET, stale_token=old)
+        self.assertEqual(again, new)
+        self.assertEqual(self.state.stats()["tokens_issued"], 2)
+
+    def test_concurrent_cold_start_fetches_once(self):
+        self.state.latency = 0.05
+        tokens = []
+        barrier = threading.Barrier(8)
+
+        def worker():
+            client = pd.WeChatClient(self.base_url)
+            barrier.wait()
+            tokens.append(pd.get_access_token(client, APPID, SECRET))
+            client.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(tokens)), 1)
+        self.assertEqual(self.state.stats()["tokens_issued"], 1)
+
+
+class AccountTokenTest(MockAPITestCase):
+    def test_expired_token_is_refreshed_and_call_retried(self):
+        for use_token_cache in (True, False):
+            with self.subTest(use_token_cache=use_token_cache):
+                account = self.account(use_token_cache=use_token_cache)
+                token = account.token()
+                self.state.revoke(token)
+                issued = self.state.stats()["tokens_issued"]
+                self.assertIn("item", account.batchget_drafts(0))
+                self.assertNotEqual(account.token(), token)
+                self.assertEqual(self.state.stats()["tokens_issued"], issued + 1)
+
+    def test_without_disk_cache_token_is_fetched_once_per_run(self):
+        self.state.latency = 0.05
+        account = self.account(use_token_cache=False)
+        threads = [threading.Thread(target=account.token) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.state.stats()["tokens_issued"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""MediaCache: identical images are uploaded once per account."""
+import unittest
+
+from support import APPID, MockAPITestCase, pd
+
+
+class MediaCacheTest(MockAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.cover = self.write_file("cover.jpg", b"\xff\xd8cover\xff\xd9")
+
+    def test_cover_cache_hit_skips_upload(self):
+        first = self.account().upload_cover(self.cover)
+        # a later run: new account, same bytes under another name
+        copy = self.write_file("copy.jpg", b"\xff\xd8cover\xff\xd9")
+        second = self.account().upload_cover(copy)
+        self.assertEqual(first, second)
+        self.assertEqual(self.requests("add_material"), 1)
+        self.assertEqual(pd.MediaCache(APPID).get(pd.file_sha256(self.cover))["media_id"], first)
+
+    def test_changed_cover_is_uploaded(self):
+        first = self.account().upload_cover(self.cover)
+        self.write_file("cover.jpg", b"\xff\xd8other\xff\xd9")
+        second = self.account().upload_cover(self.cover)
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.requests("add_material"), 2)
+
+    def test_validated_cache_reuploads_deleted_material(self):
+        first = self.account().upload_cover(self.cover)
+        del self.state.materials[first]
+        second = self.account(validate_media_cache=True).upload_cover(self.cover)
+        self.assertNotEqual(first, second)
+        self.assertIn(second, self.state.materials)
+        self.assertEqual(self.requests("add_material"), 2)
+
+    def test_disabled_cache_uploads_every_run(self):
+        self.account(use_media_cache=False).upload_cover(self.cover)
+        self.account(use_media_cache=False).upload_cover(self.cover)
+        self.assertEqual(self.requests("add_material"), 2)
+
+    def test_inline_image_cache_hit_skips_upload(self):
+        image = self.write_file("inline.png", b"\x89PNG\r\n\x1a\npixels")
+        first = self.account().upload_inline_image(image)
+        second = self.account().upload_inline_image(image)
+        self.assertEqual(first, second)
+        self.assertEqual(self.requests("uploadimg"), 1)
+
+    def test_shared_cover_is_uploaded_once_per_publish(self):
+        articles = [
+            {"title": f"Article {i}", "content_file": self.write_file(f"{i}.html", f"<p>{i}</p>"), "cover": self.cover}
+            for i in range(4)
+        ]
+        result = pd.publish_articles(self.account(use_media_cache=False), articles, split=True, inline_images=False)
+        self.assertEqual(len({d["thumb_media_id"] for d in result["drafts"]}), 1)
+        self.assertEqual(self.requests("add_material"), 1)
+        self.assertEqual(self.requests("draft/add"), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Resuming an interrupted publish from the PublishJournal."""
+import unittest
+
+from support import APPID, MockAPITestCase, pd
+
+
+class Interrupted(BaseException):
+    """Stands in for the process dying (Ctrl-C, kill) in the middle of draft/add."""
+
+
+class JournalResumeTest(MockAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.cover = self.write_file("cover.jpg", b"\xff\xd8cover\xff\xd9")
+        self.content = self.write_file("a.html", "<p>first version</p>")
+        self.articles = [{"title": "Hello", "content_file": self.content, "cover": self.cover}]
+
+    def publish(self, die=None):
+        """One publish run with a fresh account; die="before" or "after" kills it around draft/add."""
+        account = self.account()
+        if die:
+            add_draft = account.add_draft
+
+            def dying_add_draft(articles):
+                if die == "after":
+                    add_draft(articles)
+                raise Interrupted()
+
+            account.add_draft = dying_add_draft
+        return pd.publish_articles(account, self.articles, inline_images=False, journal=pd.PublishJournal(APPID))
+
+    def test_rerun_after_draft_landed_resumes_it(self):
+        with self.assertRaises(Interrupted):
+            self.publish(die="after")
+        self.assertEqual(len(self.state.drafts), 1)
+
+        result = self.publish()
+        self.assertTrue(result["resumed"])
+        self.assertEqual(result["media_id"], self.state.drafts[0]["media_id"])
+        self.assertEqual(self.requests("draft/add"), 1)
+        # the cover recorded in the journal is not uploaded again
+        self.assertEqual(self.requests("add_material"), 1)
+
+    def test_rerun_after_draft_did_not_land_creates_it(self):
+        with self.assertRaises(Interrupted):
+            self.publish(die="before")
+        result = self.publish()
+        self.assertFalse(result["resumed"])
+        self.assertEqual([d["media_id"] for d in self.state.drafts], [result["media_id"]])
+
+    def test_older_draft_of_an_edited_article_is_not_resumed(self):
+        first = self.publish()
+        self.write_file("a.html", "<p>second version</p>")
+        with self.assertRaises(Interrupted):
+            self.publish(die="before")
+
+        # same title and (cached) cover, saved seconds ago, but not the edited body
+        result = self.publish()
+        self.assertFalse(result["resumed"])
+        self.assertNotEqual(result["media_id"], first["media_id"])
+        self.assertEqual(len(self.state.drafts), 2)
+
+    def test_finished_run_is_not_repeated(self):
+        first = self.publish()
+        second = self.publish()
+        self.assertTrue(second["resumed"])
+        self.assertEqual(second["media_id"], first["media_id"])
+        self.assertEqual(self.requests("draft/add"), 1)
+
+    def test_deleted_draft_is_created_again(self):
+        self.publish()
+        self.state.drafts.clear()
+        result = self.publish()
+        self.assertFalse(result["resumed"])
+        self.assertEqual(len(self.state.drafts), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
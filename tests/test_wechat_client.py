@@ -0,0 +1,112 @@
+"""WeChatClient against the mock API: keep-alive, reconnects and multipart streaming."""
+import http.client
+import os
+import unittest
+
+from support import APPID, SECRET, MockAPITestCase, pd
+
+
+class KeepAliveTest(MockAPITestCase):
+    def test_calls_share_one_connection(self):
+        client = self.client()
+        token = pd.fetch_access_token(client, APPID, SECRET)[0]
+        for _ in range(3):
+            pd.batchget_drafts(client, token, 0)
+        self.assertEqual(self.state.stats()["connections"], 1)
+        self.assertEqual(self.requests("draft/batchget"), 3)
+
+    def test_dropped_reused_connection_is_retried_once(self):
+        client = self.client()
+        pd.fetch_access_token(client, APPID, SECRET)
+        self.state.fail_next("token", "drop")
+        token = pd.fetch_access_token(client, APPID, SECRET)[0]
+        self.assertEqual(self.state.check_token(token), None)
+        # the dropped request plus one retry on a new connection, no scheduler retries
+        self.assertEqual(self.requests("token"), 3)
+        self.assertEqual(self.state.stats()["connections"], 2)
+        self.assertEqual(client.scheduler.retries, 0)
+
+    def test_second_drop_is_not_retried_by_the_client(self):
+        client = self.client(scheduler=pd.RequestScheduler(max_attempts=1))
+        token = pd.fetch_access_token(client, APPID, SECRET)[0]
+        self.state.fail_next("draft/batchget", "drop", times=2)
+        with self.assertRaises(pd.WeChatHTTPError) as cm:
+            pd.batchget_drafts(client, token, 0)
+        self.assertTrue(cm.exception.retryable)
+        self.assertEqual(self.requests("draft/batchget"), 2)
+
+
+class DraftAddTest(MockAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_ = self.client()
+        self.token = pd.fetch_access_token(self.client_, APPID, SECRET)[0]
+        cover = self.write_file("cover.jpg", b"\xff\xd8cover\xff\xd9")
+        thumb = pd.upload_cover(self.client_, self.token, cover)
+        self.articles = [pd.article_payload({"title": "T"}, "<p>body</p>", thumb)]
+
+    def test_not_resent_after_response_lost(self):
+        self.state.fail_next("draft/add", "lost")
+        with self.assertRaises(pd.WeChatHTTPError) as cm:
+            pd.add_draft(self.client_, self.token, self.articles)
+        self.assertTrue(cm.exception.ambiguous)
+        self.assertEqual(self.requests("draft/add"), 1)
+        self.assertEqual(len(self.state.drafts), 1)
+
+    def test_not_resent_after_reused_connection_dropped(self):
+        # unlike token above, a dropped draft/add is not retried: it may have landed
+        self.state.fail_next("draft/add", "drop")
+        with self.assertRaises(pd.WeChatHTTPError) as cm:
+            pd.add_draft(self.client_, self.token, self.articles)
+        self.assertTrue(cm.exception.ambiguous)
+        self.assertEqual(self.requests("draft/add"), 1)
+        self.assertEqual(self.client_.scheduler.retries, 0)
+
+    def test_submit_draft_finds_the_draft_that_landed(self):
+        self.state.fail_next("draft/add", "lost")
+        account = self.account(self.client_)
+        media_id = pd.submit_draft(account, self.articles)
+        self.assertEqual(media_id, self.state.drafts[0]["media_id"])
+        self.assertEqual(len(self.state.drafts), 1)
+        self.assertEqual(self.requests("draft/add"), 1)
+
+    def test_submit_draft_sends_again_when_nothing_landed(self):
+        self.state.fail_next("draft/add", "drop")
+        account = self.account(self.client_)
+        media_id = pd.submit_draft(account, self.articles)
+        self.assertEqual([d["media_id"] for d in self.state.drafts], [media_id])
+        self.assertEqual(self.requests("draft/add"), 2)
+
+
+class MultipartTest(MockAPITestCase):
+    def test_upload_is_streamed_in_chunks(self):
+        data = os.urandom(3 * pd.UPLOAD_CHUNK_SIZE + 123)
+        path = self.write_file("big.jpg", data)
+        client = self.client()
+        token = pd.fetch_access_token(client, APPID, SECRET)[0]
+
+        sent = []
+        original = http.client.HTTPConnection.send
+
+        def record(conn, chunk):
+            sent.append(len(chunk))
+            return original(conn, chunk)
+
+        http.client.HTTPConnection.send = record
+        try:
+            bytes_before = self.state.stats()["bytes_in"]
+            media_id = pd.upload_cover(client, token, path)
+        finally:
+            http.client.HTTPConnection.send = original
+
+        self.assertIn(media_id, self.state.materials)
+        self.assertEqual(self.state.materials[media_id]["name"], "big.jpg")
+        body = self.state.stats()["bytes_in"] - bytes_before
+        self.assertGreater(body, len(data))
+        # the file never goes out as one buffer
+        self.assertLessEqual(max(sent), pd.UPLOAD_CHUNK_SIZE)
+        self.assertGreaterEqual(sum(sent), body)
+
+
+if __name__ == "__main__":
+    unittest.main()